@@ -0,0 +1,13 @@
+"""
+Application Celery d'Agri-Smart
+Lancer un worker : celery -A agri_smart_project worker
+"""
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'agri_smart_project.settings')
+
+app = Celery('agri_smart_project')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
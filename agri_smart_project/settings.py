@@ -147,14 +147,109 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+# Tests sans Redis : CELERY_BROKER_URL=memory://, CELERY_RESULT_BACKEND=cache+memory://
+# et CELERY_TASK_ALWAYS_EAGER=True
+CELERY_TASK_ALWAYS_EAGER = env.bool('CELERY_TASK_ALWAYS_EAGER', default=False)
+
+# Écriture des prédictions : 'sync' (dans la requête), 'buffered' (file en
+# mémoire vidée par bulk_create) ou 'celery' (lots confiés à un worker)
+PREDICTION_WRITER_BACKEND = env('PREDICTION_WRITER_BACKEND', default='buffered')
+PREDICTION_WRITER_BATCH_SIZE = env.int('PREDICTION_WRITER_BATCH_SIZE', default=100)
+PREDICTION_WRITER_FLUSH_MS = env.int('PREDICTION_WRITER_FLUSH_MS', default=500)
+PREDICTION_WRITER_MAX_QUEUE = env.int('PREDICTION_WRITER_MAX_QUEUE', default=10000)
 
 # ML Models Configuration
 ML_MODELS_DIR = BASE_DIR / 'ml_models' / 'trained_models'
 ML_MODELS_DIR.mkdir(parents=True, exist_ok=True)
 
+# Charger les modèles au démarrage (à combiner avec gunicorn --preload
+# pour partager une seule copie entre workers)
+ML_PRELOAD_MODELS = env.bool('ML_PRELOAD_MODELS', default=False)
+
+# Taille du jeu synthétique quand un modèle doit être (ré)entraîné
+ML_SYNTHETIC_SAMPLES = env.int('ML_SYNTHETIC_SAMPLES', default=10000)
+
+# Coeurs utilisés pour entraîner les forêts (ml_models.training, -1 = tous)
+ML_TRAINING_N_JOBS = env.int('ML_TRAINING_N_JOBS', default=-1)
+
+# Publication après entraînement (train_models.py --from-datasets --publish-trained) :
+# dégradation relative tolérée par rapport à la version servie, mesurée sur
+# la même holdout (0.01 = accuracy ou MAE 1 % moins bonne au plus)
+ML_PUBLISH_TOLERANCE = env.float('ML_PUBLISH_TOLERANCE', default=0.01)
+
+# Réentraînement incrémental du rendement (train_models.py --incremental) :
+# arbres ajoutés par passage, taille max de la forêt (arbres de base
+# compris), saisons minimum, part des saisons gardée pour le contrôle
+ML_INCREMENTAL_TREES = env.int('ML_INCREMENTAL_TREES', default=10)
+ML_INCREMENTAL_MAX_TREES = env.int('ML_INCREMENTAL_MAX_TREES', default=300)
+ML_INCREMENTAL_MIN_ROWS = env.int('ML_INCREMENTAL_MIN_ROWS', default=20)
+ML_INCREMENTAL_HOLDOUT = env.float('ML_INCREMENTAL_HOLDOUT', default=0.25)
+
+# Recherche d'hyperparamètres (train_models.py --search) : budget de la
+# configuration retenue, latence d'une prédiction unitaire et taille.
+# Sans latence fixée : celle de la configuration actuelle, mesurée pendant
+# la recherche (+10 %), la configuration retenue n'est jamais plus lente
+ML_SEARCH_MAX_LATENCY_MS = env.float('ML_SEARCH_MAX_LATENCY_MS', default=None)
+ML_SEARCH_MAX_SIZE_MB = env.float('ML_SEARCH_MAX_SIZE_MB', default=50.0)
+
+# Versions des modèles (ml_models.artifacts) : intervalle de vérification
+# du pointeur CURRENT par les workers (secondes), versions conservées
+ML_MODEL_RELOAD_INTERVAL = env.float('ML_MODEL_RELOAD_INTERVAL', default=5.0)
+ML_MODEL_KEEP_VERSIONS = env.int('ML_MODEL_KEEP_VERSIONS', default=5)
+
+# Cache des prédictions ML (LRU + TTL via le framework de cache Django)
+# Par défaut locmem (un cache par processus) ; pour un cache partagé :
+# ML_PREDICTION_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# ML_PREDICTION_CACHE_LOCATION=redis://localhost:6379/1
+ML_PREDICTION_CACHE_ENABLED = env.bool('ML_PREDICTION_CACHE_ENABLED', default=True)
+ML_PREDICTION_CACHE_ALIAS = 'ml_predictions'
+
+# Pas de quantification des entrées pour la clé de cache
+ML_PREDICTION_CACHE_RESOLUTION = {
+    'temperature': 0.5,
+    'humidity': 1.0,
+    'rainfall': 10.0,
+    'soil_ph': 0.1,
+    'area_hectares': 0.1,
+    'fertilizer_npk': 5.0,
+    'irrigation': 1.0,
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    ML_PREDICTION_CACHE_ALIAS: {
+        'BACKEND': env('ML_PREDICTION_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': env('ML_PREDICTION_CACHE_LOCATION', default='ml-predictions'),
+        'TIMEOUT': env.int('ML_PREDICTION_CACHE_TTL', default=3600),
+        'OPTIONS': {
+            'MAX_ENTRIES': env.int('ML_PREDICTION_CACHE_MAX_ENTRIES', default=20000),
+        },
+    },
+}
+
+# Moteur d'inférence des forêts : 'sklearn', 'flat' (tableaux NumPy aplatis)
+# ou 'compact' (artefact quantifié lu en mmap, partagé entre workers)
+ML_INFERENCE_BACKEND = env('ML_INFERENCE_BACKEND', default='sklearn')
+
+# Endpoints batch : taille max, seuil de streaming, taille des blocs
+ML_BATCH_MAX_ROWS = env.int('ML_BATCH_MAX_ROWS', default=50000)
+ML_BATCH_STREAM_THRESHOLD = env.int('ML_BATCH_STREAM_THRESHOLD', default=2000)
+ML_BATCH_CHUNK_SIZE = env.int('ML_BATCH_CHUNK_SIZE', default=2000)
+
+# Règles de risque de maladie : intervalle de vérification du fichier (secondes)
+ML_DISEASE_RULES_CHECK_INTERVAL = env.float('ML_DISEASE_RULES_CHECK_INTERVAL', default=5.0)
+
+# Les requêtes batch dépassent la limite par défaut de Django (2.5 MB)
+DATA_UPLOAD_MAX_MEMORY_SIZE = env.int('DATA_UPLOAD_MAX_MEMORY_SIZE', default=25 * 1024 * 1024)
+
 DATA_DIR = BASE_DIR / 'data'
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
+# Datasets produits par data_scraper (Parquet ou CSV)
+SCRAPED_DATA_DIR = Path(env('SCRAPED_DATA_DIR', default=str(BASE_DIR / 'data_scraper' / 'data')))
+
 # Hugging Face Models
 HUGGINGFACE_MODELS = {
     'crop_classification': 'google/vit-base-patch16-224',
@@ -7,3 +7,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'agri_smart_project.settings')
 
 application = get_wsgi_application()
+
+# Préchargement des modèles ML (avant le fork si gunicorn --preload)
+from django.conf import settings  # noqa: E402
+
+if settings.ML_PRELOAD_MODELS:
+    from ml_models.registry import registry  # noqa: E402
+    registry.preload()
@@ -0,0 +1,117 @@
+"""
+Tests de l'API : validation des entrées des endpoints ML
+"""
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from .views import _parse_bool
+
+
+class ParseBoolTests(TestCase):
+    def test_form_values(self):
+        for value in ('false', 'False', '0', 'no', 'non', 'off'):
+            self.assertFalse(_parse_bool(value, True), value)
+        for value in ('true', 'TRUE', '1', 'yes', 'oui', 'on', True):
+            self.assertTrue(_parse_bool(value), value)
+
+    def test_default_when_missing(self):
+        self.assertTrue(_parse_bool(None, True))
+        self.assertTrue(_parse_bool('', True))
+        self.assertFalse(_parse_bool(None))
+
+
+class MLEndpointValidationTests(TestCase):
+    ROW = {'temperature': 28.5, 'humidity': 75.0, 'rainfall': 1200, 'soil_ph': 6.5}
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_batch_details_false_from_form(self):
+        recommender = mock.Mock()
+        recommender.recommend_many.return_value = [[]]
+        with mock.patch('api.views.get_model', return_value=recommender):
+            response = self.client.post(
+                '/api/recommendations/batch/', {'rows': [self.ROW], 'details': 'false'}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertIs(recommender.recommend_many.call_args.kwargs['details'], False)
+
+    def test_non_numeric_field_is_bad_request(self):
+        with mock.patch('api.views.get_model') as get_model:
+            response = self.client.post('/api/recommendations/', {**self.ROW, 'rainfall': 'beaucoup'}, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('rainfall', response.json()['error'])
+        get_model.assert_not_called()
+
+    def test_non_numeric_batch_row_is_bad_request(self):
+        rows = [self.ROW, {**self.ROW, 'temperature': None}]
+        with mock.patch('api.views.get_model') as get_model:
+            response = self.client.post('/api/recommendations/batch/', {'rows': rows}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Ligne 1', response.json()['error'])
+        get_model.assert_not_called()
+
+    def test_yield_batch_optional_fertilizer(self):
+        row = {'crop': 'Maïs', 'area_hectares': 2, 'temperature': 27, 'rainfall': 900, 'soil_ph': 6.2,
+               'fertilizer_npk': ''}
+        predictor = mock.Mock()
+        predictor.predict_many.return_value = [{}]
+        with mock.patch('api.views.get_model', return_value=predictor):
+            response = self.client.post('/api/yield-prediction/batch/', {'rows': [row]}, format='json')
+            self.assertEqual(response.status_code, 200)
+
+            response = self.client.post(
+                '/api/yield-prediction/batch/', {'rows': [{**row, 'fertilizer_npk': 'NPK'}]}, format='json'
+            )
+            self.assertEqual(response.status_code, 400)
+
+    def test_quick_interpolate_false_from_form(self):
+        recommender = mock.Mock()
+        recommender.recommend_fast.return_value = {'recommendations': [], 'source': 'grid'}
+        with mock.patch('api.views.get_model', return_value=recommender):
+            response = self.client.post('/api/recommendations/quick/', {**self.ROW, 'interpolate': 'false'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIs(recommender.recommend_fast.call_args.kwargs['interpolate'], False)
+
+    def test_quick_non_numeric_field_is_bad_request(self):
+        with mock.patch('api.views.get_model') as get_model:
+            response = self.client.post('/api/recommendations/quick/', {**self.ROW, 'soil_ph': 'acide'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('soil_ph', response.json()['error'])
+        get_model.assert_not_called()
+
+
+class FarmIdValidationTests(TestCase):
+    """farm_id : entier attendu, sinon 400 (et non une erreur 500)"""
+
+    ROW = MLEndpointValidationTests.ROW
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create(username='agriculteur')
+
+    def post(self, farm_id, **options):
+        with mock.patch('api.views.get_model') as get_model:
+            response = self.client.post('/api/recommendations/', {**self.ROW, 'farm_id': farm_id}, **options)
+        return response, get_model
+
+    def test_non_integer_farm_id_is_bad_request(self):
+        self.client.force_authenticate(self.user)
+        for farm_id in ('abc', '1.5', 1.5, True, [1]):
+            with self.subTest(farm_id=farm_id):
+                response, get_model = self.post(farm_id, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('farm_id', response.json()['error'])
+                get_model.assert_not_called()
+
+    def test_unknown_farm_from_form_is_not_found(self):
+        self.client.force_authenticate(self.user)
+        response, _ = self.post(' 12345 ')
+        self.assertEqual(response.status_code, 404)
+
+    def test_anonymous_farm_id_is_unauthorized(self):
+        response, _ = self.post('abc', format='json')
+        self.assertEqual(response.status_code, 401)
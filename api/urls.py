@@ -9,7 +9,10 @@ app_name = 'api'
 urlpatterns = [
     # ML Endpoints
     path('recommendations/', views.crop_recommendation_api, name='crop_recommendation'),
+    path('recommendations/batch/', views.crop_recommendation_batch_api, name='crop_recommendation_batch'),
+    path('recommendations/quick/', views.crop_recommendation_quick_api, name='crop_recommendation_quick'),
     path('yield-prediction/', views.yield_prediction_api, name='yield_prediction'),
+    path('yield-prediction/batch/', views.yield_prediction_batch_api, name='yield_prediction_batch'),
     path('disease-risk/', views.disease_prediction_api, name='disease_risk'),
     
     # Chatbot - TEMPORAIREMENT DÉSACTIVÉ
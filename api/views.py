@@ -5,15 +5,169 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework import status
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.utils.translation import gettext as _
 
-from ml_models.predictor import CropRecommender, YieldPredictor, DiseasePredictor
+from ml_models.registry import get_model, registry
 # from chatbot.chatbot import get_chatbot  # Temporairement désactivé
+from core.features import farm_prediction_input
 from core.models import Crop, MarketPrice, Farm, CropSeason
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Champs convertis en float par les prédicteurs
+NUMERIC_FIELDS = ['temperature', 'humidity', 'rainfall', 'soil_ph', 'area_hectares', 'fertilizer_npk']
+
+
+def _parse_bool(value, default: bool = False) -> bool:
+    """Booléen JSON ou texte de formulaire ("false", "0", "non"... = False)"""
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on', 'oui')
+
+
+def _invalid_number(row) -> str:
+    """Premier champ numérique présent mais non convertible en float (ou None)"""
+    for field in NUMERIC_FIELDS:
+        if field not in row:
+            continue
+        value = row[field]
+        if field == 'fertilizer_npk' and value in (None, ''):
+            continue  # Optionnel : 0 par défaut
+        try:
+            float(value)
+        except (TypeError, ValueError):
+            return field
+    return None
+
+
+def _check_numbers(data):
+    """Response 400 si un champ numérique d'une requête unitaire est invalide"""
+    field = _invalid_number(data)
+    if field is None:
+        return None
+    return Response(
+        {'error': f'Le champ {field} doit être numérique'},
+        status=status.HTTP_400_BAD_REQUEST
+    )
+
+
+def _extract_batch_rows(request, required_fields):
+    """
+    Extrait et valide les lignes d'une requête batch
+    
+    Accepte une liste JSON ou {"rows": [...]}.
+    Retourne (rows, None) ou (None, Response d'erreur).
+    """
+    data = request.data
+    rows = data.get('rows') if isinstance(data, dict) else data
+    
+    if not isinstance(rows, list) or not rows:
+        return None, Response(
+            {'error': 'Une liste non vide "rows" est requise'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    if len(rows) > settings.ML_BATCH_MAX_ROWS:
+        return None, Response(
+            {'error': f'Maximum {settings.ML_BATCH_MAX_ROWS} lignes par requête'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            return None, Response(
+                {'error': f'Ligne {index}: objet JSON attendu'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        for field in required_fields:
+            if field not in row:
+                return None, Response(
+                    {'error': f'Ligne {index}: le champ {field} est requis'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        field = _invalid_number(row)
+        if field is not None:
+            return None, Response(
+                {'error': f'Ligne {index}: le champ {field} doit être numérique'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+    
+    return rows, None
+
+
+def _with_farm_features(request):
+    """
+    Complète les entrées avec les features de la ferme "farm_id" (feature
+    store, une lecture par clé) ; les valeurs envoyées restent prioritaires
+    
+    Retourne (données, None) ou (None, Response d'erreur).
+    """
+    data = request.data
+    if not hasattr(data, 'get') or data.get('farm_id') in (None, ''):
+        return data, None
+    
+    if not request.user.is_authenticated:
+        return None, Response(
+            {'error': 'Authentification requise pour utiliser farm_id'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+    
+    farm_id = data['farm_id']
+    try:
+        if isinstance(farm_id, bool):
+            raise ValueError(farm_id)
+        farm_id = int(str(farm_id).strip())
+    except ValueError:
+        return None, Response(
+            {'error': 'Le champ farm_id doit être un entier'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    farm = Farm.objects.select_related('features').filter(id=farm_id, user=request.user).first()
+    if farm is None:
+        return None, Response(
+            {'error': 'Ferme introuvable'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    # QueryDict (formulaire) ou dictionnaire JSON
+    values = data.dict() if hasattr(data, 'dict') else data
+    return {**farm_prediction_input(farm), **values}, None
+
+
+def _batch_response(rows, score_chunk):
+    """
+    Construit la réponse d'un endpoint batch
+    
+    Les petits lots sont prédits en un seul appel. Au-delà de
+    ML_BATCH_STREAM_THRESHOLD lignes, la réponse JSON est streamée
+    par blocs de ML_BATCH_CHUNK_SIZE lignes (un appel vectorisé par bloc).
+    """
+    if len(rows) <= settings.ML_BATCH_STREAM_THRESHOLD:
+        return Response({
+            'success': True,
+            'count': len(rows),
+            'results': score_chunk(rows)
+        })
+    
+    chunk_size = settings.ML_BATCH_CHUNK_SIZE
+    
+    def generate():
+        yield f'{{"success": true, "count": {len(rows)}, "results": ['
+        for start in range(0, len(rows), chunk_size):
+            results = score_chunk(rows[start:start + chunk_size])
+            body = json.dumps(results, ensure_ascii=False)[1:-1]
+            yield (',' if start else '') + body
+        yield ']}'
+    
+    return StreamingHttpResponse(generate(), content_type='application/json')
+
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -30,25 +184,35 @@ def crop_recommendation_api(request):
         "soil_type": "LOAM",
         "region": "CENTER"
     }
+    
+    Avec "farm_id" (utilisateur connecté), les champs absents sont lus dans
+    les features de la ferme : POST {"farm_id": 12}
     """
     try:
+        data, error = _with_farm_features(request)
+        if error:
+            return error
+        
         # Valider les données
         required_fields = ['temperature', 'humidity', 'rainfall', 'soil_ph']
         for field in required_fields:
-            if field not in request.data:
+            if field not in data:
                 return Response(
                     {'error': f'Le champ {field} est requis'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+        error = _check_numbers(data)
+        if error:
+            return error
         
         # Faire la prédiction
-        recommender = CropRecommender()
-        recommendations = recommender.recommend(request.data)
+        recommender = get_model('crop_recommender')
+        recommendations = recommender.recommend(data)
         
         return Response({
             'success': True,
             'recommendations': recommendations,
-            'input': request.data
+            'input': data
         })
         
     except Exception as e:
@@ -59,6 +223,97 @@ def crop_recommendation_api(request):
         )
 
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def crop_recommendation_batch_api(request):
+    """
+    API endpoint pour recommandations de cultures en lot
+    
+    POST /api/recommendations/batch/
+    {
+        "rows": [
+            {"temperature": 28.5, "humidity": 75.0, "rainfall": 1200, "soil_ph": 6.5},
+            ...
+        ],
+        "details": false
+    }
+    """
+    try:
+        rows, error = _extract_batch_rows(
+            request, ['temperature', 'humidity', 'rainfall', 'soil_ph']
+        )
+        if error:
+            return error
+        
+        details = _parse_bool(request.data.get('details'), True) if isinstance(request.data, dict) else True
+        recommender = get_model('crop_recommender')
+        
+        return _batch_response(
+            rows,
+            lambda chunk: recommender.recommend_many(chunk, details=details)
+        )
+        
+    except Exception as e:
+        logger.error(f"Erreur API recommandation batch: {e}")
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def crop_recommendation_quick_api(request):
+    """
+    API endpoint basse latence pour canaux USSD/SMS
+    
+    Réponse lue dans la grille précalculée (modèle seulement hors grille)
+    
+    POST /api/recommendations/quick/
+    {
+        "temperature": 28.5,
+        "humidity": 75.0,
+        "rainfall": 1200,
+        "soil_ph": 6.5,
+        "interpolate": false
+    }
+    """
+    try:
+        data, error = _with_farm_features(request)
+        if error:
+            return error
+        
+        required_fields = ['temperature', 'humidity', 'rainfall', 'soil_ph']
+        for field in required_fields:
+            if field not in data:
+                return Response(
+                    {'error': f'Le champ {field} est requis'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        error = _check_numbers(data)
+        if error:
+            return error
+        
+        recommender = get_model('crop_recommender')
+        result = recommender.recommend_fast(
+            data,
+            interpolate=_parse_bool(data.get('interpolate'))
+        )
+        
+        return Response({
+            'success': True,
+            'recommendations': result['recommendations'],
+            'source': result['source']
+        })
+        
+    except Exception as e:
+        logger.error(f"Erreur API recommandation rapide: {e}")
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def yield_prediction_api(request):
@@ -75,25 +330,35 @@ def yield_prediction_api(request):
         "fertilizer_npk": 250,
         "irrigation": true
     }
+    
+    Avec "farm_id" (utilisateur connecté), seuls "crop" et "fertilizer_npk"
+    sont à fournir : le reste vient de la ferme et de ses features
     """
     try:
+        data, error = _with_farm_features(request)
+        if error:
+            return error
+        
         # Valider les données
         required_fields = ['crop', 'area_hectares', 'temperature', 'rainfall', 'soil_ph']
         for field in required_fields:
-            if field not in request.data:
+            if field not in data:
                 return Response(
                     {'error': f'Le champ {field} est requis'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+        error = _check_numbers(data)
+        if error:
+            return error
         
         # Faire la prédiction
-        predictor = YieldPredictor()
-        prediction = predictor.predict(request.data)
+        predictor = get_model('yield_predictor')
+        prediction = predictor.predict(data)
         
         return Response({
             'success': True,
             'prediction': prediction,
-            'input': request.data
+            'input': data
         })
         
     except Exception as e:
@@ -104,6 +369,40 @@ def yield_prediction_api(request):
         )
 
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def yield_prediction_batch_api(request):
+    """
+    API endpoint pour prédiction de rendement en lot
+    
+    POST /api/yield-prediction/batch/
+    {
+        "rows": [
+            {"crop": "Maïs", "area_hectares": 2.5, "temperature": 27.0,
+             "rainfall": 900, "soil_ph": 6.2, "fertilizer_npk": 250, "irrigation": true},
+            ...
+        ]
+    }
+    """
+    try:
+        rows, error = _extract_batch_rows(
+            request, ['crop', 'area_hectares', 'temperature', 'rainfall', 'soil_ph']
+        )
+        if error:
+            return error
+        
+        predictor = get_model('yield_predictor')
+        
+        return _batch_response(rows, predictor.predict_many)
+        
+    except Exception as e:
+        logger.error(f"Erreur API prédiction batch: {e}")
+        return Response(
+            {'error': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def disease_prediction_api(request):
@@ -126,8 +425,11 @@ def disease_prediction_api(request):
                     {'error': f'Le champ {field} est requis'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+        error = _check_numbers(request.data)
+        if error:
+            return error
         
-        predictor = DiseasePredictor()
+        predictor = get_model('disease_predictor')
         risk = predictor.predict_risk(request.data)
         
         return Response({
@@ -297,5 +599,6 @@ def health_check(request):
     return Response({
         'status': 'healthy',
         'version': '1.0.0',
-        'service': 'Agri Smart API'
+        'service': 'Agri Smart API',
+        'models': registry.stats()
     })
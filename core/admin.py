@@ -3,7 +3,7 @@ Core Admin Configuration
 """
 from django.contrib import admin
 from django.utils.translation import gettext_lazy as _
-from .models import Farm, Crop, CropSeason, WeatherData, Prediction, MarketPrice, UserPreference
+from .models import Farm, Crop, CropSeason, WeatherData, FarmFeatures, Prediction, MarketPrice, UserPreference
 
 
 @admin.register(Farm)
@@ -95,6 +95,13 @@ class WeatherDataAdmin(admin.ModelAdmin):
     date_hierarchy = 'date'
 
 
+@admin.register(FarmFeatures)
+class FarmFeaturesAdmin(admin.ModelAdmin):
+    list_display = ['farm', 'as_of', 'rainfall_30d', 'rainfall_90d', 'gdd_90d', 'humidity_30d', 'et0_30d']
+    search_fields = ['farm__name']
+    readonly_fields = ['updated_at']
+
+
 @admin.register(Prediction)
 class PredictionAdmin(admin.ModelAdmin):
     list_display = ['user', 'prediction_type', 'confidence_score', 'created_at']
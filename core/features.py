@@ -0,0 +1,233 @@
+"""
+Feature store par ferme (FarmFeatures)
+
+Maintient, pour chaque ferme, des agrégats glissants de ses relevés météo
+(fenêtres de 30 et 90 jours se terminant au dernier relevé) :
+- cumuls de pluie, degrés-jours de croissance (base 10°C), ET0
+- température et humidité moyennes
+
+Mise à jour incrémentale (signal post_save de WeatherData) : le relevé du
+jour suivant fait glisser les fenêtres d'un jour (ajout du nouveau jour,
+retrait des jours sortis, sans agrégat) ; une correction, un rattrapage
+ou une suppression recalcule la ferme. Les chargements en masse (SQL,
+bulk_create) ne déclenchent pas de signal : appeler refresh_farm_features.
+"""
+from datetime import timedelta
+import logging
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from django.db.models import Max
+
+from .models import Farm, FarmFeatures, WeatherData
+
+logger = logging.getLogger(__name__)
+
+SHORT_WINDOW = 30
+LONG_WINDOW = 90
+
+# Température de base des degrés-jours (cultures tropicales : maïs, riz, sorgho...)
+GDD_BASE_TEMPERATURE = 10.0
+
+WEATHER_COLUMNS = [
+    'farm_id', 'date', 'temperature_max', 'temperature_min', 'temperature_avg',
+    'rainfall_mm', 'humidity_percent', 'evapotranspiration'
+]
+
+# Cumuls par fenêtre, puis moyennes sur 30 jours
+SUM_FIELDS = {
+    SHORT_WINDOW: ['rainfall_30d', 'gdd_30d', 'et0_30d'],
+    LONG_WINDOW: ['rainfall_90d', 'gdd_90d'],
+}
+MEAN_FIELDS = ['temperature_30d', 'humidity_30d']
+FEATURE_FIELDS = ['as_of', 'days_30d', 'days_90d'] + SUM_FIELDS[SHORT_WINDOW] + SUM_FIELDS[LONG_WINDOW] + MEAN_FIELDS
+
+
+def extraterrestrial_radiation(latitude, day_of_year):
+    """Rayonnement extraterrestre Ra (FAO-56, éq. 21), en mm/jour d'évaporation"""
+    phi = np.radians(latitude)
+    angle = 2 * np.pi * np.asarray(day_of_year) / 365
+    dr = 1 + 0.033 * np.cos(angle)
+    declination = 0.409 * np.sin(angle - 1.39)
+    sunset = np.arccos(np.clip(-np.tan(phi) * np.tan(declination), -1, 1))
+    ra = 24 * 60 / np.pi * 0.0820 * dr * (
+        sunset * np.sin(phi) * np.sin(declination) + np.cos(phi) * np.cos(declination) * np.sin(sunset)
+    )
+    return 0.408 * ra
+
+
+def hargreaves_et0(temperature_min, temperature_max, latitude, day_of_year):
+    """ET0 de Hargreaves (mm/jour) : seules les températures sont nécessaires"""
+    temperature_min = np.asarray(temperature_min, dtype=float)
+    temperature_max = np.asarray(temperature_max, dtype=float)
+    mean = (temperature_max + temperature_min) / 2
+    spread = np.sqrt(np.maximum(temperature_max - temperature_min, 0))
+    return 0.0023 * extraterrestrial_radiation(latitude, day_of_year) * (mean + 17.8) * spread
+
+
+def daily_features(df: pd.DataFrame, latitude) -> pd.DataFrame:
+    """
+    Contributions journalières de relevés (une ligne par relevé)
+
+    ET0 : valeur mesurée si le relevé en a une, sinon Hargreaves.
+    latitude : scalaire ou tableau aligné sur df
+    """
+    dates = pd.to_datetime(df['date'])
+    values = df[WEATHER_COLUMNS[2:]].astype(float)
+    gdd = np.maximum((values['temperature_max'] + values['temperature_min']) / 2 - GDD_BASE_TEMPERATURE, 0)
+    et0 = hargreaves_et0(values['temperature_min'], values['temperature_max'], latitude, dates.dt.dayofyear)
+    return pd.DataFrame({
+        'rainfall': values['rainfall_mm'],
+        'gdd': gdd,
+        'et0': values['evapotranspiration'].fillna(pd.Series(et0, index=df.index)),
+        'temperature': values['temperature_avg'],
+        'humidity': values['humidity_percent'],
+    }, index=df.index)
+
+
+def refresh_farm_features(farm_ids=None, batch_size: int = 500) -> int:
+    """
+    Recalcule les features de fermes (toutes si farm_ids est None) à partir
+    de leurs relevés : un agrégat par lot de fermes, upsert groupé
+
+    Returns:
+        Nombre de fermes mises à jour
+    """
+    if farm_ids is None:
+        farm_ids = WeatherData.objects.values_list('farm_id', flat=True).distinct()
+    farm_ids = sorted(set(farm_ids))
+
+    updated = 0
+    for start in range(0, len(farm_ids), batch_size):
+        batch = farm_ids[start:start + batch_size]
+        features = _compute_features(batch)
+        FarmFeatures.objects.filter(farm_id__in=set(batch) - set(features)).delete()
+        FarmFeatures.objects.bulk_create(
+            [FarmFeatures(farm_id=farm_id, **values) for farm_id, values in features.items()],
+            update_conflicts=True,
+            unique_fields=['farm'],
+            update_fields=FEATURE_FIELDS + ['updated_at'],
+        )
+        updated += len(features)
+
+    logger.info(f"Features recalculées pour {updated} fermes")
+    return updated
+
+
+def _compute_features(farm_ids: list) -> dict:
+    """{farm_id: valeurs des champs} pour les fermes ayant des relevés"""
+    latest = dict(
+        WeatherData.objects.filter(farm_id__in=farm_ids)
+        .values('farm_id').annotate(last=Max('date')).values_list('farm_id', 'last')
+    )
+    if not latest:
+        return {}
+
+    since = min(latest.values()) - timedelta(days=LONG_WINDOW - 1)
+    df = pd.DataFrame(list(
+        WeatherData.objects.filter(farm_id__in=latest, date__gte=since).values(*WEATHER_COLUMNS)
+    ))
+    latitudes = dict(Farm.objects.filter(id__in=latest).values_list('id', 'latitude'))
+
+    # Âge de chaque relevé par rapport au dernier relevé de sa ferme
+    df['age'] = (pd.to_datetime(df['farm_id'].map(latest)) - pd.to_datetime(df['date'])).dt.days
+    df = df[df['age'] < LONG_WINDOW]
+    daily = daily_features(df, df['farm_id'].map(latitudes).to_numpy(dtype=float))
+    daily['farm_id'] = df['farm_id']
+    short = daily[df['age'] < SHORT_WINDOW]
+
+    long_window = daily.groupby('farm_id').agg(
+        days_90d=('rainfall', 'size'), rainfall_90d=('rainfall', 'sum'), gdd_90d=('gdd', 'sum'),
+    )
+    short_window = short.groupby('farm_id').agg(
+        days_30d=('rainfall', 'size'), rainfall_30d=('rainfall', 'sum'), gdd_30d=('gdd', 'sum'),
+        et0_30d=('et0', 'sum'), temperature_30d=('temperature', 'mean'), humidity_30d=('humidity', 'mean'),
+    )
+    table = long_window.join(short_window)
+
+    return {
+        int(farm_id): {
+            'as_of': latest[farm_id],
+            **{field: int(row[field]) for field in ('days_30d', 'days_90d')},
+            **{field: float(row[field]) for field in table.columns if field not in ('days_30d', 'days_90d')},
+        }
+        for farm_id, row in table.iterrows()
+    }
+
+
+def apply_weather(weather: WeatherData, created: bool):
+    """
+    Met à jour les features de la ferme d'un relevé enregistré
+
+    Relevé du jour suivant le dernier relevé : les fenêtres glissent d'un
+    jour (lecture des deux jours sortants seulement). Sinon, la ferme est
+    recalculée (premier relevé, correction, rattrapage, trou).
+    """
+    date = pd.Timestamp(weather.date).date()
+    with transaction.atomic():
+        features = (
+            FarmFeatures.objects.select_for_update().select_related('farm')
+            .filter(farm_id=weather.farm_id).first()
+        )
+        if not (created and features is not None and date == features.as_of + timedelta(days=1)):
+            if features is not None and created and date <= features.as_of - timedelta(days=LONG_WINDOW):
+                return  # Relevé trop ancien : hors des fenêtres
+            refresh_farm_features([weather.farm_id])
+            return
+
+        leaving = {
+            (date - row['date']).days: row
+            for row in WeatherData.objects.filter(
+                farm_id=weather.farm_id,
+                date__in=[date - timedelta(days=SHORT_WINDOW), date - timedelta(days=LONG_WINDOW)],
+            ).values(*WEATHER_COLUMNS)
+        }
+        added = {name: getattr(weather, name) for name in WEATHER_COLUMNS}
+        rows = pd.DataFrame([{**added, 'date': date}] + list(leaving.values()))
+        daily = daily_features(rows, features.farm.latitude).to_dict('records')
+        added, removed = daily[0], dict(zip(leaving, daily[1:]))
+
+        for window, count_field in ((SHORT_WINDOW, 'days_30d'), (LONG_WINDOW, 'days_90d')):
+            old = removed.get(window)
+            count = getattr(features, count_field)
+            new_count = count + 1 - (old is not None)
+
+            for field in SUM_FIELDS[window] + (MEAN_FIELDS if window == SHORT_WINDOW else []):
+                key = field.rsplit('_', 1)[0]
+                total = getattr(features, field) * (count if field in MEAN_FIELDS else 1)
+                total += added[key] - (old[key] if old is not None else 0)
+                setattr(features, field, total / new_count if field in MEAN_FIELDS else total)
+            setattr(features, count_field, new_count)
+
+        features.as_of = date
+        features.save()
+
+
+def farm_prediction_input(farm: Farm) -> dict:
+    """
+    Entrées des prédicteurs dérivées d'une ferme
+
+    La ferme doit être lue avec select_related('features') : une seule
+    requête par clé, sans agrégat. Pluie ramenée à l'échelle annuelle des
+    modèles (moyenne sur 90 jours x 365). Seules les valeurs connues sont
+    renvoyées : les entrées de la requête les complètent ou les remplacent.
+    """
+    values = {
+        'area_hectares': farm.area_hectares,
+        'soil_type': farm.soil_type,
+        'region': farm.region,
+        'irrigation': farm.irrigation_available,
+    }
+    if farm.soil_ph is not None:
+        values['soil_ph'] = farm.soil_ph
+
+    if hasattr(farm, 'features'):
+        features = farm.features
+        values.update({
+            'temperature': round(features.temperature_30d, 2),
+            'humidity': round(features.humidity_30d, 2),
+            'rainfall': round(features.rainfall_90d / features.days_90d * 365, 1),
+            'features_as_of': features.as_of.isoformat(),
+        })
+    return values
@@ -0,0 +1,33 @@
+# Generated by Django 5.0 on 2026-10-18 03:21
+
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+def remove_duplicate_market_prices(apps, schema_editor):
+    """Garde le dernier prix importé (id max) par culture, région et jour"""
+    MarketPrice = apps.get_model('core', 'MarketPrice')
+    duplicates = (
+        MarketPrice.objects.values('crop_id', 'region', 'date')
+        .annotate(keep_id=Max('id'), count=Count('id'))
+        .filter(count__gt=1)
+    )
+    for row in duplicates:
+        MarketPrice.objects.filter(
+            crop_id=row['crop_id'], region=row['region'], date=row['date']
+        ).exclude(id=row['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_market_prices, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='marketprice',
+            unique_together={('crop', 'region', 'date')},
+        ),
+    ]
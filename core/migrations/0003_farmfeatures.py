@@ -0,0 +1,35 @@
+# Generated by Django 5.0 on 2026-10-18 03:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_marketprice_unique_crop_region_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FarmFeatures',
+            fields=[
+                ('farm', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='features', serialize=False, to='core.farm')),
+                ('as_of', models.DateField(verbose_name='Dernier relevé')),
+                ('days_30d', models.IntegerField(verbose_name='Relevés sur 30 jours')),
+                ('days_90d', models.IntegerField(verbose_name='Relevés sur 90 jours')),
+                ('rainfall_30d', models.FloatField(verbose_name='Précipitations 30 jours (mm)')),
+                ('rainfall_90d', models.FloatField(verbose_name='Précipitations 90 jours (mm)')),
+                ('gdd_30d', models.FloatField(verbose_name='Degrés-jours de croissance 30 jours')),
+                ('gdd_90d', models.FloatField(verbose_name='Degrés-jours de croissance 90 jours')),
+                ('temperature_30d', models.FloatField(verbose_name='Température moy 30 jours (°C)')),
+                ('humidity_30d', models.FloatField(verbose_name='Humidité moy 30 jours (%)')),
+                ('et0_30d', models.FloatField(verbose_name='Évapotranspiration ET0 30 jours (mm)')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Features de ferme',
+                'verbose_name_plural': 'Features de fermes',
+            },
+        ),
+    ]
@@ -166,6 +166,34 @@ class WeatherData(models.Model):
         return f"{self.farm.name} - {self.date}"
 
 
+class FarmFeatures(models.Model):
+    """
+    Features dérivées d'une ferme, tenues à jour à l'arrivée des relevés
+    météo (core.features) : une prédiction par ferme est une lecture par clé
+    
+    Fenêtres glissantes de 30 et 90 jours se terminant au dernier relevé.
+    """
+    farm = models.OneToOneField(Farm, on_delete=models.CASCADE, primary_key=True, related_name='features')
+    as_of = models.DateField(_('Dernier relevé'))
+    days_30d = models.IntegerField(_('Relevés sur 30 jours'))
+    days_90d = models.IntegerField(_('Relevés sur 90 jours'))
+    rainfall_30d = models.FloatField(_('Précipitations 30 jours (mm)'))
+    rainfall_90d = models.FloatField(_('Précipitations 90 jours (mm)'))
+    gdd_30d = models.FloatField(_('Degrés-jours de croissance 30 jours'))
+    gdd_90d = models.FloatField(_('Degrés-jours de croissance 90 jours'))
+    temperature_30d = models.FloatField(_('Température moy 30 jours (°C)'))
+    humidity_30d = models.FloatField(_('Humidité moy 30 jours (%)'))
+    et0_30d = models.FloatField(_('Évapotranspiration ET0 30 jours (mm)'))
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = _('Features de ferme')
+        verbose_name_plural = _('Features de fermes')
+    
+    def __str__(self):
+        return f"{self.farm.name} - {self.as_of}"
+
+
 class Prediction(models.Model):
     """Prédictions ML pour l'utilisateur"""
     PREDICTION_TYPES = [
@@ -205,6 +233,8 @@ class MarketPrice(models.Model):
         verbose_name = _('Prix de marché')
         verbose_name_plural = _('Prix de marché')
         ordering = ['-date']
+        # Un prix par culture, région et jour (clé des imports groupés)
+        unique_together = ['crop', 'region', 'date']
     
     def __str__(self):
         return f"{self.crop.name_fr} - {self.region} ({self.date})"
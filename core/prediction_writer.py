@@ -0,0 +1,182 @@
+"""
+Écriture asynchrone et groupée des prédictions
+Sort les Prediction.objects.create du chemin de la requête
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+import logging
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# Marqueur de file : vide le lot en cours sans attendre FLUSH_MS
+_FLUSH = object()
+
+
+def write_predictions(records: list):
+    """Insère un lot de prédictions en une requête (bulk_create)"""
+    from .models import Prediction
+
+    Prediction.objects.bulk_create(
+        [Prediction(**record) for record in records],
+        batch_size=settings.PREDICTION_WRITER_BATCH_SIZE
+    )
+
+
+class PredictionWriter:
+    """
+    File d'écriture des Prediction, vidée par lots
+
+    Backends (PREDICTION_WRITER_BACKEND) :
+    - 'sync' : écriture immédiate dans la requête (comportement historique)
+    - 'buffered' : file en mémoire vidée par un thread avec bulk_create
+      tous les PREDICTION_WRITER_BATCH_SIZE enregistrements ou toutes les
+      PREDICTION_WRITER_FLUSH_MS millisecondes
+    - 'celery' : mêmes lots, confiés à la tâche core.tasks.save_predictions
+      (broker memory:// + CELERY_TASK_ALWAYS_EAGER pour les tests)
+
+    Durabilité :
+    - la file est vidée à l'arrêt normal du processus (atexit, y compris
+      l'arrêt gracieux des workers gunicorn) et via flush()/close() ;
+    - un arrêt brutal (SIGKILL, OOM, crash) perd au plus les
+      enregistrements encore en file : un lot ou FLUSH_MS de prédictions ;
+    - si la file est pleine ou si un lot échoue, l'écriture repasse en
+      synchrone plutôt que de perdre des données ;
+    - created_at est la date d'insertion du lot, pas celle de la requête
+      (écart borné par FLUSH_MS).
+    """
+
+    def __init__(self, backend: str, batch_size: int, flush_ms: int, max_queue: int):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._stop = None
+
+    @classmethod
+    def from_settings(cls) -> 'PredictionWriter':
+        return cls(
+            backend=settings.PREDICTION_WRITER_BACKEND,
+            batch_size=settings.PREDICTION_WRITER_BATCH_SIZE,
+            flush_ms=settings.PREDICTION_WRITER_FLUSH_MS,
+            max_queue=settings.PREDICTION_WRITER_MAX_QUEUE,
+        )
+
+    def submit(self, **fields):
+        """
+        Enregistre une prédiction (champs de Prediction, FK en *_id)
+
+        Les valeurs doivent être sérialisables en JSON pour le backend celery.
+        """
+        if self.backend == 'sync':
+            write_predictions([fields])
+            return
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(fields)
+        except queue.Full:
+            logger.warning("File des prédictions pleine, écriture synchrone")
+            self._dispatch([fields])
+
+    def _ensure_started(self):
+        """Démarre le thread d'écriture (à nouveau après un fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._stop = threading.Event()
+            self._thread = threading.Thread(
+                target=self._run, name='prediction-writer', daemon=True
+            )
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        """Boucle du thread : accumule puis vide par lot ou par délai"""
+        batch = []
+        deadline = None
+
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                record = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                record = None
+
+            flushing = record is _FLUSH
+            if record is not None and not flushing:
+                batch.append(record)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            stopping = self._stop.is_set() and self._queue.empty()
+            if batch and (flushing or len(batch) >= self.batch_size or time.monotonic() >= deadline or stopping):
+                self._dispatch(batch)
+                for _ in batch:
+                    self._queue.task_done()
+                batch = []
+                deadline = None
+            if flushing:
+                self._queue.task_done()
+
+            if record is None and stopping:
+                close_old_connections()
+                return
+
+    def _dispatch(self, records: list):
+        """Envoie un lot vers la base (ou Celery), en synchrone si besoin"""
+        try:
+            if self.backend == 'celery':
+                from .tasks import save_predictions
+                save_predictions.delay(records)
+                return
+            close_old_connections()
+            write_predictions(records)
+        except Exception as e:
+            logger.error(f"Écriture groupée des prédictions échouée ({len(records)}), nouvel essai: {e}")
+            try:
+                close_old_connections()
+                write_predictions(records)
+            except Exception as e:
+                logger.error(f"{len(records)} prédictions perdues: {e}")
+
+    def flush(self):
+        """Bloque jusqu'à ce que tout ce qui est en file soit écrit (lot en cours compris)"""
+        if self._pid == os.getpid():
+            self._queue.put(_FLUSH)
+            self._queue.join()
+
+    def close(self):
+        """Vide la file et arrête le thread (appelé à l'arrêt du processus)"""
+        if self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._queue.put(None)
+        self._thread.join(timeout=max(self.flush_interval * 10, 5))
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_prediction_writer() -> PredictionWriter:
+    """Writer partagé du processus (vidé automatiquement à l'arrêt)"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = PredictionWriter.from_settings()
+                atexit.register(_writer.close)
+    return _writer
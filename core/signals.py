@@ -1,14 +1,21 @@
 """
 Core Signals - Django signals for automated tasks
 """
-from django.db.models.signals import post_save
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserPreference, CropSeason
+from .features import apply_weather, refresh_farm_features
+from .models import UserPreference, CropSeason, Farm, WeatherData
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Fermes dont des relevés ont été supprimés, en attente de recalcul (par thread)
+_deleted_weather = threading.local()
+
 
 @receiver(post_save, sender=User)
 def create_user_preference(sender, instance, created, **kwargs):
@@ -38,3 +45,53 @@ def calculate_season_metrics(sender, instance, created, **kwargs):
             if revenue > 0:
                 instance.profit_margin = ((revenue - cost) / revenue * 100)
                 instance.save(update_fields=['profit_margin'])
+
+
+@receiver(post_save, sender=WeatherData)
+def update_farm_features(sender, instance, created, raw=False, **kwargs):
+    """
+    Mettre à jour les features de la ferme (FarmFeatures) à chaque relevé
+    """
+    if raw:
+        return
+    try:
+        apply_weather(instance, created)
+    except Exception as e:
+        # Le relevé est enregistré : les features seront recalculées plus tard
+        logger.error(f"Mise à jour des features de la ferme {instance.farm_id} impossible: {e}")
+
+
+def _refresh_deleted_weather():
+    """
+    Recalcul groupé après la transaction de suppression : le premier
+    rappel traite toutes les fermes en attente, les suivants n'ont rien à
+    faire. Les fermes supprimées elles-mêmes (cascade) sont ignorées.
+    """
+    farm_ids = getattr(_deleted_weather, 'farm_ids', None)
+    if not farm_ids:
+        return
+    _deleted_weather.farm_ids = set()
+    try:
+        remaining = list(Farm.objects.filter(id__in=farm_ids).values_list('id', flat=True))
+        if remaining:
+            refresh_farm_features(remaining)
+    except Exception as e:
+        logger.error(f"Recalcul des features des fermes {sorted(farm_ids)} impossible: {e}")
+
+
+@receiver(post_delete, sender=WeatherData)
+def remove_farm_weather(sender, instance, **kwargs):
+    """
+    Recalculer les features de la ferme après suppression d'un relevé
+
+    Une seule fois par ferme et par transaction (suppression d'un
+    queryset, cascade), après validation de la transaction
+    """
+    try:
+        if getattr(_deleted_weather, 'farm_ids', None) is None:
+            _deleted_weather.farm_ids = set()
+        _deleted_weather.farm_ids.add(instance.farm_id)
+        transaction.on_commit(_refresh_deleted_weather)
+    except Exception as e:
+        # Le relevé est supprimé : les features seront recalculées plus tard
+        logger.error(f"Mise à jour des features de la ferme {instance.farm_id} impossible: {e}")
@@ -0,0 +1,16 @@
+"""
+Tâches Celery de l'application core
+"""
+from agri_smart_project.celery import app
+
+from .prediction_writer import write_predictions
+
+
+@app.task(bind=True, ignore_result=True, max_retries=3, default_retry_delay=5)
+def save_predictions(self, records: list):
+    """Insère un lot de prédictions envoyé par PredictionWriter"""
+    try:
+        write_predictions(records)
+    except Exception as e:
+        raise self.retry(exc=e)
+    return len(records)
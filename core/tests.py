@@ -0,0 +1,381 @@
+"""
+Tests de l'application core
+"""
+import contextlib
+import csv
+import io
+import re
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+import load_data
+from . import prediction_writer, signals
+from .features import FEATURE_FIELDS, _compute_features, refresh_farm_features
+from .models import Crop, Farm, FarmFeatures, MarketPrice, Prediction, WeatherData
+from .prediction_writer import PredictionWriter
+
+
+def prediction_record(index: int = 0, user_id: int = 1) -> dict:
+    return {
+        'user_id': user_id,
+        'prediction_type': 'CROP_RECOMMENDATION',
+        'input_data': {'temperature': 20 + index},
+        'output_data': {'recommendations': []},
+    }
+
+
+class PredictionWriterTests(SimpleTestCase):
+    """File d'écriture groupée, write_predictions remplacé par un enregistreur"""
+
+    def setUp(self):
+        self.batches = []
+        self.written = threading.Event()
+        patcher = mock.patch.object(prediction_writer, 'write_predictions', side_effect=self.record_batch)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def record_batch(self, records):
+        self.batches.append(list(records))
+        self.written.set()
+
+    def writer(self, **options) -> PredictionWriter:
+        options = {'backend': 'buffered', 'batch_size': 100, 'flush_ms': 60000, 'max_queue': 1000, **options}
+        writer = PredictionWriter(**options)
+        self.addCleanup(writer.close)
+        return writer
+
+    def test_full_batches_are_written_together(self):
+        writer = self.writer(batch_size=5)
+        for index in range(12):
+            writer.submit(**prediction_record(index))
+        writer.flush()
+
+        self.assertEqual([len(batch) for batch in self.batches], [5, 5, 2])
+        self.assertEqual(
+            [record['input_data']['temperature'] for batch in self.batches for record in batch],
+            list(range(20, 32))
+        )
+
+    def test_partial_batch_written_after_flush_interval(self):
+        writer = self.writer(flush_ms=50)
+        for index in range(3):
+            writer.submit(**prediction_record(index))
+
+        self.assertTrue(self.written.wait(5))
+        self.assertEqual([len(batch) for batch in self.batches], [3])
+
+    def test_flush_does_not_wait_for_interval(self):
+        writer = self.writer()
+        writer.submit(**prediction_record())
+        started = time.monotonic()
+        writer.flush()
+
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(len(self.batches), 1)
+
+    def test_close_drains_queue(self):
+        writer = self.writer()
+        for index in range(3):
+            writer.submit(**prediction_record(index))
+        writer.close()
+
+        self.assertFalse(writer._thread.is_alive())
+        self.assertEqual([len(batch) for batch in self.batches], [3])
+
+    def test_failed_batch_is_retried(self):
+        prediction_writer.write_predictions.side_effect = [RuntimeError('base verrouillée'), None]
+        writer = self.writer()
+        writer.submit(**prediction_record())
+        writer.flush()
+
+        self.assertEqual(prediction_writer.write_predictions.call_count, 2)
+
+    def test_sync_backend_writes_in_request(self):
+        writer = self.writer(backend='sync')
+        writer.submit(**prediction_record())
+
+        self.assertEqual(len(self.batches), 1)
+        self.assertIsNone(writer._thread)
+
+    def test_shared_writer_is_closed_at_exit(self):
+        with mock.patch.object(prediction_writer, '_writer', None), \
+                mock.patch.object(prediction_writer.atexit, 'register') as register:
+            writer = prediction_writer.get_prediction_writer()
+            self.assertIs(prediction_writer.get_prediction_writer(), writer)
+        register.assert_called_once_with(writer.close)
+
+
+class PredictionWriterDatabaseTests(TransactionTestCase):
+    def test_buffered_predictions_reach_database(self):
+        user = User.objects.create_user('agriculteur', password='motdepasse-test')
+        writer = PredictionWriter(backend='buffered', batch_size=4, flush_ms=60000, max_queue=100)
+        for index in range(10):
+            writer.submit(**prediction_record(index, user.id))
+        writer.close()
+
+        self.assertEqual(Prediction.objects.filter(user=user).count(), 10)
+
+
+class MarketPriceLoadTests(TestCase):
+    """Chargement des prix de marché : upsert sur (crop, region, date)"""
+
+    def setUp(self):
+        self.data_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.data_dir, ignore_errors=True)
+        settings_override = override_settings(SCRAPED_DATA_DIR=self.data_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.maize = Crop.objects.create(
+            name_fr='Maïs', name_en='Maize', category='Céréale', growing_season_days=120,
+            water_requirement='Moyen', temperature_min=18, temperature_max=32,
+            optimal_ph_min=5.5, optimal_ph_max=7.0,
+        )
+
+    def load(self, rows):
+        pd.DataFrame(rows, columns=['date', 'crop', 'market', 'price_per_kg']).to_csv(
+            self.data_dir / 'market_prices.csv', index=False
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            load_data.load_market_prices()
+
+    def prices(self):
+        return {
+            (price.region, price.date.isoformat()): price.price_per_kg
+            for price in MarketPrice.objects.filter(crop=self.maize)
+        }
+
+    def test_daily_mean_per_region(self):
+        self.load([
+            ('2024-03-01', 'Maïs', 'Yaoundé', 200.0),
+            ('2024-03-01', 'Maïs', 'Yaoundé', 250.0),
+            ('2024-03-01', 'Maïs', 'Douala', 300.0),
+            ('2024-03-02', 'Maïs', 'Yaoundé', 210.0),
+            ('2024-03-01', 'Culture inconnue', 'Yaoundé', 999.0),
+            ('2024-03-01', 'Maïs', 'Marché inconnu', 999.0),
+        ])
+
+        self.assertEqual(self.prices(), {
+            ('CENTER', '2024-03-01'): Decimal('225.00'),
+            ('LITTORAL', '2024-03-01'): Decimal('300.00'),
+            ('CENTER', '2024-03-02'): Decimal('210.00'),
+        })
+
+    def test_reload_updates_without_duplicates(self):
+        self.load([
+            ('2024-03-01', 'Maïs', 'Yaoundé', 200.0),
+            ('2024-03-01', 'Maïs', 'Douala', 300.0),
+        ])
+        first_ids = set(MarketPrice.objects.values_list('id', flat=True))
+
+        self.load([
+            ('2024-03-01', 'Maïs', 'Yaoundé', 240.0),
+            ('2024-03-02', 'Maïs', 'Yaoundé', 220.0),
+        ])
+
+        self.assertEqual(self.prices(), {
+            ('CENTER', '2024-03-01'): Decimal('240.00'),
+            ('LITTORAL', '2024-03-01'): Decimal('300.00'),
+            ('CENTER', '2024-03-02'): Decimal('220.00'),
+        })
+        self.assertTrue(first_ids <= set(MarketPrice.objects.values_list('id', flat=True)))
+
+
+class CopyExpertCursor:
+    """
+    Curseur SQLite exposant copy_expert comme psycopg2 : le CSV reçu est
+    relu selon les règles de COPY ... WITH (FORMAT csv) (champ vide = NULL)
+    puis inséré dans la table temporaire
+    """
+
+    COPY_SQL = re.compile(r'COPY (\w+) \(([\w, ]+)\) FROM STDIN WITH \(FORMAT csv\)')
+
+    def __init__(self, cursor, copies: list):
+        self._cursor = cursor
+        self.cursor = self
+        self.copies = copies
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def copy_expert(self, sql, file):
+        table, names = self.COPY_SQL.fullmatch(sql).groups()
+        content = file.read()
+        self.copies.append((sql, content))
+        rows = [[value if value != '' else None for value in row] for row in csv.reader(io.StringIO(content))]
+        placeholders = ', '.join(['%s'] * len(names.split(', ')))
+        self._cursor.executemany(f"INSERT INTO {table} ({names}) VALUES ({placeholders})", rows)
+
+
+class WeatherStationCopyLoadTests(TestCase):
+    """Branche PostgreSQL de load_staged (COPY FROM STDIN) rejouée sur SQLite"""
+
+    def setUp(self):
+        self.data_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.data_dir, ignore_errors=True)
+        settings_override = override_settings(SCRAPED_DATA_DIR=self.data_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.copies = []
+        real_connection = load_data.connection
+
+        @contextlib.contextmanager
+        def cursor():
+            with real_connection.cursor() as real_cursor:
+                yield CopyExpertCursor(real_cursor, self.copies)
+
+        postgres = mock.Mock(vendor='postgresql', cursor=cursor)
+        patcher = mock.patch.object(load_data, 'connection', postgres)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def load(self, temperature_max, evapotranspiration):
+        # float32 comme dans les Parquet du scraper relus par pyarrow
+        pd.DataFrame({
+            'station_id': ['STN_001', 'STN_001', 'STN_002'],
+            'date': pd.to_datetime(['2024-03-01', '2024-03-02', '2024-03-01']),
+            'latitude': [3.87, 3.87, 9.31],
+            'longitude': [11.52, 11.52, 13.40],
+            'temperature_max': np.array(temperature_max, dtype='float32'),
+            'temperature_min': np.array([21.5, 22.1, 24.0], dtype='float32'),
+            'temperature_avg': np.array([26.2, 27.0, 30.4], dtype='float32'),
+            'rainfall_mm': [12.0, 0.0, 3.5],
+            'humidity_percent': [81.5, 77.0, 52.3],
+            'wind_speed_kmh': [5.2, 7.9, 12.4],
+            'solar_radiation_wm2': [210.5, 240.1, 280.7],
+            'evapotranspiration_mm': evapotranspiration,
+        }).to_parquet(self.data_dir / 'weather_stations.parquet', index=False)
+        with contextlib.redirect_stdout(io.StringIO()):
+            load_data.load_weather_stations()
+
+    def readings(self):
+        return {
+            (weather.farm.name, weather.date.isoformat()): (weather.temperature_max, weather.evapotranspiration)
+            for weather in WeatherData.objects.select_related('farm')
+        }
+
+    def test_copy_csv_is_merged(self):
+        self.load([28.3, 30.1, 35.7], [4.2, np.nan, 6.8])
+
+        (sql, content), = self.copies
+        self.assertTrue(sql.startswith('COPY staging_weather_data (farm_id, date, temperature_max, '))
+        # Représentation décimale courte des float32, NaN -> champ vide (NULL)
+        self.assertIn(',2024-03-01,28.3,21.5,26.2,', content)
+        self.assertNotIn('28.299999', content)
+        self.assertRegex(content, r',2024-03-02,30\.1,.*,240\.1,\n')
+
+        self.assertEqual(self.readings(), {
+            ('Station STN_001', '2024-03-01'): (28.3, 4.2),
+            ('Station STN_001', '2024-03-02'): (30.1, None),
+            ('Station STN_002', '2024-03-01'): (35.7, 6.8),
+        })
+        self.assertEqual(
+            set(Farm.objects.filter(user__username=load_data.WEATHER_STATION_USERNAME).values_list('region', flat=True)),
+            {'CENTER', 'NORTH'}
+        )
+        self.assertEqual(FarmFeatures.objects.count(), 2)
+
+    def test_reload_updates_readings(self):
+        self.load([28.3, 30.1, 35.7], [4.2, np.nan, 6.8])
+        self.load([29.0, 30.1, 35.7], [4.2, 5.5, 6.8])
+
+        self.assertEqual(len(self.copies), 2)
+        self.assertEqual(WeatherData.objects.count(), 3)
+        self.assertEqual(self.readings()[('Station STN_001', '2024-03-01')], (29.0, 4.2))
+        self.assertEqual(self.readings()[('Station STN_001', '2024-03-02')], (30.1, 5.5))
+
+
+class FarmFeaturesTestMixin:
+    def create_farm(self, name: str = 'Ferme test') -> Farm:
+        user, _ = User.objects.get_or_create(username='agriculteur')
+        return Farm.objects.create(
+            user=user, name=name, region='CENTER', latitude=3.87, longitude=11.52,
+            area_hectares=2.5, soil_type='LOAM',
+        )
+
+    @staticmethod
+    def reading(farm: Farm, day: int, rng: np.random.Generator) -> WeatherData:
+        temperature_min = rng.uniform(18, 24)
+        temperature_max = temperature_min + rng.uniform(5, 12)
+        return WeatherData(
+            farm=farm,
+            date=date(2024, 1, 1) + timedelta(days=day),
+            temperature_min=temperature_min,
+            temperature_max=temperature_max,
+            temperature_avg=(temperature_min + temperature_max) / 2,
+            rainfall_mm=float(rng.choice([0.0, rng.uniform(0, 60)])),
+            humidity_percent=rng.uniform(40, 95),
+            # ET0 manquante un jour sur trois : Hargreaves
+            evapotranspiration=None if day % 3 == 0 else rng.uniform(2, 7),
+        )
+
+
+class FarmFeaturesTests(FarmFeaturesTestMixin, TestCase):
+    def test_incremental_updates_match_full_recomputation(self):
+        farm = self.create_farm()
+        rng = np.random.default_rng(0)
+        # 130 jours relevé par relevé : les deux fenêtres glissent
+        for day in range(130):
+            self.reading(farm, day, rng).save()
+
+        incremental = FarmFeatures.objects.get(farm=farm)
+        full = _compute_features([farm.id])[farm.id]
+
+        self.assertEqual((incremental.days_30d, incremental.days_90d), (30, 90))
+        for field in FEATURE_FIELDS:
+            expected, value = full[field], getattr(incremental, field)
+            if isinstance(expected, float):
+                self.assertLessEqual(abs(value - expected), 1e-12 * max(1.0, abs(expected)), field)
+            else:
+                self.assertEqual(value, expected, field)
+
+    def test_deleted_readings_refresh_farm_once_after_commit(self):
+        farm = self.create_farm()
+        rng = np.random.default_rng(1)
+        WeatherData.objects.bulk_create([self.reading(farm, day, rng) for day in range(60)])
+        refresh_farm_features([farm.id])
+
+        with mock.patch.object(signals, 'refresh_farm_features', wraps=refresh_farm_features) as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                WeatherData.objects.filter(farm=farm, date__gte=date(2024, 2, 10)).delete()
+                refresh.assert_not_called()
+
+        refresh.assert_called_once_with([farm.id])
+        features = FarmFeatures.objects.get(farm=farm)
+        self.assertEqual(features.as_of, date(2024, 2, 9))
+        self.assertEqual(features.days_30d, 30)
+        self.assertAlmostEqual(features.rainfall_90d, _compute_features([farm.id])[farm.id]['rainfall_90d'])
+
+    def test_deleted_farm_is_not_refreshed(self):
+        farm = self.create_farm()
+        rng = np.random.default_rng(2)
+        for day in range(5):
+            self.reading(farm, day, rng).save()
+
+        with mock.patch.object(signals, 'refresh_farm_features') as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                farm.delete()
+
+        refresh.assert_not_called()
+        self.assertFalse(WeatherData.objects.exists())
+
+    def test_refresh_error_does_not_break_delete(self):
+        farm = self.create_farm()
+        self.reading(farm, 0, np.random.default_rng(3)).save()
+
+        with mock.patch.object(signals, 'refresh_farm_features', side_effect=RuntimeError('base verrouillée')):
+            with self.assertLogs('core.signals', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+                WeatherData.objects.filter(farm=farm).delete()
+
+        self.assertFalse(WeatherData.objects.filter(farm=farm).exists())
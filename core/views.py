@@ -13,7 +13,8 @@ from datetime import datetime, timedelta
 import json
 
 from .models import Farm, Crop, CropSeason, WeatherData, Prediction, MarketPrice, UserPreference
-from ml_models.predictor import CropRecommender, YieldPredictor
+from .prediction_writer import get_prediction_writer
+from ml_models.registry import get_model
 from ml_models.visualizer import DataVisualizer
 
 
@@ -74,7 +75,7 @@ def crop_recommendation(request):
         }
         
         # Faire la prédiction
-        recommender = CropRecommender()
+        recommender = get_model('crop_recommender')
         recommendations = recommender.recommend(data)
         
         # Sauvegarder la prédiction seulement si l'utilisateur est connecté
@@ -84,12 +85,15 @@ def crop_recommendation(request):
             if farm_id:
                 farm = get_object_or_404(Farm, id=farm_id, user=request.user)
             
-            Prediction.objects.create(
-                user=request.user,
-                farm=farm,
+            get_prediction_writer().submit(
+                user_id=request.user.id,
+                farm_id=farm.id if farm else None,
                 prediction_type='CROP_RECOMMENDATION',
                 input_data=data,
-                output_data=recommendations,
+                output_data={
+                    'recommendations': recommendations,
+                    'model_version': recommender.model_version
+                },
                 confidence_score=recommendations[0].get('confidence', 0) if recommendations else 0
             )
         
@@ -127,7 +131,7 @@ def yield_prediction(request):
         }
         
         # Faire la prédiction
-        predictor = YieldPredictor()
+        predictor = get_model('yield_predictor')
         prediction = predictor.predict(data)
         
         # Sauvegarder la prédiction si l'utilisateur est connecté
@@ -137,12 +141,12 @@ def yield_prediction(request):
             if farm_id:
                 farm = get_object_or_404(Farm, id=farm_id, user=request.user)
             
-            Prediction.objects.create(
-                user=request.user,
-                farm=farm,
+            get_prediction_writer().submit(
+                user_id=request.user.id,
+                farm_id=farm.id if farm else None,
                 prediction_type='YIELD_PREDICTION',
                 input_data=data,
-                output_data=prediction,
+                output_data={**prediction, 'model_version': predictor.model_version},
                 confidence_score=prediction.get('confidence', 0)
             )
         
@@ -0,0 +1,6 @@
+"""
+Scraping et génération des datasets agricoles
+
+    cd data_scraper && python scraper.py
+    python -m data_scraper.scraper          (depuis la racine du projet)
+"""
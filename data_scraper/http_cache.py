@@ -0,0 +1,193 @@
+"""
+Cache HTTP sur disque partagé par le scraping synchrone (requests) et
+asynchrone (aiohttp)
+
+- entrées : une par requête (clé = SHA-256 de l'URL + paramètres triés),
+  avec ETag / Last-Modified et date de stockage
+- objets : corps de réponse compressés (gzip), adressés par leur SHA-256 :
+  deux requêtes aux réponses identiques partagent le même fichier
+- TTL par appel : None = réponse immuable (archive passée), sinon durée
+  de fraîcheur en secondes, puis revalidation conditionnelle (304)
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPCache:
+    """Cache de réponses HTTP GET adressé par contenu"""
+
+    def __init__(self, cache_dir, compresslevel: int = 6):
+        self.cache_dir = Path(cache_dir)
+        self.entries_dir = self.cache_dir / 'entries'
+        self.objects_dir = self.cache_dir / 'objects'
+        self.compresslevel = compresslevel
+        self.entries_dir.mkdir(parents=True, exist_ok=True)
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(url: str, params: dict = None) -> str:
+        """Clé d'une requête (indépendante de l'ordre des paramètres)"""
+        canonical = json.dumps(
+            [url, sorted((str(k), str(v)) for k, v in (params or {}).items())],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.entries_dir / key[:2] / f'{key}.json'
+
+    def _object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / f'{digest}.gz'
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+    def lookup(self, url: str, params: dict = None) -> Optional[dict]:
+        """Entrée en cache de la requête (fraîche ou non), None si absente"""
+        path = self._entry_path(self.key(url, params))
+        try:
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not self._object_path(entry['body']).exists():
+            return None
+        return entry
+
+    @staticmethod
+    def is_fresh(entry: dict, ttl: Optional[float]) -> bool:
+        """Vrai si l'entrée peut être servie sans contacter le serveur"""
+        return ttl is None or time.time() - entry['stored_at'] < ttl
+
+    @staticmethod
+    def conditional_headers(entry: Optional[dict]) -> dict:
+        """En-têtes If-None-Match / If-Modified-Since pour revalider une entrée"""
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def load(self, entry: dict) -> bytes:
+        """Corps (décompressé) d'une entrée"""
+        with gzip.open(self._object_path(entry['body']), 'rb') as f:
+            return f.read()
+
+    def load_json(self, entry: dict):
+        return json.loads(self.load(entry))
+
+    def store(self, url: str, params: dict, headers, body: bytes) -> dict:
+        """Enregistre une réponse 200 (objet d'abord, puis entrée)"""
+        digest = hashlib.sha256(body).hexdigest()
+        object_path = self._object_path(digest)
+        if not object_path.exists():
+            self._write_atomic(object_path, gzip.compress(body, compresslevel=self.compresslevel))
+
+        entry = {
+            'url': url,
+            'params': {str(k): str(v) for k, v in (params or {}).items()},
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'body': digest,
+            'size': len(body),
+            'stored_at': time.time(),
+        }
+        self._write_atomic(
+            self._entry_path(self.key(url, params)),
+            json.dumps(entry, ensure_ascii=False).encode('utf-8')
+        )
+        return entry
+
+    def touch(self, entry: dict):
+        """Prolonge la fraîcheur d'une entrée revalidée (réponse 304)"""
+        entry['stored_at'] = time.time()
+        self._write_atomic(
+            self._entry_path(self.key(entry['url'], entry['params'])),
+            json.dumps(entry, ensure_ascii=False).encode('utf-8')
+        )
+
+    def prune(self, max_age: float) -> int:
+        """
+        Supprime les entrées plus vieilles que max_age secondes et les
+        objets qui ne sont plus référencés
+
+        Returns:
+            Nombre d'entrées supprimées
+        """
+        now = time.time()
+        removed = 0
+        referenced = set()
+        for path in self.entries_dir.glob('*/*.json'):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                path.unlink(missing_ok=True)
+                continue
+            if now - entry['stored_at'] > max_age:
+                path.unlink(missing_ok=True)
+                removed += 1
+            else:
+                referenced.add(entry['body'])
+
+        for path in self.objects_dir.glob('*/*.gz'):
+            if path.stem not in referenced:
+                path.unlink(missing_ok=True)
+
+        logger.info(f"Cache HTTP: {removed} entrées expirées supprimées")
+        return removed
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'revalidated': self.revalidated, 'misses': self.misses}
+
+
+def get_json(session, cache: Optional[HTTPCache], url: str, params: dict,
+             ttl: Optional[float], timeout: float = 30):
+    """
+    GET JSON via requests, à travers le cache
+
+    Returns:
+        (données, True si une requête réseau a été faite)
+    """
+    entry = cache.lookup(url, params) if cache else None
+    if entry and cache.is_fresh(entry, ttl):
+        cache.hits += 1
+        return cache.load_json(entry), False
+
+    response = session.get(
+        url, params=params, headers=HTTPCache.conditional_headers(entry), timeout=timeout
+    )
+    if response.status_code == 304 and entry:
+        cache.revalidated += 1
+        cache.touch(entry)
+        return cache.load_json(entry), True
+
+    response.raise_for_status()
+    data = response.json()  # Corps invalide : ValueError, rien n'est mis en cache
+    if cache:
+        cache.misses += 1
+        cache.store(url, params, response.headers, response.content)
+    return data, True
@@ -0,0 +1,223 @@
+"""
+Client asynchrone Open-Meteo
+Récupère l'historique météo de milliers de points en parallèle :
+concurrence bornée, limiteur de débit (token bucket), nouvelles
+tentatives avec backoff aléatoire et connexions HTTP réutilisées
+"""
+
+import asyncio
+import json
+import logging
+import random
+import time
+from datetime import date, timedelta
+from typing import List, Optional
+
+import aiohttp
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+
+DAILY_VARIABLES = 'temperature_2m_max,temperature_2m_min,precipitation_sum,windspeed_10m_max,soil_moisture_0_to_10cm'
+
+# Statuts HTTP pour lesquels une nouvelle tentative a un sens
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# L'archive est consolidée après quelques jours : au-delà, une réponse ne
+# change plus et reste en cache indéfiniment ; sinon elle est revalidée
+ARCHIVE_SETTLED_DAYS = 7
+RECENT_TTL = 6 * 3600
+
+
+def archive_ttl(end_date: str) -> Optional[float]:
+    """TTL de cache d'une requête selon sa date de fin (None = immuable)"""
+    if date.fromisoformat(end_date[:10]) < date.today() - timedelta(days=ARCHIVE_SETTLED_DAYS):
+        return None
+    return RECENT_TTL
+
+
+def build_params(lat: float, lon: float, start_date: str, end_date: str) -> dict:
+    """Paramètres de requête de l'API archive (communs sync/async)"""
+    return {
+        'latitude': lat,
+        'longitude': lon,
+        'start_date': start_date,
+        'end_date': end_date,
+        'daily': DAILY_VARIABLES,
+        'timezone': 'auto'
+    }
+
+
+def daily_frame(data: dict, lat: float, lon: float, location_name: str) -> Optional[pd.DataFrame]:
+    """Convertit une réponse JSON en DataFrame journalier, None si vide"""
+    if 'daily' not in data:
+        return None
+    df = pd.DataFrame(data['daily'])
+    df['latitude'] = lat
+    df['longitude'] = lon
+    df['location'] = location_name
+    return df
+
+
+def grid_locations(lat_range: tuple, lon_range: tuple, step: float) -> List[tuple]:
+    """
+    Points d'une grille régulière au format (latitude, longitude, nom)
+
+    Ex: grid_locations((2, 13), (8, 16), 0.25) couvre le Cameroun
+    avec ~1400 points
+    """
+    lats = np.round(np.arange(lat_range[0], lat_range[1] + step / 2, step), 4)
+    lons = np.round(np.arange(lon_range[0], lon_range[1] + step / 2, step), 4)
+    return [(float(lat), float(lon), f'GRID_{lat:.4f}_{lon:.4f}') for lat in lats for lon in lons]
+
+
+class TokenBucket:
+    """
+    Limiteur de débit : `rate` jetons par seconde, rafales jusqu'à `capacity`
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Attend qu'un jeton soit disponible puis le consomme"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class OpenMeteoFetcher:
+    """
+    Récupération concurrente de l'historique Open-Meteo
+
+    Args:
+        base_url: URL de l'API archive (modifiable pour un serveur de test local)
+        concurrency: nombre maximal de requêtes simultanées
+        rate_per_second: débit maximal (l'API gratuite tolère ~10 req/s)
+        max_retries: nouvelles tentatives sur erreur réseau, 429 ou 5xx
+        backoff_base / backoff_max: bornes du backoff exponentiel (secondes),
+            avec tirage aléatoire complet ("full jitter")
+        timeout: délai maximal par requête (secondes)
+        cache: HTTPCache partagé avec le chemin synchrone (optionnel) ;
+            les réponses fraîches ne consomment pas de jeton de débit
+    """
+
+    def __init__(self, base_url: str = ARCHIVE_URL, concurrency: int = 16,
+                 rate_per_second: float = 5.0, max_retries: int = 4,
+                 backoff_base: float = 0.5, backoff_max: float = 30.0,
+                 timeout: float = 30, headers: dict = None, cache=None):
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.rate_per_second = rate_per_second
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.headers = headers or {}
+        self.cache = cache
+
+    def _backoff(self, attempt: int, retry_after: str = None) -> float:
+        """Délai avant la tentative suivante (Retry-After prioritaire)"""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def _fetch_one(self, session, bucket, semaphore, location, start_date, end_date):
+        """Récupère un point, avec nouvelles tentatives ; None en cas d'échec"""
+        lat, lon, location_name = location
+        params = build_params(lat, lon, start_date, end_date)
+
+        entry = self.cache.lookup(self.base_url, params) if self.cache else None
+        if entry and self.cache.is_fresh(entry, archive_ttl(end_date)):
+            self.cache.hits += 1
+            return daily_frame(self.cache.load_json(entry), lat, lon, location_name)
+        conditional_headers = self.cache.conditional_headers(entry) if self.cache else {}
+
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            await bucket.acquire()
+            try:
+                async with semaphore:
+                    async with session.get(self.base_url, params=params, headers=conditional_headers) as response:
+                        if response.status in RETRY_STATUSES:
+                            retry_after = response.headers.get('Retry-After')
+                            raise aiohttp.ClientResponseError(
+                                response.request_info, response.history,
+                                status=response.status, message=response.reason
+                            )
+                        if response.status == 304 and entry:
+                            self.cache.revalidated += 1
+                            self.cache.touch(entry)
+                            data = self.cache.load_json(entry)
+                        else:
+                            response.raise_for_status()
+                            body = await response.read()
+                            data = json.loads(body)
+                            if self.cache:
+                                self.cache.misses += 1
+                                self.cache.store(self.base_url, params, response.headers, body)
+
+                df = daily_frame(data, lat, lon, location_name)
+                if df is not None:
+                    logger.debug(f"✓ {location_name}: {len(df)} jours récupérés")
+                return df
+
+            except ValueError as e:
+                # Corps illisible (JSON malformé, encodage) : pas de nouvel essai
+                logger.error(f"Réponse invalide pour {location_name}: {e!r}")
+                return None
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status = getattr(e, 'status', None)
+                retryable = status is None or status in RETRY_STATUSES
+                if not retryable or attempt == self.max_retries:
+                    logger.error(f"Erreur {location_name}: {e!r}")
+                    return None
+                delay = self._backoff(attempt, retry_after)
+                logger.warning(f"{location_name}: tentative {attempt + 1} échouée ({e!r}), nouvel essai dans {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def fetch_all(self, locations: List[tuple], start_date: str, end_date: str) -> List[pd.DataFrame]:
+        """Récupère tous les points (une seule session, connexions réutilisées)"""
+        bucket = TokenBucket(self.rate_per_second)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=self.headers) as session:
+            results = [None] * len(locations)
+            done = 0
+
+            async def run(index, location):
+                nonlocal done
+                results[index] = await self._fetch_one(session, bucket, semaphore, location, start_date, end_date)
+                done += 1
+                if done % 100 == 0 or done == len(locations):
+                    logger.info(f"Open-Meteo: {done}/{len(locations)} points traités")
+
+            await asyncio.gather(*(run(i, location) for i, location in enumerate(locations)))
+
+        # Ordre des points conservé
+        frames = [df for df in results if df is not None]
+        logger.info(f"Open-Meteo: {len(frames)}/{len(locations)} points récupérés")
+        return frames
+
+    def fetch(self, locations: List[tuple], start_date: str, end_date: str) -> List[pd.DataFrame]:
+        """Version synchrone de fetch_all (lance sa propre boucle asyncio)"""
+        return asyncio.run(self.fetch_all(locations, start_date, end_date))
@@ -0,0 +1,126 @@
+"""
+Manifeste de reprise d'un scraping
+Enregistre dans output_dir les datasets terminés et, pour l'historique
+météo, la période déjà couverte par point : une relance saute le travail
+fait et ne récupère que les fenêtres de dates manquantes
+"""
+
+import json
+import os
+import tempfile
+from datetime import date, datetime, timedelta
+from pathlib import Path
+import logging
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = '_run_manifest.json'
+MANIFEST_VERSION = 1
+
+
+def location_key(lat: float, lon: float) -> str:
+    """Clé stable d'un point (coordonnées arrondies à 1e-4 degré)"""
+    return f'{lat:.4f},{lon:.4f}'
+
+
+class RunManifest:
+    """
+    État persistant d'un scraping, réécrit de façon atomique à chaque étape
+
+    {
+      "datasets": {nom: {"path", "rows", "params", "completed_at"}},
+      "weather": {"lat,lon": {"name", "start", "end"}}
+    }
+
+    La couverture météo d'un point est un intervalle de dates continu
+    [start, end] ; les fenêtres manquantes sont calculées avant et après.
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = Path(output_dir)
+        self.path = self.output_dir / MANIFEST_FILENAME
+        self.data = {'version': MANIFEST_VERSION, 'datasets': {}, 'weather': {}}
+
+        if self.path.exists():
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == MANIFEST_VERSION:
+                    self.data = data
+                else:
+                    logger.warning(f"Manifeste {self.path} ignoré (version {data.get('version')})")
+            except (OSError, ValueError) as e:
+                logger.warning(f"Manifeste {self.path} illisible, reprise depuis zéro: {e}")
+
+    def save(self):
+        """Écrit le manifeste (fichier temporaire puis renommage)"""
+        self.data['updated_at'] = datetime.now().isoformat()
+        fd, tmp_path = tempfile.mkstemp(dir=self.output_dir, prefix='.run_manifest.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+    def reset(self):
+        """Repart d'un manifeste vide (sauvegardé à la première étape)"""
+        self.data = {'version': MANIFEST_VERSION, 'datasets': {}, 'weather': {}}
+
+    # Datasets
+
+    def completed_rows(self, name: str, params: dict):
+        """
+        Lignes du dataset s'il est déjà terminé avec les mêmes paramètres
+        et que sa sortie existe encore, sinon None
+        """
+        entry = self.data['datasets'].get(name)
+        if not entry or entry['params'] != params:
+            return None
+        if not (self.output_dir / entry['path']).exists():
+            return None
+        return entry['rows']
+
+    def mark_complete(self, name: str, path, rows: int, params: dict):
+        """Enregistre un dataset terminé et sauvegarde le manifeste"""
+        self.data['datasets'][name] = {
+            'path': str(Path(path).relative_to(self.output_dir)),
+            'rows': int(rows),
+            'params': params,
+            'completed_at': datetime.now().isoformat(),
+        }
+        self.save()
+
+    # Historique météo
+
+    def reset_weather(self):
+        """Oublie la couverture météo (ex: fichier de sortie supprimé)"""
+        self.data['weather'] = {}
+
+    def missing_windows(self, key: str, start: date, end: date) -> list:
+        """Fenêtres [(début, fin), ...] de [start, end] non encore couvertes"""
+        coverage = self.data['weather'].get(key)
+        if coverage is None:
+            return [(start, end)]
+
+        covered_start = date.fromisoformat(coverage['start'])
+        covered_end = date.fromisoformat(coverage['end'])
+        if end < covered_start or start > covered_end:
+            # Fenêtre disjointe : la couverture doit rester continue
+            return [(min(start, covered_start), max(end, covered_end))]
+
+        windows = []
+        if start < covered_start:
+            windows.append((start, covered_start - timedelta(days=1)))
+        if end > covered_end:
+            windows.append((covered_end + timedelta(days=1), end))
+        return windows
+
+    def extend_coverage(self, key: str, name: str, start: date, end: date):
+        """Étend la période couverte d'un point (sans sauvegarder)"""
+        coverage = self.data['weather'].get(key)
+        if coverage is not None:
+            start = min(start, date.fromisoformat(coverage['start']))
+            end = max(end, date.fromisoformat(coverage['end']))
+        self.data['weather'][key] = {'name': name, 'start': start.isoformat(), 'end': end.isoformat()}
@@ -0,0 +1,186 @@
+"""
+Schémas de types des datasets du scraper
+Appliqués à chaque bloc dès sa génération : catégories pour les colonnes
+à faible cardinalité, float32 pour les mesures, petits entiers, dates
+datetime64 et identifiants en chaînes Arrow (plutôt qu'en objets Python)
+"""
+
+import pandas as pd
+
+# Version des schémas : enregistrée dans le manifeste de reprise, un
+# changement de types force la régénération des datasets
+SCHEMA_VERSION = 1
+
+# Vocabulaires (partagés par les générateurs et les catégories)
+FAO_CROPS = [
+    'Maïs', 'Riz', 'Blé', 'Sorgho', 'Manioc', 'Igname',
+    'Arachide', 'Soja', 'Tomate', 'Oignon', 'Coton',
+    'Café', 'Cacao', 'Banane', 'Ananas', 'Haricot'
+]
+COUNTRIES = ['Cameroun', 'Nigeria', 'Ghana', 'Côte d\'Ivoire', 'Burkina Faso', 'Mali']
+SOIL_TYPES = ['Sableux', 'Argileux', 'Limoneux', 'Argilo-limoneux', 'Sablo-limoneux']
+IRRIGATION_CROPS = ['Maïs', 'Riz', 'Tomate', 'Oignon', 'Coton']
+IRRIGATION_TYPES = ['Goutte-à-goutte', 'Aspersion', 'Gravitaire', 'Micro-aspersion', 'Aucune']
+FERTILIZER_TYPES = ['NPK 15-15-15', 'NPK 20-10-10', 'Urée', 'Phosphate', 'Potasse', 'Compost', 'Fumier']
+APPLICATION_TIMINGS = ['Semis', 'Croissance', 'Floraison', 'Maturation']
+PEST_CROPS = ['Maïs', 'Tomate', 'Coton', 'Riz', 'Cacao']
+PESTS = ['Chenille légionnaire', 'Pucerons', 'Mouche blanche', 'Foreur de tige', 'Criquet']
+DISEASES = ['Mildiou', 'Rouille', 'Fusariose', 'Anthracnose', 'Virus mosaïque']
+SEVERITIES = ['Faible', 'Modérée', 'Sévère']
+FARM_CROPS = ['Maïs', 'Riz', 'Manioc', 'Tomate', 'Oignon', 'Coton', 'Arachide', 'Soja']
+REGIONS = ['Nord', 'Extrême-Nord', 'Adamaoua', 'Centre', 'Sud', 'Est', 'Ouest', 'Littoral', 'Nord-Ouest', 'Sud-Ouest']
+FARM_SOIL_TYPES = ['Sableux', 'Argileux', 'Limoneux', 'Argilo-limoneux']
+FARM_IRRIGATION_TYPES = ['Goutte-à-goutte', 'Aspersion', 'Gravitaire', 'Aucune']
+YIELD_QUALITIES = ['Excellente', 'Bonne', 'Moyenne', 'Faible']
+EDUCATION_LEVELS = ['Primaire', 'Secondaire', 'Supérieur', 'Aucun']
+MARKET_CROPS = ['Maïs', 'Riz', 'Tomate', 'Oignon', 'Arachide', 'Haricot', 'Manioc']
+MARKETS = ['Yaoundé', 'Douala', 'Garoua', 'Bamenda', 'Bafoussam', 'Ngaoundéré']
+
+# Identifiants uniques : une catégorie n'apporterait rien, les chaînes
+# Arrow coûtent ~10 octets par valeur au lieu de ~60 pour un objet Python
+ID_STRING = 'string[pyarrow]'
+DATE = 'datetime64[ns]'
+
+
+def categorical(values: list) -> pd.CategoricalDtype:
+    """Catégorie à vocabulaire fixe : mêmes codes dans tous les blocs"""
+    return pd.CategoricalDtype(values)
+
+
+# Datasets -> {colonne: dtype} ; 'category' sans vocabulaire fixe pour les
+# valeurs dépendant de la taille du dataset (ex: station_id)
+DATASET_SCHEMAS = {
+    'weather_historical': {
+        'time': DATE,
+        'temperature_2m_max': 'float32',
+        'temperature_2m_min': 'float32',
+        'precipitation_sum': 'float32',
+        'windspeed_10m_max': 'float32',
+        'soil_moisture_0_to_10cm': 'float32',
+        'location': 'category',
+    },
+    'crop_production': {
+        'crop': categorical(FAO_CROPS),
+        'country': categorical(COUNTRIES),
+        'year': 'int16',
+        'area_hectares': 'int32',
+        'production_tonnes': 'int32',
+        'yield_kg_per_ha': 'int16',
+    },
+    'soil_properties': {
+        'latitude': 'float32',
+        'longitude': 'float32',
+        'soil_type': categorical(SOIL_TYPES),
+        'ph': 'float32',
+        'organic_carbon': 'float32',
+        'clay_content': 'float32',
+        'sand_content': 'float32',
+        'silt_content': 'float32',
+        'cec': 'float32',
+        'nitrogen': 'float32',
+        'phosphorus': 'float32',
+        'potassium': 'float32',
+    },
+    'irrigation': {
+        'crop': categorical(IRRIGATION_CROPS),
+        'irrigation_type': categorical(IRRIGATION_TYPES),
+        'water_volume_mm': 'int16',
+        'frequency_days': 'int8',
+        'efficiency_percent': 'float32',
+        'cost_per_hectare': 'int32',
+    },
+    'fertilizers': {
+        'fertilizer_type': categorical(FERTILIZER_TYPES),
+        'nitrogen_content': 'float32',
+        'phosphorus_content': 'float32',
+        'potassium_content': 'float32',
+        'application_rate_kg_ha': 'int16',
+        'application_timing': categorical(APPLICATION_TIMINGS),
+        'cost_per_kg': 'int16',
+    },
+    'pests_diseases': {
+        'crop': categorical(PEST_CROPS),
+        'pest_or_disease': categorical(PESTS + DISEASES),
+        'severity': categorical(SEVERITIES),
+        'temperature_avg': 'float32',
+        'humidity_percent': 'float32',
+        'rainfall_mm': 'int16',
+        'yield_loss_percent': 'float32',
+    },
+    'farms': {
+        'farm_id': ID_STRING,
+        'region': categorical(REGIONS),
+        'crop': categorical(FARM_CROPS),
+        'area_hectares': 'float32',
+        'soil_type': categorical(FARM_SOIL_TYPES),
+        'soil_ph': 'float32',
+        'organic_matter': 'float32',
+        'temperature_avg': 'float32',
+        'temperature_min': 'float32',
+        'temperature_max': 'float32',
+        'rainfall_mm': 'int16',
+        'humidity_percent': 'float32',
+        'irrigation_type': categorical(FARM_IRRIGATION_TYPES),
+        'npk_kg_ha': 'int16',
+        'pesticide_applications': 'int8',
+        'planting_date': DATE,
+        'harvest_date': DATE,
+        'yield_kg_ha': 'int16',
+        'yield_quality': categorical(YIELD_QUALITIES),
+        'market_price_per_kg': 'int16',
+        # total_revenue (jusqu'à ~8e8) reste en float64 : float32 n'a que 7 chiffres
+        'production_cost': 'int32',
+        'profit_margin': 'float32',
+        'farmer_experience_years': 'int8',
+        'education_level': categorical(EDUCATION_LEVELS),
+    },
+    'weather_stations': {
+        'station_id': 'category',
+        'date': DATE,
+        'latitude': 'float32',
+        'longitude': 'float32',
+        'temperature_max': 'float32',
+        'temperature_min': 'float32',
+        'temperature_avg': 'float32',
+        'rainfall_mm': 'int16',
+        'humidity_percent': 'float32',
+        'wind_speed_kmh': 'float32',
+        'solar_radiation_wm2': 'float32',
+        'evapotranspiration_mm': 'float32',
+    },
+    'market_prices': {
+        'date': DATE,
+        'crop': categorical(MARKET_CROPS),
+        'market': categorical(MARKETS),
+        'price_per_kg': 'int16',
+        'supply_tonnes': 'int16',
+        'demand_index': 'float32',
+    },
+}
+
+
+def apply_schema(dataset: str, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convertit un bloc aux types de son dataset
+
+    Les colonnes absentes du schéma gardent leur type.
+
+    Raises:
+        ValueError: si une valeur n'appartient pas au vocabulaire d'une
+            colonne catégorielle (elle deviendrait NaN sans erreur)
+    """
+    schema = {column: dtype for column, dtype in DATASET_SCHEMAS.get(dataset, {}).items() if column in df.columns}
+    typed = df.astype(schema)
+
+    for column, dtype in schema.items():
+        if isinstance(dtype, pd.CategoricalDtype) and dtype.categories is not None:
+            unknown = typed[column].isna() & df[column].notna()
+            if unknown.any():
+                values = sorted(set(df.loc[unknown, column]))
+                raise ValueError(f"{dataset}.{column}: valeurs hors vocabulaire {values}")
+    return typed
+
+
+def memory_mb(df: pd.DataFrame) -> float:
+    """Empreinte mémoire réelle d'un DataFrame (Mo)"""
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
@@ -8,80 +8,150 @@ import requests
 import pandas as pd
 import numpy as np
 from bs4 import BeautifulSoup
+import argparse
+import os
+import shutil
+import sys
 import time
 import json
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import logging
 from pathlib import Path
 import asyncio
 import aiohttp
 from typing import List, Dict
-import random
+from concurrent.futures import ProcessPoolExecutor
+import zlib
 
-# Configuration du logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('scraping.log'),
-        logging.StreamHandler()
-    ]
+# Exécution directe (cd data_scraper && python scraper.py) : les imports
+# relatifs sont résolus dans le paquet data_scraper (PEP 366), comme avec
+# python -m data_scraper.scraper depuis la racine du projet
+if not __package__:
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    __package__ = 'data_scraper'
+
+from .http_cache import HTTPCache, get_json
+from .open_meteo import (
+    ARCHIVE_URL, OpenMeteoFetcher, archive_ttl, build_params, daily_frame, grid_locations
+)
+from .run_manifest import RunManifest, location_key
+from .schemas import (
+    APPLICATION_TIMINGS, COUNTRIES, DISEASES, EDUCATION_LEVELS, FAO_CROPS, FARM_CROPS,
+    FARM_IRRIGATION_TYPES, FARM_SOIL_TYPES, FERTILIZER_TYPES, IRRIGATION_CROPS, IRRIGATION_TYPES,
+    MARKET_CROPS, MARKETS, PEST_CROPS, PESTS, REGIONS, SCHEMA_VERSION, SEVERITIES, SOIL_TYPES,
+    YIELD_QUALITIES, apply_schema, memory_mb
 )
+
 logger = logging.getLogger(__name__)
 
+# Taille des blocs générés et écrits (lignes)
+CHUNK_SIZE = 100000
+
+# Datasets synthétiques, dans l'ordre de run_full_scraping :
+# nom -> (méthode générant un bloc, lignes par défaut, options)
+SYNTHETIC_DATASETS = {
+    'crop_production': ('_crop_production_chunk', 50000, {}),
+    'soil_properties': ('_soil_chunk', 100000, {}),
+    'irrigation': ('_irrigation_chunk', 80000, {}),
+    'fertilizers': ('_fertilizer_chunk', 70000, {}),
+    'pests_diseases': ('_pest_disease_chunk', 60000, {}),
+    'farms': ('_farm_chunk', 100000, {}),
+    'weather_stations': ('_weather_station_chunk', 500 * 1000, {'days': 1000}),
+    'market_prices': ('_market_price_chunk', 150000, {}),
+}
+
+# Datasets volumineux générés en shards parallèles (run_full_scraping(shards=N))
+SHARDED_DATASETS = ['farms', 'weather_stations', 'market_prices']
+
+# Manifeste d'un dataset shardé (préfixe '_' : ignoré par les lecteurs Parquet)
+MANIFEST_NAME = '_manifest.json'
+
+# Formats de sortie : CSV (UTF-8 BOM, lisible dans Excel) ou Parquet
+OUTPUT_FORMATS = ['csv', 'parquet']
+
+# Villes du Cameroun pour l'historique météo
+CAMEROON_LOCATIONS = [
+    (3.8667, 11.5167, 'Yaoundé'),
+    (4.0511, 9.7679, 'Douala'),
+    (9.3077, 13.3961, 'Garoua'),
+    (5.9667, 10.1667, 'Bamenda'),
+    (7.3333, 13.3833, 'Ngaoundéré'),
+    (5.4667, 10.4167, 'Bafoussam')
+]
+
+# Emprise du Cameroun (latitudes, longitudes) pour la grille météo
+CAMEROON_BOUNDS = ((2, 13), (8, 16))
+
 
 class AgriculturalDataScraper:
     """Scraper principal pour données agricoles"""
     
-    def __init__(self, output_dir='data'):
+    def __init__(self, output_dir='data', open_meteo_url=ARCHIVE_URL, seed=42, output_format='csv',
+                 http_cache=True, cache_dir=None):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Format de sortie inconnu: {output_format} (attendu: {OUTPUT_FORMATS})")
         self.output_dir = Path(output_dir)
+        self.output_format = output_format
+        self.open_meteo_url = open_meteo_url
+        self.seed = seed
         self.output_dir.mkdir(exist_ok=True)
+        # Cache des réponses API partagé par les modes synchrone et asynchrone
+        self.http_cache = HTTPCache(cache_dir or self.output_dir / '.http_cache') if http_cache else None
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         
-    def scrape_open_meteo_historical(self, locations: List[tuple], years: int = 5) -> pd.DataFrame:
+    def scrape_open_meteo_historical(self, locations: List[tuple], years: int = 5,
+                                     concurrency: int = 1, rate_per_second: float = 5.0,
+                                     start_date: date = None, end_date: date = None) -> pd.DataFrame:
         """
         Scrape données météo historiques de Open-Meteo (API gratuite)
         Args:
             locations: Liste de (latitude, longitude, nom_lieu)
             years: Nombre d'années historiques
+            concurrency: Requêtes simultanées ; au-delà de 1, mode asynchrone
+                (aiohttp) adapté à des milliers de points de grille
+            rate_per_second: Débit maximal en mode asynchrone
+            start_date / end_date: Fenêtre explicite (prioritaire sur years)
         """
         logger.info("Démarrage scraping Open-Meteo...")
         all_data = []
         
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=365 * years)
-        
-        for lat, lon, location_name in locations:
-            try:
-                url = "https://archive-api.open-meteo.com/v1/archive"
-                params = {
-                    'latitude': lat,
-                    'longitude': lon,
-                    'start_date': start_date.strftime('%Y-%m-%d'),
-                    'end_date': end_date.strftime('%Y-%m-%d'),
-                    'daily': 'temperature_2m_max,temperature_2m_min,precipitation_sum,windspeed_10m_max,soil_moisture_0_to_10cm',
-                    'timezone': 'auto'
-                }
+        end_date = end_date or datetime.now()
+        start_date = start_date or end_date - timedelta(days=365 * years)
+        start, end = start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+        
+        if concurrency > 1:
+            fetcher = OpenMeteoFetcher(
+                base_url=self.open_meteo_url,
+                concurrency=concurrency,
+                rate_per_second=rate_per_second,
+                headers=dict(self.session.headers),
+                cache=self.http_cache,
+            )
+            all_data = fetcher.fetch(locations, start, end)
+        else:
+            ttl = archive_ttl(end)
+            for lat, lon, location_name in locations:
+                try:
+                    params = build_params(lat, lon, start, end)
                 
-                response = self.session.get(url, params=params, timeout=30)
-                response.raise_for_status()
-                data = response.json()
+                    data, requested = get_json(self.session, self.http_cache, self.open_meteo_url, params, ttl)
                 
-                if 'daily' in data:
-                    df = pd.DataFrame(data['daily'])
-                    df['latitude'] = lat
-                    df['longitude'] = lon
-                    df['location'] = location_name
-                    all_data.append(df)
-                    logger.info(f"✓ {location_name}: {len(df)} jours récupérés")
+                    df = daily_frame(data, lat, lon, location_name)
+                    if df is not None:
+                        all_data.append(df)
+                        logger.info(f"✓ {location_name}: {len(df)} jours récupérés")
                 
-                time.sleep(0.5)  # Rate limiting
+                    if requested:
+                        time.sleep(0.5)  # Rate limiting
                 
-            except Exception as e:
-                logger.error(f"Erreur {location_name}: {e}")
+                except Exception as e:
+                    logger.error(f"Erreur {location_name}: {e}")
+        
+        if self.http_cache:
+            logger.info(f"Cache HTTP: {self.http_cache.stats()}")
         
         if all_data:
             combined_df = pd.concat(all_data, ignore_index=True)
@@ -89,346 +159,668 @@ class AgriculturalDataScraper:
             return combined_df
         return pd.DataFrame()
     
-    def scrape_fao_crop_data(self) -> pd.DataFrame:
+    def _rng(self, dataset: str, shard: int = 0, chunk: int = 0) -> np.random.Generator:
+        """
+        Générateur aléatoire propre à un bloc d'un dataset
+
+        Dérivé de (seed, nom du dataset, shard, numéro de bloc) : chaque
+        dataset et chaque shard est reproductible indépendamment de l'ordre
+        de génération des autres
+        """
+        return np.random.default_rng(
+            np.random.SeedSequence(self.seed, spawn_key=(zlib.crc32(dataset.encode()), shard, chunk))
+        )
+    
+    def iter_dataset(self, dataset: str, n_rows: int = None, chunk_size: int = CHUNK_SIZE,
+                     shard: int = 0, offset: int = 0, **options):
+        """
+        Génère un dataset synthétique par blocs de chunk_size lignes
+
+        Un seul bloc est en mémoire à la fois ; le contenu dépend de
+        (seed, chunk_size), pas du nombre de blocs déjà consommés.
+        shard et offset (première ligne) servent à la génération parallèle.
+        Chaque bloc est converti aux types de schemas.DATASET_SCHEMAS.
+        """
+        method, default_rows, default_options = SYNTHETIC_DATASETS[dataset]
+        chunk_fn = getattr(self, method)
+        n_rows = default_rows if n_rows is None else n_rows
+        options = {**default_options, **options}
+        
+        for index, start in enumerate(range(0, n_rows, chunk_size)):
+            yield apply_schema(dataset, chunk_fn(
+                self._rng(dataset, shard, index), offset + start, min(chunk_size, n_rows - start), **options
+            ))
+    
+    def generate_dataset(self, dataset: str, n_rows: int = None, **options) -> pd.DataFrame:
+        """Génère un dataset synthétique complet en mémoire"""
+        # Schéma réappliqué : les catégories sans vocabulaire fixe diffèrent d'un bloc à l'autre
+        return apply_schema(
+            dataset, pd.concat(list(self.iter_dataset(dataset, n_rows, **options)), ignore_index=True)
+        )
+    
+    def scrape_fao_crop_data(self, n_samples=50000) -> pd.DataFrame:
         """
         Scrape données de cultures de FAOSTAT (simulation avec données réalistes)
         En production, utiliser l'API FAOSTAT officielle
         """
         logger.info("Génération données cultures FAO...")
-        
-        # Cultures principales
-        crops = [
-            'Maïs', 'Riz', 'Blé', 'Sorgho', 'Manioc', 'Igname', 
-            'Arachide', 'Soja', 'Tomate', 'Oignon', 'Coton',
-            'Café', 'Cacao', 'Banane', 'Ananas', 'Haricot'
-        ]
-        
-        countries = ['Cameroun', 'Nigeria', 'Ghana', 'Côte d\'Ivoire', 'Burkina Faso', 'Mali']
-        
-        data = []
-        for _ in range(50000):  # 50k observations
-            data.append({
-                'crop': random.choice(crops),
-                'country': random.choice(countries),
-                'year': random.randint(2015, 2024),
-                'area_hectares': random.randint(1000, 500000),
-                'production_tonnes': random.randint(5000, 2000000),
-                'yield_kg_per_ha': random.randint(500, 8000)
-            })
-        
-        df = pd.DataFrame(data)
+        df = self.generate_dataset('crop_production', n_samples)
         logger.info(f"Données cultures: {len(df)} observations")
         return df
     
-    def scrape_soil_data(self) -> pd.DataFrame:
+    def _crop_production_chunk(self, rng: np.random.Generator, start: int, n: int) -> pd.DataFrame:
+        return pd.DataFrame({
+            'crop': rng.choice(FAO_CROPS, n),
+            'country': rng.choice(COUNTRIES, n),
+            'year': rng.integers(2015, 2024, n, endpoint=True),
+            'area_hectares': rng.integers(1000, 500000, n, endpoint=True),
+            'production_tonnes': rng.integers(5000, 2000000, n, endpoint=True),
+            'yield_kg_per_ha': rng.integers(500, 8000, n, endpoint=True)
+        })
+    
+    def scrape_soil_data(self, n_samples=100000) -> pd.DataFrame:
         """
         Génère données de sol basées sur SoilGrids
         En production, utiliser l'API SoilGrids REST
         """
         logger.info("Génération données sol...")
-        
-        soil_types = ['Sableux', 'Argileux', 'Limoneux', 'Argilo-limoneux', 'Sablo-limoneux']
-        
-        data = []
-        for _ in range(100000):  # 100k observations
-            data.append({
-                'latitude': random.uniform(2, 13),  # Cameroun range
-                'longitude': random.uniform(8, 16),
-                'soil_type': random.choice(soil_types),
-                'ph': round(random.uniform(4.5, 8.5), 2),
-                'organic_carbon': round(random.uniform(0.5, 5.0), 2),
-                'clay_content': round(random.uniform(5, 60), 1),
-                'sand_content': round(random.uniform(10, 80), 1),
-                'silt_content': round(random.uniform(5, 50), 1),
-                'cec': round(random.uniform(5, 40), 1),  # Capacité échange cationique
-                'nitrogen': round(random.uniform(0.05, 0.5), 3),
-                'phosphorus': round(random.uniform(5, 100), 1),
-                'potassium': round(random.uniform(50, 400), 1)
-            })
-        
-        df = pd.DataFrame(data)
+        df = self.generate_dataset('soil_properties', n_samples)
         logger.info(f"Données sol: {len(df)} observations")
         return df
     
-    def generate_irrigation_data(self) -> pd.DataFrame:
+    def _soil_chunk(self, rng: np.random.Generator, start: int, n: int) -> pd.DataFrame:
+        return pd.DataFrame({
+            'latitude': rng.uniform(2, 13, n),  # Cameroun range
+            'longitude': rng.uniform(8, 16, n),
+            'soil_type': rng.choice(SOIL_TYPES, n),
+            'ph': rng.uniform(4.5, 8.5, n).round(2),
+            'organic_carbon': rng.uniform(0.5, 5.0, n).round(2),
+            'clay_content': rng.uniform(5, 60, n).round(1),
+            'sand_content': rng.uniform(10, 80, n).round(1),
+            'silt_content': rng.uniform(5, 50, n).round(1),
+            'cec': rng.uniform(5, 40, n).round(1),  # Capacité échange cationique
+            'nitrogen': rng.uniform(0.05, 0.5, n).round(3),
+            'phosphorus': rng.uniform(5, 100, n).round(1),
+            'potassium': rng.uniform(50, 400, n).round(1)
+        })
+    
+    def generate_irrigation_data(self, n_samples=80000) -> pd.DataFrame:
         """Génère données d'irrigation"""
         logger.info("Génération données irrigation...")
-        
-        irrigation_types = ['Goutte-à-goutte', 'Aspersion', 'Gravitaire', 'Micro-aspersion', 'Aucune']
-        
-        data = []
-        for _ in range(80000):
-            data.append({
-                'crop': random.choice(['Maïs', 'Riz', 'Tomate', 'Oignon', 'Coton']),
-                'irrigation_type': random.choice(irrigation_types),
-                'water_volume_mm': random.randint(0, 1500),
-                'frequency_days': random.randint(1, 14),
-                'efficiency_percent': round(random.uniform(40, 95), 1),
-                'cost_per_hectare': random.randint(50000, 500000)
-            })
-        
-        df = pd.DataFrame(data)
+        df = self.generate_dataset('irrigation', n_samples)
         logger.info(f"Données irrigation: {len(df)} observations")
         return df
     
-    def generate_fertilizer_data(self) -> pd.DataFrame:
+    def _irrigation_chunk(self, rng: np.random.Generator, start: int, n: int) -> pd.DataFrame:
+        return pd.DataFrame({
+            'crop': rng.choice(IRRIGATION_CROPS, n),
+            'irrigation_type': rng.choice(IRRIGATION_TYPES, n),
+            'water_volume_mm': rng.integers(0, 1500, n, endpoint=True),
+            'frequency_days': rng.integers(1, 14, n, endpoint=True),
+            'efficiency_percent': rng.uniform(40, 95, n).round(1),
+            'cost_per_hectare': rng.integers(50000, 500000, n, endpoint=True)
+        })
+    
+    def generate_fertilizer_data(self, n_samples=70000) -> pd.DataFrame:
         """Génère données d'engrais et fertilisation"""
         logger.info("Génération données engrais...")
-        
-        fertilizer_types = ['NPK 15-15-15', 'NPK 20-10-10', 'Urée', 'Phosphate', 'Potasse', 'Compost', 'Fumier']
-        
-        data = []
-        for _ in range(70000):
-            data.append({
-                'fertilizer_type': random.choice(fertilizer_types),
-                'nitrogen_content': round(random.uniform(0, 46), 1),
-                'phosphorus_content': round(random.uniform(0, 23), 1),
-                'potassium_content': round(random.uniform(0, 60), 1),
-                'application_rate_kg_ha': random.randint(50, 500),
-                'application_timing': random.choice(['Semis', 'Croissance', 'Floraison', 'Maturation']),
-                'cost_per_kg': random.randint(200, 2000)
-            })
-        
-        df = pd.DataFrame(data)
+        df = self.generate_dataset('fertilizers', n_samples)
         logger.info(f"Données engrais: {len(df)} observations")
         return df
     
-    def generate_pest_disease_data(self) -> pd.DataFrame:
+    def _fertilizer_chunk(self, rng: np.random.Generator, start: int, n: int) -> pd.DataFrame:
+        return pd.DataFrame({
+            'fertilizer_type': rng.choice(FERTILIZER_TYPES, n),
+            'nitrogen_content': rng.uniform(0, 46, n).round(1),
+            'phosphorus_content': rng.uniform(0, 23, n).round(1),
+            'potassium_content': rng.uniform(0, 60, n).round(1),
+            'application_rate_kg_ha': rng.integers(50, 500, n, endpoint=True),
+            'application_timing': rng.choice(APPLICATION_TIMINGS, n),
+            'cost_per_kg': rng.integers(200, 2000, n, endpoint=True)
+        })
+    
+    def generate_pest_disease_data(self, n_samples=60000) -> pd.DataFrame:
         """Génère données sur maladies et ravageurs"""
         logger.info("Génération données maladies/ravageurs...")
-        
-        pests = ['Chenille légionnaire', 'Pucerons', 'Mouche blanche', 'Foreur de tige', 'Criquet']
-        diseases = ['Mildiou', 'Rouille', 'Fusariose', 'Anthracnose', 'Virus mosaïque']
-        
-        data = []
-        for _ in range(60000):
-            data.append({
-                'crop': random.choice(['Maïs', 'Tomate', 'Coton', 'Riz', 'Cacao']),
-                'pest_or_disease': random.choice(pests + diseases),
-                'severity': random.choice(['Faible', 'Modérée', 'Sévère']),
-                'temperature_avg': round(random.uniform(20, 35), 1),
-                'humidity_percent': round(random.uniform(40, 95), 1),
-                'rainfall_mm': random.randint(0, 300),
-                'yield_loss_percent': round(random.uniform(0, 80), 1)
-            })
-        
-        df = pd.DataFrame(data)
+        df = self.generate_dataset('pests_diseases', n_samples)
         logger.info(f"Données maladies: {len(df)} observations")
         return df
     
+    def _pest_disease_chunk(self, rng: np.random.Generator, start: int, n: int) -> pd.DataFrame:
+        return pd.DataFrame({
+            'crop': rng.choice(PEST_CROPS, n),
+            'pest_or_disease': rng.choice(PESTS + DISEASES, n),
+            'severity': rng.choice(SEVERITIES, n),
+            'temperature_avg': rng.uniform(20, 35, n).round(1),
+            'humidity_percent': rng.uniform(40, 95, n).round(1),
+            'rainfall_mm': rng.integers(0, 300, n, endpoint=True),
+            'yield_loss_percent': rng.uniform(0, 80, n).round(1)
+        })
+    
+    @staticmethod
+    def _random_dates(rng: np.random.Generator, year: int, n: int) -> np.ndarray:
+        """Dates aléatoires de l'année (jour 1 à 28 de chaque mois)"""
+        months = np.datetime64(f'{year}-01', 'M') + rng.integers(0, 12, n)
+        return months.astype('datetime64[D]') + rng.integers(0, 28, n)
+    
     def generate_synthetic_farm_data(self, n_farms=100000) -> pd.DataFrame:
         """
         Génère données synthétiques de fermes avec historiques
         Simule des exploitations agricoles réalistes
         """
         logger.info(f"Génération {n_farms} fermes synthétiques...")
-        
-        crops = ['Maïs', 'Riz', 'Manioc', 'Tomate', 'Oignon', 'Coton', 'Arachide', 'Soja']
-        regions = ['Nord', 'Extrême-Nord', 'Adamaoua', 'Centre', 'Sud', 'Est', 'Ouest', 'Littoral', 'Nord-Ouest', 'Sud-Ouest']
-        
-        data = []
-        for farm_id in range(n_farms):
-            crop = random.choice(crops)
-            
-            # Paramètres de base
-            base_temp = random.uniform(22, 32)
-            base_rainfall = random.randint(600, 2000)
-            
-            data.append({
-                'farm_id': f'FARM_{farm_id:06d}',
-                'region': random.choice(regions),
-                'crop': crop,
-                'area_hectares': round(random.uniform(0.5, 50), 2),
-                'soil_type': random.choice(['Sableux', 'Argileux', 'Limoneux', 'Argilo-limoneux']),
-                'soil_ph': round(random.uniform(5.0, 7.5), 2),
-                'organic_matter': round(random.uniform(1, 5), 2),
-                'temperature_avg': round(base_temp + random.uniform(-2, 2), 1),
-                'temperature_min': round(base_temp - random.uniform(5, 10), 1),
-                'temperature_max': round(base_temp + random.uniform(5, 12), 1),
-                'rainfall_mm': base_rainfall + random.randint(-200, 200),
-                'humidity_percent': round(random.uniform(50, 90), 1),
-                'irrigation_available': random.choice([True, False]),
-                'irrigation_type': random.choice(['Goutte-à-goutte', 'Aspersion', 'Gravitaire', 'Aucune']),
-                'fertilizer_used': random.choice([True, False]),
-                'npk_kg_ha': random.randint(0, 400),
-                'pesticide_applications': random.randint(0, 8),
-                'planting_date': f'2024-{random.randint(1,12):02d}-{random.randint(1,28):02d}',
-                'harvest_date': f'2024-{random.randint(1,12):02d}-{random.randint(1,28):02d}',
-                'yield_kg_ha': random.randint(500, 8000),
-                'yield_quality': random.choice(['Excellente', 'Bonne', 'Moyenne', 'Faible']),
-                'market_price_per_kg': random.randint(100, 2000),
-                'total_revenue': 0,  # Sera calculé
-                'production_cost': random.randint(100000, 2000000),
-                'profit_margin': 0,  # Sera calculé
-                'farmer_experience_years': random.randint(1, 40),
-                'education_level': random.choice(['Primaire', 'Secondaire', 'Supérieur', 'Aucun']),
-                'access_to_extension': random.choice([True, False]),
-                'access_to_credit': random.choice([True, False])
-            })
-        
-        df = pd.DataFrame(data)
+        df = self.generate_dataset('farms', n_farms)
+        logger.info(f"Données fermes: {len(df)} observations")
+        return df
+    
+    def _farm_chunk(self, rng: np.random.Generator, start: int, n: int) -> pd.DataFrame:
+        # Paramètres de base
+        base_temp = rng.uniform(22, 32, n)
+        base_rainfall = rng.integers(600, 2000, n, endpoint=True)
+        
+        df = pd.DataFrame({
+            'farm_id': np.char.add('FARM_', np.char.zfill(np.arange(start, start + n).astype(str), 6)),
+            'region': rng.choice(REGIONS, n),
+            'crop': rng.choice(FARM_CROPS, n),
+            'area_hectares': rng.uniform(0.5, 50, n).round(2),
+            'soil_type': rng.choice(FARM_SOIL_TYPES, n),
+            'soil_ph': rng.uniform(5.0, 7.5, n).round(2),
+            'organic_matter': rng.uniform(1, 5, n).round(2),
+            'temperature_avg': (base_temp + rng.uniform(-2, 2, n)).round(1),
+            'temperature_min': (base_temp - rng.uniform(5, 10, n)).round(1),
+            'temperature_max': (base_temp + rng.uniform(5, 12, n)).round(1),
+            'rainfall_mm': base_rainfall + rng.integers(-200, 200, n, endpoint=True),
+            'humidity_percent': rng.uniform(50, 90, n).round(1),
+            'irrigation_available': rng.random(n) < 0.5,
+            'irrigation_type': rng.choice(FARM_IRRIGATION_TYPES, n),
+            'fertilizer_used': rng.random(n) < 0.5,
+            'npk_kg_ha': rng.integers(0, 400, n, endpoint=True),
+            'pesticide_applications': rng.integers(0, 8, n, endpoint=True),
+            'planting_date': self._random_dates(rng, 2024, n),
+            'harvest_date': self._random_dates(rng, 2024, n),
+            'yield_kg_ha': rng.integers(500, 8000, n, endpoint=True),
+            'yield_quality': rng.choice(YIELD_QUALITIES, n),
+            'market_price_per_kg': rng.integers(100, 2000, n, endpoint=True),
+            'total_revenue': 0.0,  # Sera calculé
+            'production_cost': rng.integers(100000, 2000000, n, endpoint=True),
+            'profit_margin': 0.0,  # Sera calculé
+            'farmer_experience_years': rng.integers(1, 40, n, endpoint=True),
+            'education_level': rng.choice(EDUCATION_LEVELS, n),
+            'access_to_extension': rng.random(n) < 0.5,
+            'access_to_credit': rng.random(n) < 0.5
+        })
         
         # Calculs dérivés
         df['total_revenue'] = df['yield_kg_ha'] * df['area_hectares'] * df['market_price_per_kg']
         df['profit_margin'] = ((df['total_revenue'] - df['production_cost']) / df['total_revenue'] * 100).round(2)
-        
-        logger.info(f"Données fermes: {len(df)} observations")
         return df
     
     def generate_weather_station_data(self, n_stations=500, days=1000) -> pd.DataFrame:
         """Génère données de stations météo"""
         logger.info(f"Génération données {n_stations} stations météo...")
-        
-        data = []
-        base_date = datetime(2021, 1, 1)
-        
-        for station_id in range(n_stations):
-            lat = random.uniform(2, 13)
-            lon = random.uniform(8, 16)
-            
-            for day in range(days):
-                current_date = base_date + timedelta(days=day)
-                month = current_date.month
-                
-                # Variation saisonnière
-                if month in [6, 7, 8, 9]:  # Saison des pluies
-                    rainfall = random.randint(0, 80)
-                    humidity = random.uniform(70, 95)
-                elif month in [12, 1, 2]:  # Saison sèche
-                    rainfall = random.randint(0, 10)
-                    humidity = random.uniform(40, 65)
-                else:
-                    rainfall = random.randint(0, 40)
-                    humidity = random.uniform(55, 80)
-                
-                data.append({
-                    'station_id': f'STN_{station_id:03d}',
-                    'date': current_date,
-                    'latitude': lat,
-                    'longitude': lon,
-                    'temperature_max': round(random.uniform(28, 38), 1),
-                    'temperature_min': round(random.uniform(18, 25), 1),
-                    'temperature_avg': round(random.uniform(23, 32), 1),
-                    'rainfall_mm': rainfall,
-                    'humidity_percent': round(humidity, 1),
-                    'wind_speed_kmh': round(random.uniform(0, 25), 1),
-                    'solar_radiation_wm2': round(random.uniform(150, 300), 1),
-                    'evapotranspiration_mm': round(random.uniform(2, 8), 2)
-                })
-        
-        df = pd.DataFrame(data)
+        df = self.generate_dataset('weather_stations', n_stations * days, days=days)
         logger.info(f"Données météo stations: {len(df)} observations")
         return df
     
-    def generate_market_price_data(self) -> pd.DataFrame:
+    def _weather_station_chunk(self, rng: np.random.Generator, start: int, n: int, days: int) -> pd.DataFrame:
+        # Lignes start..start+n : station = ligne // days, jour = ligne % days
+        rows = np.arange(start, start + n)
+        station = rows // days
+        
+        # Coordonnées tirées d'un flux dédié : identiques quel que soit le
+        # bloc qui contient la station
+        coordinates = self._rng('weather_station_coordinates').uniform(
+            (2, 8), (13, 16), size=(int(station[-1]) + 1 if n else 0, 2)
+        )
+        
+        dates = np.datetime64('2021-01-01') + (rows % days)
+        month = dates.astype('datetime64[M]').astype(int) % 12 + 1
+        
+        # Variation saisonnière
+        rainy = np.isin(month, [6, 7, 8, 9])  # Saison des pluies
+        dry = np.isin(month, [12, 1, 2])  # Saison sèche
+        rainfall_max = np.select([rainy, dry], [80, 10], 40)
+        humidity_min = np.select([rainy, dry], [70, 40], 55)
+        humidity_max = np.select([rainy, dry], [95, 65], 80)
+        
+        return pd.DataFrame({
+            'station_id': np.char.add('STN_', np.char.zfill(station.astype(str), 3)),
+            'date': dates.astype('datetime64[ns]'),
+            'latitude': coordinates[station, 0],
+            'longitude': coordinates[station, 1],
+            'temperature_max': rng.uniform(28, 38, n).round(1),
+            'temperature_min': rng.uniform(18, 25, n).round(1),
+            'temperature_avg': rng.uniform(23, 32, n).round(1),
+            'rainfall_mm': rng.integers(0, rainfall_max, endpoint=True),
+            'humidity_percent': rng.uniform(humidity_min, humidity_max).round(1),
+            'wind_speed_kmh': rng.uniform(0, 25, n).round(1),
+            'solar_radiation_wm2': rng.uniform(150, 300, n).round(1),
+            'evapotranspiration_mm': rng.uniform(2, 8, n).round(2)
+        })
+    
+    def generate_market_price_data(self, n_samples=150000) -> pd.DataFrame:
         """Génère données de prix de marché"""
         logger.info("Génération données prix marché...")
-        
-        crops = ['Maïs', 'Riz', 'Tomate', 'Oignon', 'Arachide', 'Haricot', 'Manioc']
-        markets = ['Yaoundé', 'Douala', 'Garoua', 'Bamenda', 'Bafoussam', 'Ngaoundéré']
-        
-        data = []
-        base_date = datetime(2020, 1, 1)
-        
-        for _ in range(150000):
-            crop = random.choice(crops)
-            date = base_date + timedelta(days=random.randint(0, 1500))
-            month = date.month
-            
-            # Variation saisonnière des prix
-            seasonal_factor = 1 + 0.3 * np.sin(2 * np.pi * month / 12)
-            base_price = random.randint(200, 1500)
-            
-            data.append({
-                'date': date,
-                'crop': crop,
-                'market': random.choice(markets),
-                'price_per_kg': int(base_price * seasonal_factor),
-                'supply_tonnes': random.randint(10, 5000),
-                'demand_index': round(random.uniform(0.5, 1.5), 2)
-            })
-        
-        df = pd.DataFrame(data)
+        df = self.generate_dataset('market_prices', n_samples)
         logger.info(f"Données prix marché: {len(df)} observations")
         return df
     
+    def _market_price_chunk(self, rng: np.random.Generator, start: int, n: int) -> pd.DataFrame:
+        crop = rng.choice(MARKET_CROPS, n)
+        dates = pd.Timestamp(2020, 1, 1) + pd.to_timedelta(rng.integers(0, 1500, n, endpoint=True), unit='D')
+        
+        # Variation saisonnière des prix
+        seasonal_factor = 1 + 0.3 * np.sin(2 * np.pi * dates.month.to_numpy() / 12)
+        base_price = rng.integers(200, 1500, n, endpoint=True)
+        
+        return pd.DataFrame({
+            'date': dates,
+            'crop': crop,
+            'market': rng.choice(MARKETS, n),
+            'price_per_kg': (base_price * seasonal_factor).astype(np.int64),
+            'supply_tonnes': rng.integers(10, 5000, n, endpoint=True),
+            'demand_index': rng.uniform(0.5, 1.5, n).round(2)
+        })
+    
+    def write_dataset(self, name: str, chunks, filepath: Path = None) -> int:
+        """
+        Écrit un dataset bloc par bloc dans output_dir/<name>.<format>
+        (ou filepath)
+
+        Le fichier est écrit à côté puis renommé : un dataset interrompu ne
+        remplace jamais une version complète.
+
+        Returns:
+            Nombre de lignes écrites
+        """
+        replaces_dataset = filepath is None
+        filepath = Path(filepath or self.output_dir / f'{name}.{self.output_format}')
+        tmp_path = filepath.with_name(f'.{filepath.name}.tmp')
+        write = self._write_parquet if self.output_format == 'parquet' else self._write_csv
+        
+        try:
+            rows = write(name, tmp_path, chunks)
+            os.replace(tmp_path, filepath)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        if replaces_dataset:
+            self._remove_other_layouts(name, filepath)
+        
+        logger.info(f"✓ Sauvegardé: {filepath} ({rows:,} lignes)")
+        return rows
+    
+    def _remove_other_layouts(self, name: str, keep: Path):
+        """
+        Supprime les autres sorties d'un dataset (CSV, Parquet, shards) : après
+        un changement de --format ou de --shards, les lecteurs ne doivent pas
+        retomber sur une ancienne version
+        """
+        layouts = [self.output_dir / f'{name}.{fmt}' for fmt in OUTPUT_FORMATS] + [self.output_dir / name]
+        for path in layouts:
+            if path == keep or not path.exists():
+                continue
+            if path.is_dir():
+                shutil.rmtree(path)
+            else:
+                path.unlink()
+            logger.info(f"  {name}: ancienne sortie supprimée ({path.name})")
+    
+    def _write_csv(self, name: str, path: Path, chunks) -> int:
+        """CSV UTF-8 avec BOM (en-tête et BOM écrits une seule fois)"""
+        rows = 0
+        with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+            for index, chunk in enumerate(chunks):
+                chunk.to_csv(f, index=False, header=(index == 0))
+                rows += len(chunk)
+                logger.info(f"  {name}: bloc {index + 1} écrit ({len(chunk):,} lignes, total {rows:,})")
+        return rows
+    
+    def _write_parquet(self, name: str, path: Path, chunks) -> int:
+        """
+        Parquet (zstd), un row group par bloc
+
+        Les types du schéma sont conservés : catégories encodées en
+        dictionnaire, float32, petits entiers, dates et booléens.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        writer = None
+        rows = 0
+        try:
+            for index, chunk in enumerate(chunks):
+                table = pa.Table.from_pandas(
+                    chunk, schema=writer.schema if writer else None, preserve_index=False
+                )
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema, compression='zstd')
+                writer.write_table(table)
+                rows += len(chunk)
+                logger.info(f"  {name}: bloc {index + 1} écrit ({len(chunk):,} lignes, total {rows:,})")
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows
+    
+    def generate_sharded(self, dataset: str, n_shards: int, n_rows: int = None, workers: int = None,
+                         chunk_size: int = CHUNK_SIZE, **options) -> int:
+        """
+        Génère un dataset en n_shards fichiers, en parallèle (un processus par shard)
+
+        Écrit output_dir/<dataset>/part-XXXXX.<format> et un manifeste
+        _manifest.json (lignes, graines, durée par shard). Le répertoire est
+        construit à côté puis renommé : un manifeste présent garantit un jeu
+        de shards complet.
+
+        Returns:
+            Nombre total de lignes écrites
+        """
+        _, default_rows, default_options = SYNTHETIC_DATASETS[dataset]
+        n_rows = default_rows if n_rows is None else n_rows
+        options = {**default_options, **options}
+        workers = workers or min(n_shards, os.cpu_count() or 1)
+        
+        target_dir = self.output_dir / dataset
+        tmp_dir = self.output_dir / f'.{dataset}.tmp-{os.getpid()}'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir()
+        
+        bounds = np.linspace(0, n_rows, n_shards + 1).astype(int)
+        logger.info(f"Génération {dataset}: {n_rows:,} lignes en {n_shards} shards ({workers} processus)")
+        started = time.perf_counter()
+        
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [
+                    pool.submit(
+                        _write_shard, str(tmp_dir), self.seed, self.output_format, dataset,
+                        shard, int(bounds[shard]), int(bounds[shard + 1] - bounds[shard]),
+                        chunk_size, options
+                    )
+                    for shard in range(n_shards)
+                ]
+                shards = [future.result() for future in futures]
+            
+            manifest = {
+                'dataset': dataset,
+                'format': self.output_format,
+                'seed': self.seed,
+                'rows': int(sum(shard['rows'] for shard in shards)),
+                'chunk_size': chunk_size,
+                'options': options,
+                'shards': shards,
+                'seconds': round(time.perf_counter() - started, 3),
+                'created_at': datetime.now().isoformat(),
+            }
+            with open(tmp_dir / MANIFEST_NAME, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2, ensure_ascii=False)
+            
+            old_dir = None
+            if target_dir.exists():
+                old_dir = self.output_dir / f'.{dataset}.old-{os.getpid()}'
+                os.replace(target_dir, old_dir)
+            os.replace(tmp_dir, target_dir)
+            if old_dir is not None:
+                shutil.rmtree(old_dir, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        self._remove_other_layouts(dataset, target_dir)
+        
+        logger.info(f"✓ {dataset}: {manifest['rows']:,} lignes, {n_shards} shards en {manifest['seconds']:.1f}s")
+        return manifest['rows']
+    
+    def update_weather_history(self, locations: List[tuple], manifest: RunManifest, years: int = 5,
+                               concurrency: int = 1, rate_per_second: float = 5.0) -> int:
+        """
+        Met à jour weather_historical de façon incrémentale
+        
+        Seules les fenêtres de dates absentes du manifeste sont récupérées,
+        puis fusionnées avec le fichier existant (un jour = une ligne par
+        point). La couverture d'un point s'arrête au dernier jour renvoyé
+        avec des valeurs : les jours pas encore publiés par l'archive sont
+        redemandés à la relance suivante.
+        
+        Returns:
+            Nombre de lignes du fichier
+        """
+        filepath = self.output_dir / f'weather_historical.{self.output_format}'
+        if not filepath.exists():
+            manifest.reset_weather()
+        
+        end = date.today()
+        start = end - timedelta(days=365 * years)
+        
+        # Points regroupés par fenêtre manquante (une requête par point et par fenêtre)
+        windows = {}
+        for location in locations:
+            for window in manifest.missing_windows(location_key(location[0], location[1]), start, end):
+                windows.setdefault(window, []).append(location)
+        
+        if not windows:
+            logger.info("Historique météo à jour, aucune fenêtre à récupérer")
+            return manifest.data['datasets'].get('weather_historical', {}).get('rows', 0)
+        
+        frames = []
+        for (window_start, window_end), window_locations in windows.items():
+            logger.info(f"Météo: {len(window_locations)} points, {window_start} → {window_end}")
+            df = self.scrape_open_meteo_historical(
+                window_locations, concurrency=concurrency, rate_per_second=rate_per_second,
+                start_date=window_start, end_date=window_end
+            )
+            if not df.empty:
+                frames.append((window_start, window_end, df))
+        
+        if not frames:
+            return manifest.data['datasets'].get('weather_historical', {}).get('rows', 0)
+        
+        # Historique existant, éventuellement écrit dans l'autre format
+        previous = max(
+            (path for path in (self.output_dir / f'weather_historical.{fmt}' for fmt in OUTPUT_FORMATS)
+             if path.exists()),
+            key=lambda path: path.stat().st_mtime_ns, default=None
+        )
+        existing = []
+        if previous is not None:
+            if previous.suffix == '.parquet':
+                existing = [pd.read_parquet(previous)]
+            else:
+                existing = [pd.read_csv(previous, encoding='utf-8-sig')]
+        
+        combined = pd.concat(existing + [df for _, _, df in frames], ignore_index=True)
+        combined['time'] = pd.to_datetime(combined['time'])
+        combined = apply_schema('weather_historical', (
+            combined.drop_duplicates(subset=['latitude', 'longitude', 'time'], keep='last')
+            .sort_values(['location', 'time'], kind='stable')
+            .reset_index(drop=True)
+        ))
+        rows = self.write_dataset('weather_historical', [combined])
+        
+        # Couverture : jusqu'au dernier jour avec au moins une valeur
+        for window_start, window_end, df in frames:
+            values = df.drop(columns=['time', 'latitude', 'longitude', 'location'])
+            published = df[values.notna().any(axis=1)]
+            last_days = published.groupby(['latitude', 'longitude', 'location'])['time'].max()
+            for (lat, lon, name), last_day in last_days.items():
+                manifest.extend_coverage(
+                    location_key(lat, lon), name, window_start,
+                    min(window_end, date.fromisoformat(str(last_day)[:10]))
+                )
+        manifest.mark_complete('weather_historical', filepath, rows, {'years': years})
+        return rows
+    
     def save_datasets(self, datasets: Dict[str, pd.DataFrame]):
         """Sauvegarde tous les datasets"""
         logger.info("Sauvegarde des datasets...")
         
         for name, df in datasets.items():
             if not df.empty:
-                filepath = self.output_dir / f'{name}.csv'
-                df.to_csv(filepath, index=False, encoding='utf-8-sig')
-                logger.info(f"✓ Sauvegardé: {filepath} ({len(df)} lignes)")
+                self.write_dataset(name, [df])
                 
                 # Statistiques
                 print(f"\n=== {name.upper()} ===")
                 print(f"Lignes: {len(df)}")
                 print(f"Colonnes: {list(df.columns)}")
-                print(f"Taille: {df.memory_usage(deep=True).sum() / 1024**2:.2f} MB")
+                print(f"Taille: {memory_mb(df):.2f} MB")
     
-    def run_full_scraping(self):
-        """Lance le scraping complet"""
-        logger.info("="*60)
-        logger.info("DÉMARRAGE SCRAPING COMPLET")
-        logger.info("="*60)
-        
-        datasets = {}
-        
-        # 1. Données météo historiques (locations au Cameroun)
-        cameroon_locations = [
-            (3.8667, 11.5167, 'Yaoundé'),
-            (4.0511, 9.7679, 'Douala'),
-            (9.3077, 13.3961, 'Garoua'),
-            (5.9667, 10.1667, 'Bamenda'),
-            (7.3333, 13.3833, 'Ngaoundéré'),
-            (5.4667, 10.4167, 'Bafoussam')
-        ]
-        datasets['weather_historical'] = self.scrape_open_meteo_historical(cameroon_locations)
-        
-        # 2. Données de cultures FAO
-        datasets['crop_production'] = self.scrape_fao_crop_data()
-        
-        # 3. Données de sol
-        datasets['soil_properties'] = self.scrape_soil_data()
-        
-        # 4. Données d'irrigation
-        datasets['irrigation'] = self.generate_irrigation_data()
-        
-        # 5. Données d'engrais
-        datasets['fertilizers'] = self.generate_fertilizer_data()
-        
-        # 6. Données maladies/ravageurs
-        datasets['pests_diseases'] = self.generate_pest_disease_data()
+    def run_full_scraping(self, chunk_size: int = CHUNK_SIZE, shards: int = 1, workers: int = None,
+                          sizes: Dict[str, int] = None, resume: bool = True, concurrency: int = 1,
+                          rate_per_second: float = 5.0, grid_step: float = None) -> Dict[str, int]:
+        """
+        Lance le scraping complet
         
-        # 7. Données synthétiques de fermes (PRINCIPAL)
-        datasets['farms'] = self.generate_synthetic_farm_data(100000)
+        Les datasets synthétiques sont générés et écrits bloc par bloc :
+        la mémoire reste bornée par chunk_size quelle que soit leur taille.
+        Avec shards > 1, les datasets de SHARDED_DATASETS sont répartis sur
+        plusieurs processus (un fichier par shard + manifeste).
         
-        # 8. Données stations météo
-        datasets['weather_stations'] = self.generate_weather_station_data(500, 1000)
+        Chaque étape terminée est enregistrée dans _run_manifest.json : avec
+        resume=True, une relance saute les datasets déjà générés avec les
+        mêmes paramètres (y compris SCHEMA_VERSION) et ne récupère que les jours de météo manquants.
         
-        # 9. Données prix marché
-        datasets['market_prices'] = self.generate_market_price_data()
+        Args:
+            sizes: nombre de lignes par dataset (défauts de SYNTHETIC_DATASETS)
+            resume: reprendre depuis le manifeste existant
+            concurrency: requêtes Open-Meteo simultanées (> 1 : client asynchrone)
+            rate_per_second: débit maximal de requêtes Open-Meteo
+            grid_step: pas (degrés) d'une grille couvrant le Cameroun, ajoutée aux villes
+        
+        Returns:
+            Nombre de lignes écrites par dataset
+        """
+        logger.info("="*60)
+        logger.info("DÉMARRAGE SCRAPING COMPLET")
+        logger.info("="*60)
         
-        # Sauvegarde
-        self.save_datasets(datasets)
+        row_counts = {}
+        manifest = RunManifest(self.output_dir)
+        if not resume:
+            manifest.reset()
+        
+        # 1. Données météo historiques (villes du Cameroun, grille en option)
+        locations = list(CAMEROON_LOCATIONS)
+        if grid_step:
+            locations += grid_locations(*CAMEROON_BOUNDS, grid_step)
+        weather_rows = self.update_weather_history(
+            locations, manifest, concurrency=concurrency, rate_per_second=rate_per_second
+        )
+        if weather_rows:
+            row_counts['weather_historical'] = weather_rows
+        
+        # 2 à 9. Cultures FAO, sol, irrigation, engrais, maladies/ravageurs,
+        # fermes (PRINCIPAL), stations météo, prix marché
+        sizes = sizes or {}
+        for name, (_, default_rows, _) in SYNTHETIC_DATASETS.items():
+            sharded = shards > 1 and name in SHARDED_DATASETS
+            params = {
+                'rows': sizes.get(name, default_rows),
+                'seed': self.seed,
+                'format': self.output_format,
+                'chunk_size': chunk_size,
+                'shards': shards if sharded else 1,
+                'schema': SCHEMA_VERSION,
+            }
+            
+            rows = manifest.completed_rows(name, params)
+            if rows is not None:
+                logger.info(f"✓ {name}: déjà généré ({rows:,} lignes), ignoré")
+                row_counts[name] = rows
+                continue
+            
+            if sharded:
+                path = self.output_dir / name
+                rows = self.generate_sharded(
+                    name, shards, params['rows'], workers=workers, chunk_size=chunk_size
+                )
+            else:
+                logger.info(f"Génération {name}...")
+                path = self.output_dir / f'{name}.{self.output_format}'
+                rows = self.write_dataset(
+                    name, self.iter_dataset(name, params['rows'], chunk_size=chunk_size)
+                )
+            manifest.mark_complete(name, path, rows, params)
+            row_counts[name] = rows
         
         # Statistiques globales
-        total_observations = sum(len(df) for df in datasets.values() if not df.empty)
+        total_observations = sum(row_counts.values())
         logger.info("="*60)
         logger.info(f"✓ SCRAPING TERMINÉ")
         logger.info(f"✓ Total observations: {total_observations:,}")
-        logger.info(f"✓ Datasets créés: {len(datasets)}")
+        logger.info(f"✓ Datasets créés: {len(row_counts)}")
         logger.info("="*60)
         
-        return datasets
+        return row_counts
+
+
+def _write_shard(output_dir: str, seed: int, output_format: str, dataset: str,
+                 shard: int, offset: int, n_rows: int, chunk_size: int, options: dict) -> dict:
+    """Génère et écrit un shard (exécuté dans un processus du pool)"""
+    started = time.perf_counter()
+    scraper = AgriculturalDataScraper(output_dir=output_dir, seed=seed, output_format=output_format,
+                                      http_cache=False)
+    filename = f'part-{shard:05d}.{output_format}'
+    rows = scraper.write_dataset(
+        f'{dataset}[{shard}]',
+        scraper.iter_dataset(dataset, n_rows, chunk_size, shard=shard, offset=offset, **options),
+        filepath=Path(output_dir) / filename
+    )
+    return {
+        'shard': shard,
+        'file': filename,
+        'offset': offset,
+        'rows': rows,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
 
 
 def main():
     """Fonction principale"""
-    scraper = AgriculturalDataScraper(output_dir='data')
-    datasets = scraper.run_full_scraping()
+    # Configuration du logging (script seulement : l'import du module ne crée pas scraping.log)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('scraping.log'),
+            logging.StreamHandler()
+        ]
+    )
+    
+    parser = argparse.ArgumentParser(description="Scraping des données agricoles")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='csv',
+                        help="Format de sortie des datasets (défaut: csv)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help="Lignes générées et écrites par bloc")
+    parser.add_argument('--shards', type=int, default=1,
+                        help=f"Shards parallèles pour {', '.join(SHARDED_DATASETS)}")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Processus de génération (défaut: min(shards, nombre de coeurs))")
+    parser.add_argument('--no-resume', action='store_true',
+                        help="Ignorer le manifeste de reprise et tout régénérer")
+    parser.add_argument('--no-http-cache', action='store_true',
+                        help="Ne pas utiliser le cache disque des réponses Open-Meteo")
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help="Requêtes Open-Meteo simultanées (> 1 : client asynchrone)")
+    parser.add_argument('--rate', type=float, default=5.0,
+                        help="Requêtes Open-Meteo par seconde au maximum (défaut: 5)")
+    parser.add_argument('--grid-step', type=float, default=None,
+                        help="Ajouter une grille météo couvrant le Cameroun au pas donné "
+                             "(degrés, ex: 0.25 pour ~1400 points)")
+    args = parser.parse_args()
+    if args.concurrency < 1:
+        parser.error("--concurrency doit être >= 1")
+    if args.rate <= 0:
+        parser.error("--rate doit être > 0")
+    if args.grid_step is not None and args.grid_step <= 0:
+        parser.error("--grid-step doit être > 0")
+    
+    scraper = AgriculturalDataScraper(output_dir='data', output_format=args.format,
+                                      http_cache=not args.no_http_cache)
+    row_counts = scraper.run_full_scraping(
+        chunk_size=args.chunk_size, shards=args.shards, workers=args.workers,
+        resume=not args.no_resume, concurrency=args.concurrency, rate_per_second=args.rate,
+        grid_step=args.grid_step
+    )
     
     print("\n" + "="*60)
     print("SCRAPING COMPLÉTÉ AVEC SUCCÈS!")
@@ -437,8 +829,8 @@ def main():
     
     # Créer un résumé
     summary = {
-        'total_observations': sum(len(df) for df in datasets.values()),
-        'datasets': {name: len(df) for name, df in datasets.items()},
+        'total_observations': sum(row_counts.values()),
+        'datasets': row_counts,
         'timestamp': datetime.now().isoformat()
     }
     
@@ -0,0 +1,462 @@
+"""
+Tests du scraper : client Open-Meteo et cache HTTP (serveur HTTP local), reprise
+"""
+import asyncio
+import json
+import random
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import date
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+import requests
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from .http_cache import HTTPCache, get_json
+from .open_meteo import OpenMeteoFetcher, TokenBucket, build_params
+from .run_manifest import MANIFEST_FILENAME, RunManifest, location_key
+from .schemas import DATASET_SCHEMAS
+from .scraper import CAMEROON_LOCATIONS, SYNTHETIC_DATASETS, AgriculturalDataScraper
+
+
+def archive_body(lat: float, days: int = 3) -> dict:
+    return {
+        'latitude': lat,
+        'daily': {
+            'time': [f'2020-01-0{day + 1}' for day in range(days)],
+            'temperature_2m_max': [30.0 + lat] * days,
+            'temperature_2m_min': [20.0] * days,
+            'precipitation_sum': [1.5] * days,
+        },
+    }
+
+
+class StubArchive:
+    """
+    Faux serveur archive : réponses programmées par latitude
+
+    responses[lat] est une liste de (statut, en-têtes) consommée à chaque
+    requête ; une fois épuisée, le point répond 200 avec un corps JSON.
+    """
+
+    def __init__(self, responses: dict = None, max_delay: float = 0.0):
+        self.responses = {lat: list(script) for lat, script in (responses or {}).items()}
+        self.max_delay = max_delay
+        self.requests = []
+
+    async def handle(self, request):
+        lat = float(request.query['latitude'])
+        self.requests.append((lat, time.monotonic()))
+        if self.max_delay:
+            await asyncio.sleep(random.uniform(0, self.max_delay))
+
+        script = self.responses.get(lat)
+        if script:
+            status, headers = script.pop(0)
+            return web.Response(status=status, headers=headers, text='erreur')
+        return web.json_response(archive_body(lat))
+
+    def attempts(self, lat: float) -> list:
+        return [at for requested_lat, at in self.requests if requested_lat == lat]
+
+
+class TemporaryOutputMixin:
+    def setUp(self):
+        super().setUp()
+        self.output_dir = Path(tempfile.mkdtemp(prefix='agri-smart-scraper-'))
+        self.addCleanup(shutil.rmtree, self.output_dir, ignore_errors=True)
+
+
+class OpenMeteoFetcherTests(unittest.IsolatedAsyncioTestCase):
+    LOCATIONS = [(float(lat), 10.0, f'P{lat}') for lat in range(1, 6)]
+
+    async def serve(self, stub: StubArchive) -> str:
+        app = web.Application()
+        app.router.add_get('/v1/archive', stub.handle)
+        server = TestServer(app)
+        await server.start_server()
+        self.addAsyncCleanup(server.close)
+        return str(server.make_url('/v1/archive'))
+
+    def fetcher(self, url: str, **options) -> OpenMeteoFetcher:
+        options = {'rate_per_second': 1000, 'backoff_base': 0.01, 'backoff_max': 1.0, 'timeout': 5, **options}
+        return OpenMeteoFetcher(base_url=url, **options)
+
+    async def test_retries_5xx_without_retry_after(self):
+        stub = StubArchive({1.0: [(503, {}), (502, {})]})
+        frames = await self.fetcher(await self.serve(stub)).fetch_all(self.LOCATIONS[:1], '2020-01-01', '2020-01-03')
+
+        self.assertEqual(len(stub.attempts(1.0)), 3)
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(list(frames[0]['temperature_2m_max']), [31.0] * 3)
+
+    async def test_429_waits_for_retry_after(self):
+        stub = StubArchive({1.0: [(429, {'Retry-After': '0.3'})]})
+        frames = await self.fetcher(await self.serve(stub), backoff_base=0).fetch_all(
+            self.LOCATIONS[:1], '2020-01-01', '2020-01-03'
+        )
+
+        first, second = stub.attempts(1.0)
+        self.assertGreaterEqual(second - first, 0.3)
+        self.assertEqual(len(frames), 1)
+
+    async def test_retry_after_capped_by_backoff_max(self):
+        stub = StubArchive({1.0: [(503, {'Retry-After': '3600'})]})
+        started = time.monotonic()
+        frames = await self.fetcher(await self.serve(stub), backoff_max=0.2).fetch_all(
+            self.LOCATIONS[:1], '2020-01-01', '2020-01-03'
+        )
+
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(len(frames), 1)
+
+    async def test_gives_up_after_max_retries(self):
+        stub = StubArchive({2.0: [(500, {})] * 10})
+        frames = await self.fetcher(await self.serve(stub), max_retries=2).fetch_all(
+            self.LOCATIONS[:3], '2020-01-01', '2020-01-03'
+        )
+
+        self.assertEqual(len(stub.attempts(2.0)), 3)
+        self.assertEqual([df['location'].iloc[0] for df in frames], ['P1', 'P3'])
+
+    async def test_client_errors_are_not_retried(self):
+        stub = StubArchive({1.0: [(404, {})]})
+        frames = await self.fetcher(await self.serve(stub)).fetch_all(self.LOCATIONS[:1], '2020-01-01', '2020-01-03')
+
+        self.assertEqual(len(stub.attempts(1.0)), 1)
+        self.assertEqual(frames, [])
+
+    async def test_results_keep_input_order(self):
+        stub = StubArchive(max_delay=0.05)
+        locations = [(float(lat), 10.0, f'P{lat}') for lat in range(1, 41)]
+        frames = await self.fetcher(await self.serve(stub), concurrency=16).fetch_all(
+            locations, '2020-01-01', '2020-01-03'
+        )
+
+        self.assertEqual([df['location'].iloc[0] for df in frames], [name for _, _, name in locations])
+
+    async def test_token_bucket_limits_request_rate(self):
+        stub = StubArchive()
+        rate = 20
+        locations = [(float(lat), 10.0, f'P{lat}') for lat in range(1, 51)]
+        await self.fetcher(await self.serve(stub), rate_per_second=rate, concurrency=50).fetch_all(
+            locations, '2020-01-01', '2020-01-03'
+        )
+
+        # Rafale initiale de `rate` requêtes (capacité), puis `rate` par seconde :
+        # N requêtes demandent au moins (N - rate) / rate secondes (marge de
+        # 0.2 s pour les jetons accumulés pendant l'ouverture de la session)
+        times = sorted(at for _, at in stub.requests)
+        self.assertEqual(len(times), len(locations))
+        self.assertGreaterEqual(times[-1] - times[0], (len(times) - rate) / rate - 0.2)
+
+
+class ConditionalArchive:
+    """Faux serveur archive avec validateurs (ETag / Last-Modified) et 304"""
+
+    def __init__(self, etag: str = None, last_modified: str = None, body: bytes = None):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body = body
+        self.requests = []
+
+    async def handle(self, request):
+        self.requests.append(dict(request.headers))
+        if self.etag and request.headers.get('If-None-Match') == self.etag:
+            return web.Response(status=304)
+        if self.last_modified and request.headers.get('If-Modified-Since') == self.last_modified:
+            return web.Response(status=304)
+
+        headers = {}
+        if self.etag:
+            headers['ETag'] = self.etag
+        if self.last_modified:
+            headers['Last-Modified'] = self.last_modified
+        body = self.body or json.dumps(archive_body(float(request.query['latitude']))).encode()
+        return web.Response(body=body, headers=headers, content_type='application/json')
+
+
+class HTTPCacheRevalidationTests(TemporaryOutputMixin, unittest.IsolatedAsyncioTestCase):
+    LOCATIONS = [(1.0, 10.0, 'P1'), (2.0, 10.0, 'P2')]
+    # Archive consolidée (réponse immuable) / récente (revalidée après RECENT_TTL)
+    SETTLED = ('2020-01-01', '2020-01-03')
+    RECENT = (date.today().isoformat(), date.today().isoformat())
+
+    async def serve(self, stub) -> str:
+        app = web.Application()
+        app.router.add_get('/v1/archive', stub.handle)
+        server = TestServer(app)
+        await server.start_server()
+        self.addAsyncCleanup(server.close)
+        return str(server.make_url('/v1/archive'))
+
+    def cache(self) -> HTTPCache:
+        return HTTPCache(self.output_dir / '.http_cache')
+
+    def expire(self, cache: HTTPCache):
+        """Vieillit toutes les entrées au-delà de leur fraîcheur"""
+        for path in cache.entries_dir.glob('*/*.json'):
+            entry = json.loads(path.read_text(encoding='utf-8'))
+            entry['stored_at'] = 0
+            path.write_text(json.dumps(entry), encoding='utf-8')
+
+    async def fetch(self, url, cache, dates):
+        fetcher = OpenMeteoFetcher(base_url=url, rate_per_second=1000, backoff_base=0.01, timeout=5, cache=cache)
+        return await fetcher.fetch_all(self.LOCATIONS, *dates)
+
+    async def test_settled_archive_served_from_cache(self):
+        stub = ConditionalArchive(etag='"v1"')
+        url = await self.serve(stub)
+        first = await self.fetch(url, self.cache(), self.SETTLED)
+
+        cache = self.cache()
+        second = await self.fetch(url, cache, self.SETTLED)
+        self.assertEqual(len(stub.requests), 2)
+        self.assertEqual(cache.stats(), {'hits': 2, 'revalidated': 0, 'misses': 0})
+        for before, after in zip(first, second):
+            self.assertTrue(before.equals(after))
+
+    async def test_stale_entry_revalidated_with_etag(self):
+        stub = ConditionalArchive(etag='"v1"')
+        url = await self.serve(stub)
+        cache = self.cache()
+        first = await self.fetch(url, cache, self.RECENT)
+        self.expire(cache)
+
+        second = await self.fetch(url, cache, self.RECENT)
+        self.assertEqual(stub.requests[-1].get('If-None-Match'), '"v1"')
+        self.assertEqual(cache.stats(), {'hits': 0, 'revalidated': 2, 'misses': 2})
+        self.assertTrue(first[0].equals(second[0]))
+
+        # Entrée à nouveau fraîche après le 304
+        await self.fetch(url, cache, self.RECENT)
+        self.assertEqual(len(stub.requests), 4)
+        self.assertEqual(cache.hits, 2)
+
+    async def test_stale_entry_revalidated_with_last_modified(self):
+        stub = ConditionalArchive(last_modified='Wed, 01 Jan 2020 00:00:00 GMT')
+        url = await self.serve(stub)
+        cache = self.cache()
+        await self.fetch(url, cache, self.RECENT)
+        self.expire(cache)
+
+        frames = await self.fetch(url, cache, self.RECENT)
+        self.assertNotIn('If-None-Match', stub.requests[-1])
+        self.assertEqual(stub.requests[-1].get('If-Modified-Since'), stub.last_modified)
+        self.assertEqual(cache.revalidated, 2)
+        self.assertEqual(len(frames), 2)
+
+    async def test_changed_resource_replaces_entry(self):
+        stub = ConditionalArchive(etag='"v1"')
+        url = await self.serve(stub)
+        cache = self.cache()
+        await self.fetch(url, cache, self.RECENT)
+        self.expire(cache)
+
+        stub.etag = '"v2"'
+        await self.fetch(url, cache, self.RECENT)
+        self.assertEqual(cache.revalidated, 0)
+        params = build_params(1.0, 10.0, *self.RECENT)
+        self.assertEqual(cache.lookup(url, params)['etag'], '"v2"')
+
+    async def test_malformed_body_fails_only_that_location(self):
+        stub = ConditionalArchive(body=b'{"daily": ')
+        url = await self.serve(stub)
+        cache = self.cache()
+
+        frames = await self.fetch(url, cache, self.SETTLED)
+        self.assertEqual(frames, [])
+        self.assertEqual(len(stub.requests), 2)  # pas de nouvel essai
+        self.assertIsNone(cache.lookup(url, build_params(1.0, 10.0, *self.SETTLED)))
+
+    async def test_sync_path_shares_cache_and_revalidates(self):
+        stub = ConditionalArchive(etag='"v1"')
+        url = await self.serve(stub)
+        cache = self.cache()
+        await self.fetch(url, cache, self.RECENT)
+        self.expire(cache)
+
+        params = build_params(1.0, 10.0, *self.RECENT)
+        data, requested = await asyncio.to_thread(get_json, requests.Session(), cache, url, params, 3600)
+        self.assertTrue(requested)
+        self.assertEqual(cache.revalidated, 1)
+        self.assertEqual(data['daily']['temperature_2m_max'][0], 31.0)
+
+        data, requested = await asyncio.to_thread(get_json, requests.Session(), cache, url, params, 3600)
+        self.assertFalse(requested)
+
+    async def test_sync_path_does_not_cache_malformed_body(self):
+        stub = ConditionalArchive(body=b'<html>maintenance</html>')
+        url = await self.serve(stub)
+        cache = self.cache()
+        params = build_params(1.0, 10.0, *self.SETTLED)
+
+        with self.assertRaises(ValueError):
+            await asyncio.to_thread(get_json, requests.Session(), cache, url, params, None)
+        self.assertIsNone(cache.lookup(url, params))
+
+
+class TokenBucketTests(unittest.IsolatedAsyncioTestCase):
+    async def test_burst_then_steady_rate(self):
+        bucket = TokenBucket(rate=50, capacity=5)
+        started = time.monotonic()
+        for _ in range(5):
+            await bucket.acquire()
+        self.assertLess(time.monotonic() - started, 0.05)
+
+        for _ in range(10):
+            await bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 10 / 50 * 0.9)
+
+
+class RunManifestTests(TemporaryOutputMixin, unittest.TestCase):
+    PARAMS = {'rows': 100, 'seed': 42, 'format': 'csv', 'chunk_size': 50, 'shards': 1, 'schema': 1}
+
+    def test_completed_dataset_survives_restart(self):
+        (self.output_dir / 'farms.csv').write_text('a\n1\n', encoding='utf-8')
+        RunManifest(self.output_dir).mark_complete('farms', self.output_dir / 'farms.csv', 100, self.PARAMS)
+
+        manifest = RunManifest(self.output_dir)
+        self.assertEqual(manifest.completed_rows('farms', self.PARAMS), 100)
+        self.assertIsNone(manifest.completed_rows('farms', {**self.PARAMS, 'rows': 200}))
+        self.assertIsNone(manifest.completed_rows('soil_properties', self.PARAMS))
+
+        (self.output_dir / 'farms.csv').unlink()
+        self.assertIsNone(manifest.completed_rows('farms', self.PARAMS))
+
+    def test_unreadable_or_foreign_manifest_starts_over(self):
+        path = self.output_dir / MANIFEST_FILENAME
+        path.write_text('{"datasets": ', encoding='utf-8')
+        self.assertEqual(RunManifest(self.output_dir).data['datasets'], {})
+
+        path.write_text(json.dumps({'version': 99, 'datasets': {'farms': {}}, 'weather': {}}), encoding='utf-8')
+        self.assertEqual(RunManifest(self.output_dir).data['datasets'], {})
+
+    def test_weather_coverage_windows(self):
+        manifest = RunManifest(self.output_dir)
+        key = location_key(3.8667, 11.5167)
+        start, end = date(2020, 1, 1), date(2020, 12, 31)
+        self.assertEqual(manifest.missing_windows(key, start, end), [(start, end)])
+
+        manifest.extend_coverage(key, 'Yaoundé', date(2020, 3, 1), date(2020, 10, 31))
+        manifest.save()
+        manifest = RunManifest(self.output_dir)
+        self.assertEqual(manifest.missing_windows(key, start, end), [
+            (start, date(2020, 2, 29)), (date(2020, 11, 1), end)
+        ])
+        self.assertEqual(manifest.missing_windows(key, date(2020, 4, 1), date(2020, 5, 1)), [])
+
+        # Fenêtre disjointe : une seule fenêtre, pour garder une couverture continue
+        self.assertEqual(
+            manifest.missing_windows(key, date(2021, 2, 1), date(2021, 3, 1)),
+            [(date(2020, 3, 1), date(2021, 3, 1))]
+        )
+
+
+class SchemaTests(TemporaryOutputMixin, unittest.TestCase):
+    """Types de DATASET_SCHEMAS après génération et après relecture Parquet"""
+
+    ROWS = 2000
+    CHUNK_SIZE = 700  # blocs incomplets : 700 + 700 + 600
+
+    def setUp(self):
+        super().setUp()
+        self.scraper = AgriculturalDataScraper(output_dir=self.output_dir, output_format='parquet',
+                                               http_cache=False)
+
+    def test_generated_dtypes_follow_schema(self):
+        for name in SYNTHETIC_DATASETS:
+            with self.subTest(dataset=name):
+                df = self.scraper.generate_dataset(name, self.ROWS, chunk_size=self.CHUNK_SIZE)
+                self.assertEqual(len(df), self.ROWS)
+                for column, dtype in DATASET_SCHEMAS[name].items():
+                    if dtype == 'category':
+                        self.assertIsInstance(df[column].dtype, pd.CategoricalDtype, column)
+                    else:
+                        self.assertEqual(df[column].dtype, pd.api.types.pandas_dtype(dtype), column)
+                    self.assertFalse(df[column].isna().all(), column)
+
+    def test_parquet_round_trip_in_chunks(self):
+        import pyarrow.parquet as pq
+
+        for name in SYNTHETIC_DATASETS:
+            with self.subTest(dataset=name):
+                expected = self.scraper.generate_dataset(name, self.ROWS, chunk_size=self.CHUNK_SIZE)
+                self.scraper.write_dataset(
+                    name, self.scraper.iter_dataset(name, self.ROWS, chunk_size=self.CHUNK_SIZE)
+                )
+                path = self.output_dir / f'{name}.parquet'
+                self.assertEqual(pq.ParquetFile(path).num_row_groups, 3)
+                pd.testing.assert_frame_equal(pd.read_parquet(path), expected)
+
+
+class ResumeTests(TemporaryOutputMixin, unittest.TestCase):
+    """Relance de run_full_scraping depuis _run_manifest.json (météo hors test)"""
+
+    SIZES = {name: 300 for name in SYNTHETIC_DATASETS}
+
+    def run_scraping(self, **options):
+        scraper = AgriculturalDataScraper(output_dir=self.output_dir, http_cache=False)
+        with mock.patch.object(AgriculturalDataScraper, 'update_weather_history', return_value=0), \
+                mock.patch.object(AgriculturalDataScraper, 'write_dataset', autospec=True,
+                                  side_effect=AgriculturalDataScraper.write_dataset) as write_dataset:
+            row_counts = scraper.run_full_scraping(chunk_size=100, **{'sizes': self.SIZES, **options})
+        return row_counts, [call.args[1] for call in write_dataset.call_args_list]
+
+    def test_rerun_skips_completed_datasets(self):
+        row_counts, written = self.run_scraping()
+        self.assertEqual(written, list(SYNTHETIC_DATASETS))
+        self.assertEqual(row_counts, self.SIZES)
+
+        row_counts, written = self.run_scraping()
+        self.assertEqual(written, [])
+        self.assertEqual(row_counts, self.SIZES)
+
+    def test_changed_or_missing_outputs_are_regenerated(self):
+        self.run_scraping()
+        (self.output_dir / 'soil_properties.csv').unlink()
+
+        row_counts, written = self.run_scraping(sizes={**self.SIZES, 'farms': 400})
+        self.assertEqual(sorted(written), ['farms', 'soil_properties'])
+        self.assertEqual(row_counts['farms'], 400)
+
+    def test_no_resume_regenerates_everything(self):
+        self.run_scraping()
+        _, written = self.run_scraping(resume=False)
+        self.assertEqual(written, list(SYNTHETIC_DATASETS))
+
+
+class WeatherOptionsTests(TemporaryOutputMixin, unittest.TestCase):
+    """Options météo de run_full_scraping transmises à update_weather_history"""
+
+    def run_weather(self, **options):
+        scraper = AgriculturalDataScraper(output_dir=self.output_dir, http_cache=False)
+        with mock.patch.object(AgriculturalDataScraper, 'update_weather_history', return_value=0) as update, \
+                mock.patch.dict(SYNTHETIC_DATASETS, clear=True):
+            # Sans datasets synthétiques : seule l'étape météo est exécutée
+            scraper.run_full_scraping(**options)
+        update.assert_called_once()
+        return update.call_args
+
+    def test_defaults_are_sequential_on_cities(self):
+        call = self.run_weather()
+        self.assertEqual(call.args[0], CAMEROON_LOCATIONS)
+        self.assertEqual(call.kwargs['concurrency'], 1)
+        self.assertEqual(call.kwargs['rate_per_second'], 5.0)
+
+    def test_concurrency_rate_and_grid_are_passed_through(self):
+        call = self.run_weather(concurrency=32, rate_per_second=20.0, grid_step=1.0)
+        self.assertEqual(call.kwargs['concurrency'], 32)
+        self.assertEqual(call.kwargs['rate_per_second'], 20.0)
+        locations = call.args[0]
+        self.assertEqual(locations[:len(CAMEROON_LOCATIONS)], CAMEROON_LOCATIONS)
+        # Grille 2..13 x 8..16 au pas de 1 degré : 12 x 9 points
+        grid = locations[len(CAMEROON_LOCATIONS):]
+        self.assertEqual(len(grid), 12 * 9)
+        self.assertIn((2.0, 8.0, 'GRID_2.0000_8.0000'), grid)
+        self.assertIn((13.0, 16.0, 'GRID_13.0000_16.0000'), grid)
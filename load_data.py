@@ -1,10 +1,17 @@
 #!/usr/bin/env python
 """
 Script de chargement des données scrapées dans la base Django
+
+Les gros datasets (prix de marché, stations météo) sont lus par lots,
+chargés dans une table temporaire puis fusionnés en une seule requête
+INSERT ... ON CONFLICT : COPY FROM STDIN sur PostgreSQL, INSERT groupés
+sur SQLite (même requête de fusion, testable en local)
 """
+import io
 import os
 import sys
 import django
+import numpy as np
 import pandas as pd
 from datetime import datetime
 
@@ -13,13 +20,97 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'agri_smart_project.settings')
 django.setup()
 
-from core.models import Crop, MarketPrice
+from core.features import refresh_farm_features
+from core.models import Crop, Farm, MarketPrice, WeatherData
+from ml_models.datasets import dataset_path, iter_dataset_batches
 from django.contrib.auth.models import User
+from django.db import connection, transaction
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Lignes lues et envoyées à la table temporaire par lot
+LOAD_BATCH_SIZE = 100000
+
+# Propriétaire des fermes techniques représentant les stations météo
+WEATHER_STATION_USERNAME = 'stations_meteo'
+
+# Marché -> région (codes de Farm.REGIONS)
+MARKET_REGIONS = {
+    'Yaoundé': 'CENTER',
+    'Douala': 'LITTORAL',
+    'Garoua': 'NORTH',
+    'Bamenda': 'NORTHWEST',
+    'Bafoussam': 'WEST',
+    'Ngaoundéré': 'ADAMAWA',
+}
+
+# Chef-lieu de chaque région (latitude, longitude) : une station est
+# rattachée à la région du chef-lieu le plus proche
+REGION_CAPITALS = {
+    'NORTH': (9.3077, 13.3961),       # Garoua
+    'FAR_NORTH': (10.5910, 14.3159),  # Maroua
+    'ADAMAWA': (7.3333, 13.3833),     # Ngaoundéré
+    'CENTER': (3.8667, 11.5167),      # Yaoundé
+    'SOUTH': (2.9000, 11.1500),       # Ebolowa
+    'EAST': (4.5775, 13.6846),        # Bertoua
+    'WEST': (5.4667, 10.4167),        # Bafoussam
+    'LITTORAL': (4.0511, 9.7679),     # Douala
+    'NORTHWEST': (5.9667, 10.1667),   # Bamenda
+    'SOUTHWEST': (4.1527, 9.2410),    # Buea
+}
+
+
+def load_staged(staging: str, columns: dict, batches, merge_sql: str):
+    """
+    Charge des lots dans une table temporaire puis les fusionne
+
+    Args:
+        staging: nom de la table temporaire
+        columns: {colonne: type SQL} de la table temporaire
+        batches: DataFrames contenant ces colonnes (dates en 'AAAA-MM-JJ')
+        merge_sql: INSERT ... SELECT ... FROM <staging> ON CONFLICT ...
+
+    Returns:
+        (lignes chargées, lignes insérées ou mises à jour)
+    """
+    names = ', '.join(columns)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE {staging} "
+            f"({', '.join(f'{name} {sql_type}' for name, sql_type in columns.items())})"
+        )
+        
+        staged = 0
+        for df in batches:
+            df = df[list(columns)]
+            # float32 -> float64 par la représentation décimale courte : 28.3
+            # et non 28.299999237060547
+            float32 = list(df.select_dtypes('float32').columns)
+            if float32:
+                df = df.astype({name: str for name in float32}).astype({name: float for name in float32})
+            if connection.vendor == 'postgresql':
+                # CSV en mémoire : valeurs manquantes = champ vide = NULL
+                buffer = io.StringIO()
+                df.to_csv(buffer, index=False, header=False)
+                buffer.seek(0)
+                cursor.cursor.copy_expert(f"COPY {staging} ({names}) FROM STDIN WITH (FORMAT csv)", buffer)
+            else:
+                placeholders = ', '.join(['%s'] * len(columns))
+                cursor.executemany(
+                    f"INSERT INTO {staging} ({names}) VALUES ({placeholders})",
+                    df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+                )
+            staged += len(df)
+            print(f"  → {staged} lignes chargées...")
+        
+        cursor.execute(merge_sql)
+        merged = cursor.rowcount
+        cursor.execute(f"DROP TABLE {staging}")
+    return staged, merged
+
 
 def load_crops():
     """Charger les cultures de base"""
@@ -157,58 +248,185 @@ def load_crops():
 
 
 def load_market_prices():
-    """Charger quelques prix de marché depuis les données scrapées"""
+    """
+    Charger les prix de marché depuis les données scrapées
+
+    Prix moyen par culture, région et jour, en upsert sur
+    (crop, region, date) : relancer le script met à jour les prix sans
+    créer de doublons.
+    """
     print("\n💰 Chargement des prix de marché...")
     
-    data_file = 'data_scraper/data/market_prices.csv'
+    data_file = dataset_path('market_prices')
     
-    if not os.path.exists(data_file):
-        print(f"⚠️  Fichier {data_file} non trouvé")
+    if data_file is None:
+        print("⚠️  Fichier market_prices (.parquet / .csv) non trouvé")
         print("   Exécutez d'abord le scraper: cd data_scraper && python scraper.py")
         return
     
     try:
-        df = pd.read_csv(data_file)
-        print(f"  Lecture de {len(df)} prix...")
-        
-        # Charger un échantillon (pour ne pas surcharger la DB)
-        sample_size = min(1000, len(df))
-        df_sample = df.sample(n=sample_size, random_state=42)
+        crop_ids = dict(Crop.objects.values_list('name_fr', 'id'))
+        print(f"  Lecture de {data_file.name} ({connection.vendor})...")
         
-        regions = ['Centre', 'Littoral', 'Nord', 'Ouest', 'Sud']
+        def batches():
+            for df in iter_dataset_batches(
+                'market_prices', columns=['date', 'crop', 'market', 'price_per_kg'], batch_size=LOAD_BATCH_SIZE
+            ):
+                # Cultures inconnues et marchés sans région ignorés
+                df = df.assign(
+                    crop_id=df['crop'].astype(str).map(crop_ids),
+                    region=df['market'].astype(str).map(MARKET_REGIONS),
+                    date=pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d'),
+                ).dropna(subset=['crop_id', 'region'])
+                yield df.astype({'crop_id': 'int64'})
         
-        loaded_count = 0
-        for _, row in df_sample.iterrows():
-            try:
-                # Trouver la culture correspondante
-                crop = Crop.objects.filter(name_fr=row['crop']).first()
-                
-                if crop:
-                    MarketPrice.objects.get_or_create(
-                        crop=crop,
-                        region=regions[hash(str(row['market'])) % len(regions)],
-                        date=pd.to_datetime(row['date']).date(),
-                        defaults={
-                            'price_per_kg': row['price_per_kg'],
-                            'supply_level': 'Normal',
-                            'demand_level': 'Normal'
-                        }
-                    )
-                    loaded_count += 1
-                    
-                    if loaded_count % 100 == 0:
-                        print(f"  → {loaded_count} prix chargés...")
-                        
-            except Exception as e:
-                continue
+        staged, merged = load_staged(
+            'staging_market_price',
+            {
+                'crop_id': 'bigint',
+                'region': 'varchar(50)',
+                'date': 'date',
+                'price_per_kg': 'double precision',
+            },
+            batches(),
+            f"""
+            INSERT INTO {MarketPrice._meta.db_table}
+                (crop_id, region, date, price_per_kg, supply_level, demand_level)
+            SELECT crop_id, region, date, ROUND(CAST(AVG(price_per_kg) AS NUMERIC), 2), 'Normal', 'Normal'
+            FROM staging_market_price
+            WHERE true
+            GROUP BY crop_id, region, date
+            ON CONFLICT (crop_id, region, date) DO UPDATE SET
+                price_per_kg = excluded.price_per_kg,
+                supply_level = excluded.supply_level,
+                demand_level = excluded.demand_level
+            """
+        )
         
-        print(f"\n✅ {loaded_count} prix de marché chargés")
+        print(f"\n✅ {merged} prix de marché chargés (créés ou mis à jour, {staged} relevés)")
         print(f"💰 Total prix: {MarketPrice.objects.count()}")
         
     except Exception as e:
         print(f"❌ Erreur: {e}")
 
 
+def weather_station_farms(stations: pd.DataFrame) -> dict:
+    """
+    Ferme technique de chaque station météo (créée si besoin)
+
+    WeatherData est rattachée à une ferme : chaque station devient une
+    ferme « Station <id> » de l'utilisateur de service, dans la région du
+    chef-lieu le plus proche.
+
+    Args:
+        stations: colonnes station_id, latitude, longitude
+
+    Returns:
+        {station_id: farm_id}
+    """
+    user, created = User.objects.get_or_create(
+        username=WEATHER_STATION_USERNAME,
+        defaults={'first_name': 'Stations', 'last_name': 'Météo', 'is_active': False}
+    )
+    if created:
+        user.set_unusable_password()
+        user.save()
+    
+    farm_ids = dict(Farm.objects.filter(user=user).values_list('name', 'id'))
+    missing = stations[~('Station ' + stations['station_id']).isin(list(farm_ids))]
+    
+    if not missing.empty:
+        codes = list(REGION_CAPITALS)
+        capitals = np.array(list(REGION_CAPITALS.values()))
+        coordinates = missing[['latitude', 'longitude']].to_numpy(dtype=float)
+        nearest = ((coordinates[:, None, :] - capitals[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+        
+        Farm.objects.bulk_create([
+            Farm(
+                user=user,
+                name=f'Station {station_id}',
+                region=codes[region],
+                latitude=lat,
+                longitude=lon,
+                area_hectares=0,
+                soil_type='LOAM',
+            )
+            for (station_id, lat, lon), region in zip(
+                missing[['station_id', 'latitude', 'longitude']].itertuples(index=False), nearest
+            )
+        ])
+        print(f"  ✓ {len(missing)} fermes de station créées")
+        farm_ids = dict(Farm.objects.filter(user=user).values_list('name', 'id'))
+    
+    return {station_id: farm_ids[f'Station {station_id}'] for station_id in stations['station_id']}
+
+
+def load_weather_stations():
+    """
+    Charger les relevés des stations météo dans WeatherData
+
+    Upsert sur (farm, date) : relancer le script met à jour les relevés.
+    """
+    print("\n🌦️  Chargement des stations météo...")
+    
+    data_file = dataset_path('weather_stations')
+    
+    if data_file is None:
+        print("⚠️  Fichier weather_stations (.parquet / .csv) non trouvé")
+        print("   Exécutez d'abord le scraper: cd data_scraper && python scraper.py")
+        return
+    
+    try:
+        print(f"  Lecture de {data_file.name} ({connection.vendor})...")
+        
+        # Coordonnées de chaque station (première ligne rencontrée)
+        stations = pd.concat([
+            df.astype({'station_id': str}).drop_duplicates('station_id')
+            for df in iter_dataset_batches(
+                'weather_stations', columns=['station_id', 'latitude', 'longitude'], batch_size=LOAD_BATCH_SIZE
+            )
+        ]).drop_duplicates('station_id')
+        farm_ids = weather_station_farms(stations)
+        
+        measures = [
+            'temperature_max', 'temperature_min', 'temperature_avg', 'rainfall_mm',
+            'humidity_percent', 'wind_speed_kmh', 'solar_radiation', 'evapotranspiration'
+        ]
+        
+        def batches():
+            for df in iter_dataset_batches('weather_stations', batch_size=LOAD_BATCH_SIZE):
+                yield df.rename(columns={
+                    'solar_radiation_wm2': 'solar_radiation',
+                    'evapotranspiration_mm': 'evapotranspiration',
+                }).assign(
+                    farm_id=df['station_id'].astype(str).map(farm_ids),
+                    date=pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d'),
+                )
+        
+        staged, merged = load_staged(
+            'staging_weather_data',
+            {'farm_id': 'bigint', 'date': 'date', **{name: 'double precision' for name in measures}},
+            batches(),
+            f"""
+            INSERT INTO {WeatherData._meta.db_table} (farm_id, date, {', '.join(measures)})
+            SELECT farm_id, date, {', '.join(measures)}
+            FROM staging_weather_data
+            WHERE true
+            ON CONFLICT (farm_id, date) DO UPDATE SET
+                {', '.join(f'{name} = excluded.{name}' for name in measures)}
+            """
+        )
+        
+        print(f"\n✅ {merged} relevés météo chargés ({len(farm_ids)} stations, {staged} lignes)")
+        print(f"🌦️  Total relevés: {WeatherData.objects.count()}")
+        
+        # Chargement SQL : pas de signal post_save, features recalculées en lot
+        print(f"🧮 Features recalculées pour {refresh_farm_features(farm_ids.values())} fermes")
+        
+    except Exception as e:
+        print(f"❌ Erreur: {e}")
+
+
 def create_demo_user():
     """Créer un utilisateur de démonstration"""
     print("\n👤 Création utilisateur de démonstration...")
@@ -246,6 +464,7 @@ def main():
     
     load_crops()
     load_market_prices()
+    load_weather_stations()
     create_demo_user()
     
     print("\n" + "="*60)
@@ -0,0 +1,214 @@
+"""
+Artefacts versionnés des modèles ML
+
+    versions/<modèle>/<version>/model.pkl, scaler.pkl, metadata.json
+    versions/<modèle>/CURRENT       nom de la version servie
+
+Une version n'est jamais réécrite une fois publiée : publier (ou revenir
+en arrière) consiste à remplacer CURRENT atomiquement (os.replace). Les
+workers surveillent CURRENT (mtime/inode, voir ModelRegistry) et chargent
+la nouvelle version à côté de l'ancienne avant de basculer : pas de
+lecture d'un pickle à moitié écrit, pas de redémarrage.
+
+Sans CURRENT, les pickles non versionnés des installations antérieures
+(crop_recommender.pkl, ...) sont utilisés.
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+import logging
+
+import joblib
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+CURRENT = 'CURRENT'
+MODEL_FILE = 'model.pkl'
+SCALER_FILE = 'scaler.pkl'
+COMPACT_FILE = 'model.compact'
+LOCK_FILE = '.publish.lock'
+
+# Pickles non versionnés : modèle, scaler, artefact compact
+LEGACY_ARTIFACTS = {
+    'crop_recommender': ('crop_recommender.pkl', 'crop_scaler.pkl', 'crop_recommender.compact'),
+    'yield_predictor': ('yield_predictor.pkl', 'yield_scaler.pkl', 'yield_predictor.compact'),
+}
+
+
+def write_atomic(path: Path, write):
+    """
+    Écrit path via un fichier temporaire du même répertoire puis renommage :
+    les lecteurs voient l'ancien fichier ou le nouveau, jamais un fichier
+    partiellement écrit
+
+    Args:
+        write: fonction appelée avec le chemin du fichier temporaire
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+def versions_dir() -> Path:
+    return settings.ML_MODELS_DIR / 'versions'
+
+
+def new_version(name: str) -> str:
+    """
+    Identifiant horodaté, suffixé si la version existe déjà (même seconde) ;
+    suffixe sur 3 chiffres : l'ordre alphabétique reste l'ordre de création
+    (prune_versions)
+    """
+    version = datetime.now().strftime('%Y%m%d-%H%M%S')
+    suffix = 0
+    while (versions_dir() / name / (f'{version}-{suffix:03d}' if suffix else version)).exists():
+        suffix += 1
+    return f'{version}-{suffix:03d}' if suffix else version
+
+
+def save_version(name: str, version: str, model, scaler, metadata: dict) -> Path:
+    """Écrit versions/<name>/<version>/{model.pkl, scaler.pkl, metadata.json}"""
+    version_dir = versions_dir() / name / version
+    version_dir.mkdir(parents=True, exist_ok=True)
+    joblib.dump(model, version_dir / MODEL_FILE)
+    joblib.dump(scaler, version_dir / SCALER_FILE)
+    write_metadata(version_dir, metadata)
+    return version_dir
+
+
+def write_metadata(version_dir: Path, metadata: dict):
+    def write(path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, indent=2, ensure_ascii=False, default=str)
+    write_atomic(version_dir / 'metadata.json', write)
+
+
+def read_metadata(version_dir: Path) -> dict:
+    """metadata.json d'une version ({} si absent)"""
+    try:
+        with open(version_dir / 'metadata.json', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def current_version(name: str):
+    """Version servie d'un modèle, None si aucune n'est publiée"""
+    try:
+        version = (versions_dir() / name / CURRENT).read_text(encoding='utf-8').strip()
+    except FileNotFoundError:
+        return None
+    if not (versions_dir() / name / version / MODEL_FILE).exists():
+        logger.error(f"{name}: la version publiée {version} est introuvable")
+        return None
+    return version
+
+
+def current_dir(name: str):
+    """Répertoire de la version servie, None si aucune n'est publiée"""
+    version = current_version(name)
+    return None if version is None else versions_dir() / name / version
+
+
+def artifact_paths(name: str, version_dir: Path = None):
+    """(modèle, scaler, artefact compact) d'une version, ou non versionnés"""
+    if version_dir is not None:
+        return version_dir / MODEL_FILE, version_dir / SCALER_FILE, version_dir / COMPACT_FILE
+    return tuple(settings.ML_MODELS_DIR / filename for filename in LEGACY_ARTIFACTS[name])
+
+
+def pointer_stamp(name: str):
+    """Empreinte de CURRENT (mtime/inode/taille), None s'il n'existe pas"""
+    try:
+        stat = (versions_dir() / name / CURRENT).stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+
+
+@contextmanager
+def publish_lock(name: str):
+    """
+    Verrou inter-processus sur les publications d'un modèle
+    (versions/<modèle>/.publish.lock), bloquant jusqu'à son obtention
+    """
+    root = versions_dir() / name
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / LOCK_FILE, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            # LK_LOCK abandonne après ~10 s : on réessaie jusqu'à l'obtention
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def publish_version(name: str, version: str):
+    """
+    Fait servir une version (publication ou retour arrière) : CURRENT est
+    remplacé d'un bloc, puis les versions les plus anciennes sont purgées
+
+    Raises:
+        FileNotFoundError: si la version n'a pas été sauvegardée
+    """
+    version_dir = versions_dir() / name / version
+    if not (version_dir / MODEL_FILE).exists():
+        raise FileNotFoundError(f"Version introuvable: {version_dir}")
+
+    def write(path):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(version + '\n')
+    write_atomic(versions_dir() / name / CURRENT, write)
+    logger.info(f"{name} v{version} publié")
+    prune_versions(name)
+
+
+def prune_versions(name: str, keep: int = None) -> list:
+    """
+    Supprime les versions au-delà des `keep` plus récentes (la version
+    servie est toujours conservée)
+
+    Returns:
+        Versions supprimées
+    """
+    keep = settings.ML_MODEL_KEEP_VERSIONS if keep is None else keep
+    root = versions_dir() / name
+    current = current_version(name)
+    versions = sorted(path.name for path in root.iterdir() if path.is_dir() and not path.name.startswith('.'))
+
+    removed = [version for version in versions[:-keep] if version != current] if keep > 0 else []
+    for version in removed:
+        shutil.rmtree(root / version, ignore_errors=True)
+    if removed:
+        logger.info(f"{name}: {len(removed)} anciennes versions supprimées")
+    return removed
@@ -0,0 +1,95 @@
+"""
+Cache des prédictions ML
+Clé = entrées quantifiées + version du modèle, stockage via le framework
+de cache Django (locmem par processus, ou Redis partagé)
+"""
+import threading
+import logging
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionCache:
+    """
+    Cache LRU + TTL devant les prédictions
+
+    Les entrées proches (même case de quantification) partagent la même
+    clé. L'éviction LRU et l'expiration (TTL) sont assurées par le backend
+    configuré dans CACHES[ML_PREDICTION_CACHE_ALIAS] : LocMemCache est
+    LRU par processus (MAX_ENTRIES), Redis est partagé entre workers.
+
+    Seule la sortie du modèle est mise en cache ; les champs dépendant
+    des valeurs exactes saisies sont recalculés par l'appelant.
+    """
+
+    def __init__(self, namespace: str, fields: list):
+        self.namespace = namespace
+        self.fields = list(fields)
+        resolution = settings.ML_PREDICTION_CACHE_RESOLUTION
+        self.steps = np.array([resolution.get(field, 1.0) for field in self.fields])
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        return caches[settings.ML_PREDICTION_CACHE_ALIAS]
+
+    def key(self, features, model_version: str) -> str:
+        """Clé de cache : cases de quantification des features + version"""
+        buckets = np.round(np.asarray(features, dtype=float) / self.steps).astype(np.int64)
+        return f"ml:{self.namespace}:{model_version}:" + ':'.join(str(b) for b in buckets)
+
+    def get_or_compute(self, features, model_version: str, compute):
+        """
+        Retourne la valeur en cache ou la calcule (compute()) et la stocke
+
+        Une panne du backend de cache n'empêche jamais la prédiction.
+        """
+        key = self.key(features, model_version)
+
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.error(f"Cache prédictions indisponible: {e}")
+            self._count('errors')
+            return compute()
+
+        if value is not None:
+            self._count('hits')
+            return value
+
+        self._count('misses')
+        value = compute()
+        try:
+            self.backend.set(key, value)
+        except Exception as e:
+            logger.error(f"Écriture cache prédictions impossible: {e}")
+            self._count('errors')
+        return value
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> dict:
+        """Compteurs du processus courant"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def build_prediction_cache(namespace: str, fields: list):
+    """Crée le cache d'un prédicteur, ou None si désactivé"""
+    if not settings.ML_PREDICTION_CACHE_ENABLED:
+        return None
+    return PredictionCache(namespace, fields)
@@ -0,0 +1,128 @@
+"""
+Lecture des datasets produits par data_scraper
+Dataset shardé (répertoire + _manifest.json), Parquet (projection de
+colonnes et filtres appliqués à la lecture, row group par row group) ou
+CSV ; lecture complète (read_dataset) ou par lots (iter_dataset_batches)
+"""
+import json
+import operator
+from pathlib import Path
+import logging
+
+import pandas as pd
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Manifeste d'un dataset shardé (écrit en dernier par data_scraper)
+MANIFEST_NAME = '_manifest.json'
+
+# Opérateurs de filtre (mêmes conventions que pyarrow / pd.read_parquet)
+FILTER_OPERATORS = {
+    '==': operator.eq,
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda series, values: series.isin(values),
+    'not in': lambda series, values: ~series.isin(values),
+}
+
+
+def dataset_path(name: str, data_dir=None):
+    """
+    Chemin du dataset, None s'il n'existe pas
+
+    Si plusieurs sorties coexistent (répertoire shardé complet, Parquet,
+    CSV), la plus récemment écrite l'emporte : un changement de --format
+    ou de --shards n'est jamais masqué par une ancienne sortie.
+    """
+    data_dir = Path(data_dir or settings.SCRAPED_DATA_DIR)
+    # (chemin, fichier dont la date fait foi : le manifeste, écrit en dernier)
+    candidates = [(data_dir / name, data_dir / name / MANIFEST_NAME)] + [
+        (data_dir / f'{name}.{extension}',) * 2 for extension in ('parquet', 'csv')
+    ]
+    written = [(stamp.stat().st_mtime_ns, path) for path, stamp in candidates if stamp.exists()]
+    return max(written, key=operator.itemgetter(0))[1] if written else None
+
+
+def read_dataset(name: str, columns: list = None, filters: list = None, data_dir=None) -> pd.DataFrame:
+    """
+    Lit un dataset scrapé
+
+    Args:
+        name: nom du dataset (ex: 'market_prices')
+        columns: colonnes à lire (toutes si None)
+        filters: conditions [(colonne, opérateur, valeur), ...] combinées en ET,
+            ex: [('crop', 'in', ['Maïs', 'Riz']), ('price_per_kg', '>', 0)]
+
+    Raises:
+        FileNotFoundError: si ni <name>/, ni <name>.parquet, ni <name>.csv n'existe
+    """
+    path = dataset_path(name, data_dir)
+    if path is None:
+        raise FileNotFoundError(f"Dataset introuvable: {name} (.parquet / .csv)")
+
+    filters = list(filters or [])
+    for _, op, _ in filters:
+        if op not in FILTER_OPERATORS:
+            raise ValueError(f"Opérateur de filtre inconnu: {op}")
+
+    frames = [_read_file(file, columns, filters) for file in _dataset_files(path)]
+    df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+    logger.info(f"Dataset {name}: {len(df)} lignes lues depuis {path.name}")
+    return df
+
+
+def iter_dataset_batches(name: str, columns: list = None, batch_size: int = 100000, data_dir=None):
+    """
+    Lit un dataset scrapé par lots d'au plus batch_size lignes
+
+    Un seul lot est en mémoire à la fois (Parquet : itération par
+    batches Arrow, CSV : lecture par morceaux).
+
+    Raises:
+        FileNotFoundError: si ni <name>/, ni <name>.parquet, ni <name>.csv n'existe
+    """
+    path = dataset_path(name, data_dir)
+    if path is None:
+        raise FileNotFoundError(f"Dataset introuvable: {name} (.parquet / .csv)")
+
+    for file in _dataset_files(path):
+        if file.suffix == '.parquet':
+            import pyarrow.parquet as pq
+
+            parquet_file = pq.ParquetFile(file)
+            for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+                yield batch.to_pandas()
+        else:
+            yield from pd.read_csv(file, usecols=columns, chunksize=batch_size, float_precision='round_trip')
+
+
+def _dataset_files(path: Path) -> list:
+    """Fichiers d'un dataset (shards dans l'ordre du manifeste)"""
+    if not path.is_dir():
+        return [path]
+    with open(path / MANIFEST_NAME, encoding='utf-8') as f:
+        manifest = json.load(f)
+    return [path / shard['file'] for shard in manifest['shards']]
+
+
+def _read_file(path: Path, columns: list, filters: list) -> pd.DataFrame:
+    """Lit un fichier Parquet ou CSV avec projection et filtres"""
+    if path.suffix == '.parquet':
+        return pd.read_parquet(path, columns=columns, filters=filters or None)
+
+    # CSV : seules les colonnes utiles sont parsées, filtres appliqués ensuite ;
+    # flottants relus à l'identique (round_trip) : mêmes lignes qu'en Parquet
+    filter_columns = [column for column, _, _ in filters]
+    usecols = None if columns is None else list(dict.fromkeys(columns + filter_columns))
+    df = pd.read_csv(path, usecols=usecols, float_precision='round_trip')
+    for column, op, value in filters:
+        df = df[FILTER_OPERATORS[op](df[column], value)]
+    if columns is not None:
+        df = df[columns]
+    return df.reset_index(drop=True)
@@ -0,0 +1,194 @@
+"""
+Règles de risque de maladies - tables déclaratives compilées en masques NumPy
+Permet d'évaluer des grilles météo entières (fermes x jours) en un passage
+"""
+import json
+import operator
+from pathlib import Path
+import logging
+
+import numpy as np
+
+from .artifacts import write_atomic
+
+logger = logging.getLogger(__name__)
+
+
+# Variables météo utilisables dans les conditions
+VARIABLES = ['temperature', 'humidity', 'rainfall']
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+}
+
+# Table par défaut
+# - risk_levels : évalués dans l'ordre, le premier qui correspond l'emporte
+# - threats : chaque règle qui correspond ajoute ses menaces
+# - crops : surcharges par culture ('risk_levels' remplace, 'threats' s'ajoute)
+# Une condition est [variable, opérateur, seuil]
+# Équivalente aux anciennes règles if/else : aucune surcharge par culture.
+# Exemple de surcharge à ajouter dans disease_rules.json :
+#     'crops': {'Riz': {'threats': [
+#         {'when': [['temperature', '>=', 24], ['humidity', '>', 85]], 'threats': ['Pyriculariose']},
+#     ]}}
+DEFAULT_RULE_TABLE = {
+    'version': 1,
+    'risk_levels': [
+        {'level': 'Élevé', 'score': 0.8,
+         'when': [['temperature', '>', 25], ['humidity', '>', 75]]},
+        {'level': 'Modéré', 'score': 0.5,
+         'when': [['temperature', '>', 23], ['humidity', '>', 65]]},
+    ],
+    'default_level': {'level': 'Faible', 'score': 0.2},
+    'threats': [
+        {'when': [['temperature', '>', 25], ['humidity', '>', 70]],
+         'threats': ['Mildiou - risque élevé', 'Pourriture fongique']},
+        {'when': [['temperature', '>', 28]],
+         'threats': ['Chenille légionnaire', 'Pucerons']},
+    ],
+    'default_threats': ['Conditions généralement favorables'],
+    'prevention': {
+        'Élevé': [
+            'Traitement fongicide préventif',
+            'Surveillance quotidienne',
+            'Améliorer la circulation d\'air',
+            'Réduire l\'irrigation si possible'
+        ],
+        'Modéré': [
+            'Surveillance régulière',
+            'Traitement si symptômes',
+            'Bonnes pratiques culturales'
+        ],
+        'Faible': [
+            'Surveillance normale',
+            'Maintenir bonnes pratiques'
+        ],
+    },
+    'crops': {},
+}
+
+
+def _compile_conditions(conditions: list) -> list:
+    """Valide et compile une liste de conditions en (index, opérateur, seuil)"""
+    compiled = []
+    for variable, op, threshold in conditions:
+        if variable not in VARIABLES:
+            raise ValueError(f"Variable inconnue: {variable}")
+        if op not in OPERATORS:
+            raise ValueError(f"Opérateur inconnu: {op}")
+        compiled.append((VARIABLES.index(variable), OPERATORS[op], float(threshold)))
+    return compiled
+
+
+def _evaluate_conditions(compiled: list, values: np.ndarray) -> np.ndarray:
+    """Masque booléen des lignes satisfaisant toutes les conditions"""
+    mask = np.ones(values.shape[1], dtype=bool)
+    for index, op, threshold in compiled:
+        mask &= op(values[index], threshold)
+    return mask
+
+
+class CompiledRuleTable:
+    """
+    Table de règles compilée
+
+    Les conditions sont pré-résolues en (variable, opérateur, seuil) et
+    évaluées comme masques NumPy sur des tableaux de conditions météo.
+    """
+
+    def __init__(self, table: dict):
+        self.version = table.get('version', 0)
+        self.default_level = table['default_level']
+        self.default_threats = list(table['default_threats'])
+        self.prevention = table['prevention']
+
+        # Niveaux de risque : index 0 = niveau par défaut
+        self.levels = [self.default_level['level']]
+        self._default_rules = self._compile_crop(table, {})
+        self._crop_rules = {
+            crop: self._compile_crop(table, overrides)
+            for crop, overrides in table.get('crops', {}).items()
+        }
+
+        for level in self.levels:
+            if level not in self.prevention:
+                raise ValueError(f"Mesures de prévention manquantes pour: {level}")
+
+    def _level_index(self, level: str) -> int:
+        if level not in self.levels:
+            self.levels.append(level)
+        return self.levels.index(level)
+
+    def _compile_crop(self, table: dict, overrides: dict) -> dict:
+        """Compile les règles d'une culture (défaut + surcharges)"""
+        risk_levels = overrides.get('risk_levels', table['risk_levels'])
+        threats = table['threats'] + overrides.get('threats', [])
+        return {
+            'risk_levels': [
+                (self._level_index(rule['level']), float(rule['score']),
+                 _compile_conditions(rule['when']))
+                for rule in risk_levels
+            ],
+            'threats': [
+                (_compile_conditions(rule['when']), list(rule['threats']))
+                for rule in threats
+            ],
+        }
+
+    def evaluate(self, crop: str, values: np.ndarray) -> dict:
+        """
+        Évalue les règles d'une culture
+
+        Args:
+            crop: nom de la culture
+            values: tableau (len(VARIABLES), n) de conditions météo
+
+        Returns:
+            {'level_index': (n,), 'risk_score': (n,), 'threat_masks': [(n,), ...],
+             'threat_lists': [[str], ...]}
+        """
+        rules = self._crop_rules.get(crop, self._default_rules)
+        n = values.shape[1]
+
+        level_index = np.zeros(n, dtype=np.int8)
+        risk_score = np.full(n, float(self.default_level['score']))
+        assigned = np.zeros(n, dtype=bool)
+
+        for index, score, compiled in rules['risk_levels']:
+            mask = _evaluate_conditions(compiled, values) & ~assigned
+            level_index[mask] = index
+            risk_score[mask] = score
+            assigned |= mask
+
+        return {
+            'level_index': level_index,
+            'risk_score': risk_score,
+            'threat_masks': [_evaluate_conditions(compiled, values) for compiled, _ in rules['threats']],
+            'threat_lists': [threats for _, threats in rules['threats']],
+        }
+
+
+def load_rule_table(path: Path) -> dict:
+    """Lit une table de règles JSON"""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_rule_table(table: dict, path: Path):
+    """
+    Écrit une table de règles de façon atomique
+
+    La table est validée (compilée) avant écriture ; les workers ne
+    voient jamais un fichier partiellement écrit.
+    """
+    CompiledRuleTable(table)
+    path = Path(path)
+
+    def write(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(table, f, indent=2, ensure_ascii=False)
+    write_atomic(path, write)
+    logger.info(f"Table de règles v{table.get('version')} écrite: {path}")
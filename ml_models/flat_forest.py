@@ -0,0 +1,311 @@
+"""
+Moteur d'inférence pour forêts aléatoires aplaties
+Exporte les arbres scikit-learn dans des tableaux NumPy contigus
+(feature, seuil, enfants, valeur) et les évalue sans passer par sklearn
+"""
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Version du format compact sur disque
+COMPACT_FORMAT_VERSION = 1
+
+ARRAY_NAMES = ['feature', 'threshold', 'left', 'right', 'value', 'roots']
+
+
+class FlatForest:
+    """
+    Forêt aléatoire sous forme de tableaux plats
+
+    Tous les noeuds de tous les arbres sont concaténés ; roots donne le
+    premier noeud de chaque arbre et les indices d'enfants sont locaux à
+    l'arbre (ce qui permet de les stocker en int16). Les feuilles
+    bouclent sur elles-mêmes (gauche = droite = soi), ce qui permet de
+    descendre tous les arbres pour toutes les lignes en max_depth
+    itérations vectorisées, sans branchement par arbre.
+
+    La normalisation (StandardScaler) peut être intégrée pour éviter
+    un second appel sklearn.
+
+    Les valeurs des feuilles peuvent être quantifiées (uint8 / float16) :
+    valeur réelle = value * value_scale, à tolerance près.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth,
+                 classes=None, scaler_mean=None, scaler_scale=None,
+                 value_scale=1.0, tolerance=0.0):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.classes_ = classes
+        self.scaler_mean = scaler_mean
+        self.scaler_scale = scaler_scale
+        self.value_scale = float(value_scale)
+        self.tolerance = float(tolerance)
+
+    @property
+    def is_classifier(self) -> bool:
+        return self.classes_ is not None
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @classmethod
+    def from_sklearn(cls, forest, scaler=None) -> 'FlatForest':
+        """
+        Exporte une RandomForestClassifier/Regressor entraînée
+
+        Args:
+            forest: forêt scikit-learn entraînée
+            scaler: StandardScaler appliqué avant la forêt (optionnel)
+        """
+        classes = getattr(forest, 'classes_', None)
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(n_nodes)
+            is_leaf = tree.children_left == -1
+
+            feature = np.where(is_leaf, 0, tree.feature)
+            left = np.where(is_leaf, node_ids, tree.children_left)
+            right = np.where(is_leaf, node_ids, tree.children_right)
+
+            value = tree.value[:, 0, :].astype(np.float64)
+            if classes is not None:
+                # Probabilités par feuille (comme DecisionTreeClassifier.predict_proba)
+                totals = value.sum(axis=1, keepdims=True)
+                totals[totals == 0] = 1
+                value = value / totals
+
+            features.append(feature)
+            thresholds.append(tree.threshold)
+            lefts.append(left)
+            rights.append(right)
+            values.append(value)
+            roots.append(offset)
+
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            feature=np.ascontiguousarray(np.concatenate(features), dtype=np.int32),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64),
+            left=np.ascontiguousarray(np.concatenate(lefts), dtype=np.int32),
+            right=np.ascontiguousarray(np.concatenate(rights), dtype=np.int32),
+            value=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.array(roots, dtype=np.int32),
+            max_depth=max_depth,
+            classes=None if classes is None else np.asarray(classes),
+            scaler_mean=None if scaler is None else np.asarray(scaler.mean_, dtype=np.float64),
+            scaler_scale=None if scaler is None else np.asarray(scaler.scale_, dtype=np.float64),
+        )
+
+    def _prepare(self, X) -> np.ndarray:
+        """Normalise (si scaler intégré) puis convertit en float32 comme sklearn"""
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        if self.scaler_mean is not None:
+            X = (X - self.scaler_mean) / self.scaler_scale
+        return X.astype(np.float32)
+
+    def apply(self, X) -> np.ndarray:
+        """Indices (globaux) des feuilles atteintes : (n_arbres, n_lignes)"""
+        X = self._prepare(X)
+        rows = np.arange(X.shape[0])[None, :]
+        offsets = self.roots[:, None].astype(np.int64)
+        node = np.repeat(offsets, X.shape[0], axis=1)
+
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = offsets + np.where(go_left, self.left[node], self.right[node])
+
+        return node
+
+    def predict_per_tree(self, X) -> np.ndarray:
+        """Valeurs de chaque arbre : (n_arbres, n_lignes, n_valeurs)"""
+        values = self.value[self.apply(X)].astype(np.float64)
+        if self.value_scale != 1.0:
+            values *= self.value_scale
+        return values
+
+    def predict_proba(self, X) -> np.ndarray:
+        """Probabilités moyennes par classe : (n_lignes, n_classes)"""
+        return self.predict_per_tree(X).mean(axis=0)
+
+    def predict(self, X) -> np.ndarray:
+        """Classe prédite (classification) ou valeur moyenne (régression)"""
+        mean = self.predict_per_tree(X).mean(axis=0)
+        if self.is_classifier:
+            return self.classes_[np.argmax(mean, axis=1)]
+        return mean[:, 0]
+
+    def compact(self) -> 'FlatForest':
+        """
+        Version compacte de la forêt
+
+        - seuils en float32, arrondis vers le bas : comme les entrées sont
+          comparées en float32, x <= seuil64 équivaut à x <= seuil32
+        - enfants en int16 si chaque arbre a moins de 32768 noeuds, sinon int32
+        - features en uint8
+        - feuilles en uint8 (probabilités, pas de 1/255) ou float16 (régression)
+        """
+        threshold = self.threshold.astype(np.float32)
+        above = threshold.astype(np.float64) > self.threshold
+        threshold[above] = np.nextafter(threshold[above], np.float32(-np.inf))
+
+        max_child = max(int(self.left.max()), int(self.right.max()))
+        child_dtype = np.int16 if max_child < np.iinfo(np.int16).max else np.int32
+
+        real_values = self.value * self.value_scale
+        if self.is_classifier:
+            value = np.round(real_values * 255).astype(np.uint8)
+            value_scale = 1 / 255
+        else:
+            value = real_values.astype(np.float16)
+            value_scale = 1.0
+        tolerance = float(np.max(np.abs(value.astype(np.float64) * value_scale - real_values)))
+
+        return FlatForest(
+            feature=self.feature.astype(np.uint8),
+            threshold=threshold,
+            left=self.left.astype(child_dtype),
+            right=self.right.astype(child_dtype),
+            value=value,
+            roots=self.roots.astype(np.int32),
+            max_depth=self.max_depth,
+            classes=self.classes_,
+            scaler_mean=self.scaler_mean,
+            scaler_scale=self.scaler_scale,
+            value_scale=value_scale,
+            tolerance=max(tolerance, self.tolerance),
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """Taille des tableaux de noeuds"""
+        return sum(getattr(self, name).nbytes for name in ARRAY_NAMES)
+
+    def save(self, path, metadata: dict = None):
+        """
+        Écrit la forêt dans un répertoire (un .npy par tableau + meta.json)
+
+        Le répertoire est construit à côté puis renommé, pour qu'un worker
+        ne lise jamais un artefact incomplet.
+        """
+        path = Path(path)
+        tmp_dir = Path(tempfile.mkdtemp(dir=path.parent, prefix=f'.{path.name}.'))
+        try:
+            for name in ARRAY_NAMES:
+                np.save(tmp_dir / f'{name}.npy', np.ascontiguousarray(getattr(self, name)))
+
+            meta = {
+                'format_version': COMPACT_FORMAT_VERSION,
+                'max_depth': self.max_depth,
+                'classes': None if self.classes_ is None else [str(c) for c in self.classes_],
+                'scaler_mean': None if self.scaler_mean is None else self.scaler_mean.tolist(),
+                'scaler_scale': None if self.scaler_scale is None else self.scaler_scale.tolist(),
+                'value_scale': self.value_scale,
+                'tolerance': self.tolerance,
+            }
+            meta.update(metadata or {})
+            with open(tmp_dir / 'meta.json', 'w', encoding='utf-8') as f:
+                json.dump(meta, f, indent=2, ensure_ascii=False)
+
+            old_dir = None
+            if path.exists():
+                old_dir = path.with_name(f'.{path.name}.old-{os.getpid()}')
+                os.replace(path, old_dir)
+            os.replace(tmp_dir, path)
+            if old_dir is not None:
+                shutil.rmtree(old_dir, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        logger.info(f"Forêt compacte écrite: {path} ({self.nbytes / 1024**2:.2f} MB)")
+
+    @classmethod
+    def load(cls, path, mmap_mode: str = 'r') -> 'FlatForest':
+        """
+        Charge une forêt compacte
+
+        Avec mmap_mode='r', les tableaux sont projetés en mémoire : tous les
+        workers partagent les mêmes pages via le cache du système.
+        """
+        path = Path(path)
+        with open(path / 'meta.json', encoding='utf-8') as f:
+            meta = json.load(f)
+
+        if meta.get('format_version') != COMPACT_FORMAT_VERSION:
+            raise ValueError(f"Format compact non supporté: {meta.get('format_version')}")
+
+        arrays = {
+            name: np.load(path / f'{name}.npy', mmap_mode=mmap_mode)
+            for name in ARRAY_NAMES
+        }
+        forest = cls(
+            **arrays,
+            max_depth=meta['max_depth'],
+            classes=None if meta['classes'] is None else np.array(meta['classes'], dtype=object),
+            scaler_mean=None if meta['scaler_mean'] is None else np.array(meta['scaler_mean']),
+            scaler_scale=None if meta['scaler_scale'] is None else np.array(meta['scaler_scale']),
+            value_scale=meta['value_scale'],
+            tolerance=meta['tolerance'],
+        )
+        forest.metadata = meta
+        return forest
+
+
+def verify_parity(forest, flat: FlatForest, X, scaler=None, atol: float = 1e-6) -> float:
+    """
+    Compare les sorties du moteur plat à celles de scikit-learn
+
+    Args:
+        forest: forêt scikit-learn de référence
+        flat: forêt exportée
+        X: lignes brutes (non normalisées si scaler fourni)
+        scaler: StandardScaler appliqué avant la forêt de référence
+
+    Returns:
+        Écart absolu maximal observé
+
+    Raises:
+        ValueError: si l'écart dépasse atol (augmenté de la tolérance
+            de quantification de la forêt)
+    """
+    X = np.asarray(X, dtype=np.float64)
+    X_ref = scaler.transform(X) if scaler is not None else X
+
+    if flat.is_classifier:
+        expected = forest.predict_proba(X_ref)
+        actual = flat.predict_proba(X)
+    else:
+        expected = forest.predict(X_ref)
+        actual = flat.predict(X)
+
+    atol = atol + flat.tolerance
+    max_diff = float(np.max(np.abs(expected - actual))) if len(X) else 0.0
+    if max_diff > atol:
+        raise ValueError(f"Parité sklearn non respectée: écart max {max_diff:.3g} > {atol:.3g}")
+    return max_diff
+
+
+def parity_sample(scaler, n_samples: int = 2000, seed: int = 0) -> np.ndarray:
+    """Lignes de contrôle tirées autour de la distribution d'entraînement"""
+    rng = np.random.default_rng(seed)
+    return rng.normal(scaler.mean_, scaler.scale_ * 1.5, size=(n_samples, len(scaler.mean_)))
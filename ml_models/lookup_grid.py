@@ -0,0 +1,179 @@
+"""
+Grille de recommandation précalculée
+Le CropRecommender est évalué hors ligne sur une grille 4-D dense
+(température, humidité, pluviométrie, pH) ; à la requête, la réponse
+est une simple lecture de tableau (canal USSD/SMS basse latence)
+"""
+import json
+import os
+import shutil
+import tempfile
+from itertools import product
+from pathlib import Path
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Axes de la grille : (min, max, pas), dans l'ordre de CropRecommender.FEATURES
+DEFAULT_AXES = {
+    'temperature': (20.0, 35.0, 0.5),
+    'humidity': (40.0, 90.0, 2.5),
+    'rainfall': (500.0, 2000.0, 50.0),
+    'soil_ph': (5.0, 8.0, 0.1),
+}
+
+# Nombre de cultures conservées par case
+TOP_K = 5
+
+
+def check_axes(axes: dict):
+    """
+    Vérifie les axes (min, max, pas) : au moins deux points par axe et un
+    pas qui divise (max - min), sinon le dernier point de la grille ne
+    tombe pas sur max et la lecture sortirait du tableau
+    """
+    for name, (low, high, step) in axes.items():
+        if step <= 0 or high <= low:
+            raise ValueError(f"Axe {name}: il faut min < max et un pas > 0 ({low}, {high}, {step})")
+        intervals = (high - low) / step
+        if abs(intervals - round(intervals)) > 1e-6:
+            raise ValueError(f"Axe {name}: le pas {step} ne divise pas l'intervalle [{low}, {high}]")
+
+
+class RecommendationGrid:
+    """
+    Probabilités par culture précalculées sur une grille régulière
+
+    probas : uint8 (n_t, n_h, n_r, n_ph, n_classes), pas de 1/255
+    top_classes / top_probas : top-k précalculé par case (lecture O(1))
+    """
+
+    def __init__(self, axes: dict, classes, probas, top_classes, top_probas, model_version: str):
+        self.axes = axes
+        self.classes = np.asarray(classes, dtype=object)
+        self.probas = probas
+        self.top_classes = top_classes
+        self.top_probas = top_probas
+        self.model_version = model_version
+        self.lows = np.array([axis[0] for axis in axes.values()])
+        self.steps = np.array([axis[2] for axis in axes.values()])
+        self.shape = np.array(probas.shape[:-1])
+        # Dernier point de chaque axe (borne réelle de la grille)
+        self.highs = np.round(self.lows + (self.shape - 1) * self.steps, 6)
+
+    @classmethod
+    def build(cls, recommender, axes: dict = None, chunk_size: int = 50000) -> 'RecommendationGrid':
+        """Évalue le recommender sur toute la grille (étape hors ligne)"""
+        axes = axes or DEFAULT_AXES
+        check_axes(axes)
+        points = [
+            np.round(np.arange(low, high + step / 2, step), 6)
+            for low, high, step in axes.values()
+        ]
+        shape = tuple(len(p) for p in points)
+
+        mesh = np.stack(np.meshgrid(*points, indexing='ij'), axis=-1).reshape(-1, len(points))
+        probas = []
+        for start in range(0, len(mesh), chunk_size):
+            chunk_probas, classes = recommender.predict_proba(mesh[start:start + chunk_size])
+            probas.append(chunk_probas)
+        probas = np.concatenate(probas)
+
+        quantized = np.round(probas * 255).astype(np.uint8)
+        top_classes = np.argsort(-probas, axis=1)[:, :TOP_K].astype(np.uint8)
+        top_probas = np.take_along_axis(quantized, top_classes, axis=1)
+
+        n_classes = probas.shape[1]
+        logger.info(f"Grille de recommandation: {len(mesh)} cases x {n_classes} cultures")
+        return cls(
+            axes={name: tuple(axis) for name, axis in axes.items()},
+            classes=classes,
+            probas=quantized.reshape(shape + (n_classes,)),
+            top_classes=top_classes.reshape(shape + (TOP_K,)),
+            top_probas=top_probas.reshape(shape + (TOP_K,)),
+            model_version=recommender.model_version,
+        )
+
+    def contains(self, features) -> bool:
+        """Vrai si le point est dans les bornes de la grille"""
+        features = np.asarray(features, dtype=float)
+        return bool(np.all((features >= self.lows) & (features <= self.highs)))
+
+    def lookup(self, features, interpolate: bool = False, top_k: int = TOP_K):
+        """
+        Top-k [(culture, probabilité), ...] pour un point
+
+        Sans interpolation : case la plus proche (lecture directe).
+        Avec interpolation : moyenne multilinéaire des 16 coins de la case.
+        Retourne None si le point est hors grille.
+        """
+        features = np.asarray(features, dtype=float)
+        if not self.contains(features):
+            return None
+
+        position = (features - self.lows) / self.steps
+
+        if not interpolate:
+            index = tuple(np.clip(np.round(position).astype(int), 0, self.shape - 1))
+            return [
+                (str(self.classes[c]), float(p) / 255)
+                for c, p in zip(self.top_classes[index][:top_k], self.top_probas[index][:top_k])
+            ]
+
+        lower = np.clip(np.floor(position).astype(int), 0, self.shape - 2)
+        # Arrondis flottants au dernier point : poids restreints à la case
+        fraction = np.clip(position - lower, 0, 1)
+        probas = np.zeros(len(self.classes))
+        for corner in product((0, 1), repeat=len(lower)):
+            corner = np.array(corner)
+            weight = np.prod(np.where(corner == 1, fraction, 1 - fraction))
+            if weight:
+                probas += weight * self.probas[tuple(lower + corner)]
+        probas /= 255
+
+        order = np.argsort(-probas)[:top_k]
+        return [(str(self.classes[c]), float(probas[c])) for c in order]
+
+    def save(self, path):
+        """Écrit la grille (un .npy par tableau + meta.json), remplacement atomique"""
+        path = Path(path)
+        tmp_dir = Path(tempfile.mkdtemp(dir=path.parent, prefix=f'.{path.name}.'))
+        try:
+            for name in ('probas', 'top_classes', 'top_probas'):
+                np.save(tmp_dir / f'{name}.npy', getattr(self, name))
+            with open(tmp_dir / 'meta.json', 'w', encoding='utf-8') as f:
+                json.dump({
+                    'axes': self.axes,
+                    'classes': [str(c) for c in self.classes],
+                    'model_version': self.model_version,
+                }, f, indent=2, ensure_ascii=False)
+
+            old_dir = None
+            if path.exists():
+                old_dir = path.with_name(f'.{path.name}.old-{os.getpid()}')
+                os.replace(path, old_dir)
+            os.replace(tmp_dir, path)
+            if old_dir is not None:
+                shutil.rmtree(old_dir, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        logger.info(f"Grille de recommandation écrite: {path} ({self.probas.nbytes / 1024**2:.2f} MB)")
+
+    @classmethod
+    def load(cls, path, mmap_mode: str = 'r') -> 'RecommendationGrid':
+        """Charge une grille (tableaux projetés en mémoire, partagés entre workers)"""
+        path = Path(path)
+        with open(path / 'meta.json', encoding='utf-8') as f:
+            meta = json.load(f)
+        return cls(
+            axes={name: tuple(axis) for name, axis in meta['axes'].items()},
+            classes=meta['classes'],
+            probas=np.load(path / 'probas.npy', mmap_mode=mmap_mode),
+            top_classes=np.load(path / 'top_classes.npy', mmap_mode=mmap_mode),
+            top_probas=np.load(path / 'top_probas.npy', mmap_mode=mmap_mode),
+            model_version=meta['model_version'],
+        )
@@ -7,13 +7,127 @@ import pandas as pd
 from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
 from sklearn.preprocessing import StandardScaler
 import joblib
+import threading
+import time
+from datetime import datetime
 from pathlib import Path
 from django.conf import settings
 import logging
 
+from .artifacts import artifact_paths, current_dir, new_version, publish_lock, publish_version, save_version
+from .disease_rules import CompiledRuleTable, DEFAULT_RULE_TABLE, load_rule_table, write_rule_table
+from .flat_forest import FlatForest, verify_parity, parity_sample
+from .cache import build_prediction_cache
+from .lookup_grid import RecommendationGrid
+
 logger = logging.getLogger(__name__)
 
 
+def build_inference_engine(model, scaler, compact_path: Path):
+    """
+    Construit le moteur d'inférence selon ML_INFERENCE_BACKEND
+    
+    - 'sklearn' : pas de moteur (None), la forêt sklearn est utilisée
+    - 'flat' : forêt aplatie en mémoire
+    - 'compact' : forêt quantifiée écrite dans compact_path puis relue
+      en mmap (une seule copie partagée par tous les workers)
+    
+    Le moteur n'est utilisé que s'il reproduit les sorties de sklearn
+    sur un échantillon de contrôle ; sinon on reste sur sklearn (None).
+    """
+    backend = settings.ML_INFERENCE_BACKEND
+    if backend not in ('flat', 'compact'):
+        return None
+    
+    try:
+        engine = FlatForest.from_sklearn(model, scaler)
+        if backend == 'compact':
+            engine = engine.compact()
+        verify_parity(model, engine, parity_sample(scaler), scaler=scaler)
+        
+        if backend == 'compact':
+            engine.save(compact_path, metadata={'source_mtime_ns': _source_mtime(compact_path)})
+            engine = FlatForest.load(compact_path, mmap_mode='r')
+        return engine
+    except Exception as e:
+        logger.error(f"Moteur {backend} indisponible, utilisation de sklearn: {e}")
+        return None
+
+
+def _source_mtime(compact_path: Path):
+    """mtime du pickle d'origine d'un artefact compact (xxx.compact -> xxx.pkl)"""
+    source = compact_path.with_suffix('.pkl')
+    return source.stat().st_mtime_ns if source.exists() else None
+
+
+def artifact_version(*paths: Path) -> str:
+    """Identifiant de version d'un modèle : mtime/taille du premier artefact existant"""
+    for path in paths:
+        if path.exists():
+            stat = path.stat()
+            return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+    return 'none'
+
+
+def publish_synthetic(name: str, model, scaler, n_samples: int) -> Path:
+    """Sauvegarde et publie un modèle entraîné sur données synthétiques"""
+    version = new_version(name)
+    version_dir = save_version(name, version, model, scaler, {
+        'model': name,
+        'version': version,
+        'created_at': datetime.now().isoformat(),
+        'dataset': {'name': 'synthetic', 'rows': n_samples},
+        'params': model.get_params(),
+    })
+    publish_version(name, version)
+    return version_dir
+
+
+def create_once(name: str, predictor):
+    """
+    Entraîne et publie un modèle synthétique, sauf si un autre processus
+    l'a publié entre-temps : il est alors simplement chargé
+    
+    Sur un ML_MODELS_DIR vide, les workers gunicorn démarrent ensemble :
+    sous publish_lock, le premier entraîne et publie, les suivants
+    trouvent sa version au lieu de basculer CURRENT chacun leur tour.
+    """
+    with publish_lock(name):
+        version_dir = current_dir(name)
+        if version_dir is None:
+            predictor._create_and_train_model()
+            return
+    
+    predictor.version_dir = version_dir
+    predictor.model_path, predictor.scaler_path, predictor.compact_path = artifact_paths(name, version_dir)
+    predictor.model = joblib.load(predictor.model_path)
+    predictor.scaler = joblib.load(predictor.scaler_path)
+    logger.info(f"{name}: version {version_dir.name} publiée par un autre processus, chargée")
+
+
+def load_compact_engine(compact_path: Path):
+    """
+    Charge directement l'artefact compact (backend 'compact'), sans joblib
+    
+    Retourne None si le backend n'est pas actif, si l'artefact est absent
+    ou s'il est plus ancien que le pickle dont il est issu.
+    """
+    if settings.ML_INFERENCE_BACKEND != 'compact' or not compact_path.exists():
+        return None
+    
+    try:
+        engine = FlatForest.load(compact_path, mmap_mode='r')
+        source_mtime = _source_mtime(compact_path)
+        if source_mtime is not None and engine.metadata.get('source_mtime_ns') != source_mtime:
+            logger.info(f"Artefact compact obsolète: {compact_path}")
+            return None
+        logger.info(f"Artefact compact chargé (mmap): {compact_path}")
+        return engine
+    except Exception as e:
+        logger.error(f"Erreur chargement artefact compact: {e}")
+        return None
+
+
 class CropRecommender:
     """
     Système de recommandation de cultures basé sur:
@@ -22,12 +136,29 @@ class CropRecommender:
     - Localisation
     """
     
+    # Ordre des features attendu par le modèle
+    FEATURES = ['temperature', 'humidity', 'rainfall', 'soil_ph']
+    
     def __init__(self):
-        self.model_path = settings.ML_MODELS_DIR / 'crop_recommender.pkl'
-        self.scaler_path = settings.ML_MODELS_DIR / 'crop_scaler.pkl'
+        # Version publiée (versions/crop_recommender/CURRENT), à défaut pickles non versionnés
+        self.version_dir = current_dir('crop_recommender')
+        self.model_path, self.scaler_path, self.compact_path = artifact_paths('crop_recommender', self.version_dir)
         self.model = None
         self.scaler = None
-        self._load_or_create_model()
+        
+        # Backend 'compact' : la forêt sklearn n'est pas chargée du tout
+        self.engine = load_compact_engine(self.compact_path)
+        if self.engine is None:
+            self._load_or_create_model()
+            if self.engine is None:
+                self.engine = build_inference_engine(self.model, self.scaler, self.compact_path)
+        
+        self.model_version = self.version_dir.name if self.version_dir else artifact_version(self.model_path, self.compact_path)
+        self.cache = build_prediction_cache('crop_recommender', self.FEATURES)
+        
+        # Grille précalculée pour les réponses basse latence
+        self.grid_path = (self.version_dir or settings.ML_MODELS_DIR) / 'crop_grid'
+        self.grid = self._load_grid()
     
     def _load_or_create_model(self):
         """Charge le modèle existant ou en crée un nouveau"""
@@ -37,47 +168,57 @@ class CropRecommender:
                 self.scaler = joblib.load(self.scaler_path)
                 logger.info("Modèle de recommandation chargé")
             else:
-                self._create_and_train_model()
+                create_once('crop_recommender', self)
         except Exception as e:
             logger.error(f"Erreur chargement modèle: {e}")
-            self._create_and_train_model()
+            if self.version_dir is not None:
+                # Version publiée illisible : pas de remplacement automatique
+                # (le registre garde la version précédente, retour arrière
+                # avec train_models.py --publish)
+                raise
+            create_once('crop_recommender', self)
     
-    def _create_and_train_model(self):
+    @staticmethod
+    def generate_training_data(n_samples: int = 10000, seed: int = 42):
+        """
+        Génère un jeu d'entraînement synthétique (X, y)
+        
+        Entièrement vectorisé : les règles de recommandation sont
+        appliquées comme masques sur tout l'échantillon.
+        """
+        crops = np.array(['Maïs', 'Riz', 'Manioc', 'Tomate', 'Oignon', 'Coton', 'Arachide', 'Soja'])
+        rng = np.random.default_rng(seed)
+        
+        temp = rng.uniform(20, 35, n_samples)
+        humidity = rng.uniform(40, 90, n_samples)
+        rainfall = rng.uniform(500, 2000, n_samples)
+        ph = rng.uniform(5.0, 8.0, n_samples)
+        
+        # Règles simples pour recommandation (la première qui s'applique l'emporte)
+        y = np.select(
+            [
+                (temp > 28) & (rainfall > 1200),
+                (temp < 25) & (ph < 6.5),
+                rainfall < 800,
+            ],
+            [
+                np.where(humidity > 70, 'Riz', 'Maïs'),
+                np.where(rainfall < 1000, 'Tomate', 'Manioc'),
+                np.where(temp > 27, 'Arachide', 'Sorgho'),
+            ],
+            default=crops[rng.integers(0, len(crops), n_samples)]
+        )
+        
+        X = np.column_stack([temp, humidity, rainfall, ph])
+        return X, y
+    
+    def _create_and_train_model(self, n_samples: int = None):
         """Crée et entraîne un nouveau modèle"""
         logger.info("Création d'un nouveau modèle de recommandation...")
         
         # Données d'entraînement simulées
         # En production, utiliser les données scrappées
-        crops = ['Maïs', 'Riz', 'Manioc', 'Tomate', 'Oignon', 'Coton', 'Arachide', 'Soja']
-        
-        # Générer données synthétiques
-        np.random.seed(42)
-        n_samples = 10000
-        
-        X_data = []
-        y_data = []
-        
-        for _ in range(n_samples):
-            temp = np.random.uniform(20, 35)
-            humidity = np.random.uniform(40, 90)
-            rainfall = np.random.uniform(500, 2000)
-            ph = np.random.uniform(5.0, 8.0)
-            
-            # Règles simples pour recommandation
-            if temp > 28 and rainfall > 1200:
-                crop = 'Riz' if humidity > 70 else 'Maïs'
-            elif temp < 25 and ph < 6.5:
-                crop = 'Tomate' if rainfall < 1000 else 'Manioc'
-            elif rainfall < 800:
-                crop = 'Arachide' if temp > 27 else 'Sorgho'
-            else:
-                crop = np.random.choice(crops)
-            
-            X_data.append([temp, humidity, rainfall, ph])
-            y_data.append(crop)
-        
-        X = np.array(X_data)
-        y = np.array(y_data)
+        X, y = self.generate_training_data(n_samples or settings.ML_SYNTHETIC_SAMPLES)
         
         # Scaler
         self.scaler = StandardScaler()
@@ -91,9 +232,15 @@ class CropRecommender:
         )
         self.model.fit(X_scaled, y)
         
-        # Sauvegarder
-        joblib.dump(self.model, self.model_path)
-        joblib.dump(self.scaler, self.scaler_path)
+        # Sauvegarder dans une nouvelle version et la publier
+        self.version_dir = publish_synthetic('crop_recommender', self.model, self.scaler, len(y))
+        self.model_path, self.scaler_path, self.compact_path = artifact_paths('crop_recommender', self.version_dir)
+        self.model_version = self.version_dir.name
+        self.grid_path = self.version_dir / 'crop_grid'
+        
+        # Le moteur et la grille de l'ancien modèle ne doivent plus servir
+        self.engine = build_inference_engine(self.model, self.scaler, self.compact_path)
+        self.grid = None
         
         logger.info(f"Modèle entraîné et sauvegardé: {self.model_path}")
     
@@ -115,44 +262,141 @@ class CropRecommender:
             Liste de recommandations triées par confiance
         """
         try:
-            # Préparer les features
-            features = np.array([[
-                input_data['temperature'],
-                input_data['humidity'],
-                input_data['rainfall'],
-                input_data['soil_ph']
-            ]])
-            
-            # Normaliser
-            features_scaled = self.scaler.transform(features)
-            
-            # Prédire
-            probas = self.model.predict_proba(features_scaled)[0]
-            classes = self.model.classes_
+            features = self._features([input_data])
             
-            # Trier par probabilité
-            indices = np.argsort(probas)[::-1]
-            
-            # Top 5 recommandations
-            recommendations = []
-            for idx in indices[:5]:
-                crop_name = classes[idx]
-                confidence = float(probas[idx])
-                
-                if confidence > 0.05:  # Seuil minimum
-                    recommendations.append({
-                        'crop': crop_name,
-                        'confidence': round(confidence * 100, 2),
-                        'reasons': self._get_reasons(crop_name, input_data),
-                        'best_practices': self._get_best_practices(crop_name)
-                    })
+            if self.cache is not None:
+                ranked = self.cache.get_or_compute(
+                    features[0], self.model_version,
+                    lambda: self._rank(features)[0]
+                )
+            else:
+                ranked = self._rank(features)[0]
             
-            return recommendations
+            return self._format(input_data, ranked)
             
         except Exception as e:
             logger.error(f"Erreur prédiction: {e}")
             return []
     
+    def recommend_many(self, rows: list, top_k: int = 5, details: bool = True) -> list:
+        """
+        Recommande des cultures pour plusieurs parcelles en un seul appel
+        
+        Args:
+            rows: liste de dictionnaires au format de recommend()
+            top_k: nombre maximum de cultures par parcelle
+            details: inclure raisons et bonnes pratiques
+        
+        Returns:
+            Une liste de recommandations par ligne (même ordre que rows)
+        """
+        if not rows:
+            return []
+        
+        ranked = self._rank(self._features(rows), top_k)
+        return [
+            self._format(row, row_ranked, details)
+            for row, row_ranked in zip(rows, ranked)
+        ]
+    
+    def _features(self, rows: list) -> np.ndarray:
+        """Matrice des features (une ligne par parcelle)"""
+        return np.array([
+            [float(row[name]) for name in self.FEATURES]
+            for row in rows
+        ])
+    
+    def predict_proba(self, features: np.ndarray):
+        """Probabilités brutes par culture : (probas (n, n_classes), classes)"""
+        # Normaliser et prédire en un seul appel vectorisé
+        if self.engine is not None:
+            return self.engine.predict_proba(features), self.engine.classes_
+        features_scaled = self.scaler.transform(features)
+        return self.model.predict_proba(features_scaled), self.model.classes_
+    
+    def _rank(self, features: np.ndarray, top_k: int = 5) -> list:
+        """
+        Sortie du modèle : [(culture, probabilité), ...] par ligne,
+        trié par probabilité décroissante, au-dessus du seuil minimum
+        """
+        probas, classes = self.predict_proba(features)
+        
+        # Top-k par ligne, trié par probabilité décroissante
+        top_indices = np.argsort(-probas, axis=1)[:, :top_k]
+        top_probas = np.take_along_axis(probas, top_indices, axis=1)
+        
+        return [
+            [
+                (str(classes[idx]), float(confidence))
+                for idx, confidence in zip(indices, row_probas)
+                if confidence > 0.05  # Seuil minimum
+            ]
+            for indices, row_probas in zip(top_indices, top_probas)
+        ]
+    
+    def recommend_fast(self, input_data: dict, interpolate: bool = False) -> dict:
+        """
+        Recommandation basse latence (canal USSD/SMS)
+        
+        Lecture dans la grille précalculée (avec interpolation optionnelle) ;
+        le modèle n'est appelé que pour les entrées hors grille.
+        
+        Returns:
+            {'recommendations': [...], 'source': 'grid' | 'model'}
+        """
+        features = self._features([input_data])
+        
+        ranked = None
+        if self.grid is not None:
+            ranked = self.grid.lookup(features[0], interpolate=interpolate)
+        
+        if ranked is None:
+            source = 'model'
+            ranked = self._rank(features)[0]
+        else:
+            source = 'grid'
+            ranked = [(crop, proba) for crop, proba in ranked if proba > 0.05]
+        
+        return {
+            'recommendations': self._format(input_data, ranked, details=False),
+            'source': source
+        }
+    
+    def _load_grid(self):
+        """Charge la grille précalculée si elle correspond à la version du modèle"""
+        if not self.grid_path.exists():
+            return None
+        try:
+            grid = RecommendationGrid.load(self.grid_path)
+            if grid.model_version != self.model_version:
+                logger.info("Grille de recommandation obsolète, ignorée")
+                return None
+            return grid
+        except Exception as e:
+            logger.error(f"Erreur chargement grille de recommandation: {e}")
+            return None
+    
+    def build_grid(self, axes: dict = None) -> RecommendationGrid:
+        """Étape hors ligne : évalue le modèle sur toute la grille et l'enregistre"""
+        grid = RecommendationGrid.build(self, axes)
+        grid.save(self.grid_path)
+        self.grid = grid
+        return grid
+    
+    def _format(self, input_data: dict, ranked: list, details: bool = True) -> list:
+        """Construit les recommandations à partir de la sortie du modèle"""
+        recommendations = []
+        for crop_name, confidence in ranked:
+            recommendation = {
+                'crop': crop_name,
+                'confidence': round(confidence * 100, 2),
+            }
+            if details:
+                recommendation['reasons'] = self._get_reasons(crop_name, input_data)
+                recommendation['best_practices'] = self._get_best_practices(crop_name)
+            recommendations.append(recommendation)
+        return recommendations
+    
     def _get_reasons(self, crop: str, input_data: dict) -> list:
         """Génère les raisons de la recommandation"""
         reasons = []
@@ -232,12 +476,25 @@ class YieldPredictor:
     Prédicteur de rendement de cultures
     """
     
+    # Ordre des features attendu par le modèle
+    FEATURES = ['area_hectares', 'temperature', 'rainfall', 'soil_ph', 'fertilizer_npk', 'irrigation']
+    
     def __init__(self):
-        self.model_path = settings.ML_MODELS_DIR / 'yield_predictor.pkl'
-        self.scaler_path = settings.ML_MODELS_DIR / 'yield_scaler.pkl'
+        # Version publiée (versions/yield_predictor/CURRENT), à défaut pickles non versionnés
+        self.version_dir = current_dir('yield_predictor')
+        self.model_path, self.scaler_path, self.compact_path = artifact_paths('yield_predictor', self.version_dir)
         self.model = None
         self.scaler = None
-        self._load_or_create_model()
+        
+        # Backend 'compact' : la forêt sklearn n'est pas chargée du tout
+        self.engine = load_compact_engine(self.compact_path)
+        if self.engine is None:
+            self._load_or_create_model()
+            if self.engine is None:
+                self.engine = build_inference_engine(self.model, self.scaler, self.compact_path)
+        
+        self.model_version = self.version_dir.name if self.version_dir else artifact_version(self.model_path, self.compact_path)
+        self.cache = build_prediction_cache('yield_predictor', self.FEATURES)
     
     def _load_or_create_model(self):
         """Charge ou crée le modèle"""
@@ -247,47 +504,55 @@ class YieldPredictor:
                 self.scaler = joblib.load(self.scaler_path)
                 logger.info("Modèle de rendement chargé")
             else:
-                self._create_and_train_model()
+                create_once('yield_predictor', self)
         except Exception as e:
             logger.error(f"Erreur chargement modèle rendement: {e}")
-            self._create_and_train_model()
+            if self.version_dir is not None:
+                # Version publiée illisible : pas de remplacement automatique
+                # (le registre garde la version précédente, retour arrière
+                # avec train_models.py --publish)
+                raise
+            create_once('yield_predictor', self)
     
-    def _create_and_train_model(self):
+    @staticmethod
+    def generate_training_data(n_samples: int = 10000, seed: int = 42):
+        """
+        Génère un jeu d'entraînement synthétique (X, y)
+        
+        La formule de rendement est évaluée en une fois sur des vecteurs
+        (facteurs multiplicatifs diffusés sur tout l'échantillon).
+        """
+        rng = np.random.default_rng(seed)
+        
+        area = rng.uniform(0.5, 20, n_samples)
+        temp = rng.uniform(20, 35, n_samples)
+        rainfall = rng.uniform(500, 2000, n_samples)
+        ph = rng.uniform(5.0, 8.0, n_samples)
+        npk = rng.uniform(0, 400, n_samples)
+        irrigation = rng.integers(0, 2, n_samples)
+        
+        # Formule de rendement simulée
+        base_yield = 2000
+        temp_factor = 1 + 0.3 * np.exp(-(temp - 27)**2 / 20)
+        rain_factor = np.minimum(rainfall / 1000, 1.5)
+        ph_factor = 1 + 0.2 * np.exp(-(ph - 6.5)**2 / 2)
+        npk_factor = 1 + npk / 1000
+        irrigation_factor = np.where(irrigation == 1, 1.3, 1.0)
+        
+        yield_val = (base_yield * temp_factor * rain_factor *
+                     ph_factor * npk_factor * irrigation_factor)
+        yield_val += rng.normal(0, 200, n_samples)  # Bruit
+        
+        X = np.column_stack([area, temp, rainfall, ph, npk, irrigation])
+        y = np.maximum(yield_val, 500)  # Minimum 500 kg/ha
+        return X, y
+    
+    def _create_and_train_model(self, n_samples: int = None):
         """Crée et entraîne le modèle de rendement"""
         logger.info("Création modèle de rendement...")
         
         # Données synthétiques
-        np.random.seed(42)
-        n_samples = 10000
-        
-        X_data = []
-        y_data = []
-        
-        for _ in range(n_samples):
-            area = np.random.uniform(0.5, 20)
-            temp = np.random.uniform(20, 35)
-            rainfall = np.random.uniform(500, 2000)
-            ph = np.random.uniform(5.0, 8.0)
-            npk = np.random.uniform(0, 400)
-            irrigation = np.random.choice([0, 1])
-            
-            # Formule de rendement simulée
-            base_yield = 2000
-            temp_factor = 1 + 0.3 * np.exp(-(temp - 27)**2 / 20)
-            rain_factor = min(rainfall / 1000, 1.5)
-            ph_factor = 1 + 0.2 * np.exp(-(ph - 6.5)**2 / 2)
-            npk_factor = 1 + npk / 1000
-            irrigation_factor = 1.3 if irrigation else 1.0
-            
-            yield_val = (base_yield * temp_factor * rain_factor * 
-                        ph_factor * npk_factor * irrigation_factor)
-            yield_val += np.random.normal(0, 200)  # Bruit
-            
-            X_data.append([area, temp, rainfall, ph, npk, irrigation])
-            y_data.append(max(yield_val, 500))  # Minimum 500 kg/ha
-        
-        X = np.array(X_data)
-        y = np.array(y_data)
+        X, y = self.generate_training_data(n_samples or settings.ML_SYNTHETIC_SAMPLES)
         
         # Scaler
         self.scaler = StandardScaler()
@@ -301,9 +566,13 @@ class YieldPredictor:
         )
         self.model.fit(X_scaled, y)
         
-        # Sauvegarder
-        joblib.dump(self.model, self.model_path)
-        joblib.dump(self.scaler, self.scaler_path)
+        # Sauvegarder dans une nouvelle version et la publier
+        self.version_dir = publish_synthetic('yield_predictor', self.model, self.scaler, len(y))
+        self.model_path, self.scaler_path, self.compact_path = artifact_paths('yield_predictor', self.version_dir)
+        self.model_version = self.version_dir.name
+        
+        # Le moteur de l'ancien modèle ne doit plus servir
+        self.engine = build_inference_engine(self.model, self.scaler, self.compact_path)
         
         logger.info(f"Modèle rendement sauvegardé: {self.model_path}")
     
@@ -326,43 +595,18 @@ class YieldPredictor:
             Prédiction avec intervalle de confiance
         """
         try:
-            # Préparer features
-            features = np.array([[
-                input_data['area_hectares'],
-                input_data['temperature'],
-                input_data['rainfall'],
-                input_data['soil_ph'],
-                input_data['fertilizer_npk'],
-                1 if input_data['irrigation'] else 0
-            ]])
-            
-            # Normaliser
-            features_scaled = self.scaler.transform(features)
+            features = self._features([input_data])
             
-            # Prédire
-            yield_per_ha = self.model.predict(features_scaled)[0]
-            total_production = yield_per_ha * input_data['area_hectares']
-            
-            # Intervalle de confiance (estimé)
-            std_dev = 200  # kg/ha
-            confidence_interval = {
-                'lower': max(yield_per_ha - 1.96 * std_dev, 0),
-                'upper': yield_per_ha + 1.96 * std_dev
-            }
+            if self.cache is not None:
+                estimate = self.cache.get_or_compute(
+                    features[0], self.model_version,
+                    lambda: self._estimate(features)[0].tolist()
+                )
+                estimate = np.array([estimate])
+            else:
+                estimate = self._estimate(features)
             
-            # Recommandations
-            recommendations = self._generate_recommendations(
-                yield_per_ha, 
-                input_data
-            )
-            
-            return {
-                'yield_per_ha': round(yield_per_ha, 2),
-                'total_production_kg': round(total_production, 2),
-                'confidence_interval': confidence_interval,
-                'confidence': 0.85,  # Score de confiance
-                'recommendations': recommendations
-            }
+            return self._format(features, estimate)[0]
             
         except Exception as e:
             logger.error(f"Erreur prédiction rendement: {e}")
@@ -372,74 +616,196 @@ class YieldPredictor:
                 'error': str(e)
             }
     
-    def _generate_recommendations(self, predicted_yield: float, input_data: dict) -> list:
-        """Génère des recommandations d'amélioration"""
-        recommendations = []
+    def predict_many(self, rows: list) -> list:
+        """
+        Prédit le rendement de plusieurs parcelles en un seul passage
         
-        # Analyse de la fertilisation
-        if input_data['fertilizer_npk'] < 200:
-            recommendations.append({
-                'category': 'Fertilisation',
-                'recommendation': 'Augmenter l\'apport NPK à 200-300 kg/ha',
-                'impact': '+15-20% de rendement'
-            })
-        
-        # Analyse de l'irrigation
-        if not input_data['irrigation'] and input_data['rainfall'] < 1000:
-            recommendations.append({
-                'category': 'Irrigation',
-                'recommendation': 'Installer système d\'irrigation',
-                'impact': '+25-30% de rendement'
-            })
-        
-        # Analyse du pH
-        if input_data['soil_ph'] < 5.5 or input_data['soil_ph'] > 7.5:
-            recommendations.append({
-                'category': 'pH du sol',
-                'recommendation': 'Corriger le pH avec chaulage/gypse',
-                'impact': '+10-15% de rendement'
-            })
-        
-        # Rendement général
-        if predicted_yield < 2000:
-            recommendations.append({
-                'category': 'Pratiques générales',
-                'recommendation': 'Améliorer les pratiques culturales',
-                'impact': 'Potentiel d\'amélioration significatif'
-            })
+        L'intervalle de confiance de chaque ligne est tiré de la dispersion
+        des prédictions des arbres de la forêt (percentiles 2.5 / 97.5).
         
-        return recommendations
+        Args:
+            rows: liste de dictionnaires au format de predict()
+        
+        Returns:
+            Une prédiction par ligne (même ordre que rows)
+        """
+        if not rows:
+            return []
+        
+        features = self._features(rows)
+        return self._format(features, self._estimate(features))
+    
+    def _features(self, rows: list) -> np.ndarray:
+        """Matrice brute des features (une ligne par parcelle)"""
+        return np.array([
+            [
+                float(row['area_hectares']),
+                float(row['temperature']),
+                float(row['rainfall']),
+                float(row['soil_ph']),
+                float(row.get('fertilizer_npk') or 0),
+                1.0 if row.get('irrigation') else 0.0
+            ]
+            for row in rows
+        ])
+    
+    def _estimate(self, features: np.ndarray) -> np.ndarray:
+        """
+        Sortie du modèle : (n_lignes, 3) = rendement moyen, borne basse,
+        borne haute (kg/ha)
+        """
+        # Prédictions par arbre : (n_arbres, n_lignes)
+        if self.engine is not None:
+            per_tree = self.engine.predict_per_tree(features)[:, :, 0]
+        else:
+            features_scaled = self.scaler.transform(features)
+            per_tree = np.stack([
+                tree.predict(features_scaled) for tree in self.model.estimators_
+            ])
+        yield_per_ha = per_tree.mean(axis=0)
+        lower, upper = np.percentile(per_tree, [2.5, 97.5], axis=0)
+        # Une distribution très asymétrique peut placer la moyenne hors des
+        # percentiles : l'intervalle est élargi pour toujours la contenir
+        lower = np.clip(np.minimum(lower, yield_per_ha), 0, None)
+        upper = np.maximum(upper, yield_per_ha)
+        return np.column_stack([yield_per_ha, lower, upper])
+    
+    @staticmethod
+    def _confidence(yield_per_ha: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+        """
+        Score de confiance (0 à 1) : 1 - demi-largeur de l'intervalle
+        rapportée au rendement prédit (0 si l'intervalle dépasse le rendement)
+        """
+        half_width = (upper - lower) / 2
+        relative = np.divide(half_width, yield_per_ha, out=np.ones_like(half_width), where=yield_per_ha > 0)
+        return np.clip(1 - relative, 0, 1)
+    
+    def _format(self, features: np.ndarray, estimate: np.ndarray) -> list:
+        """Construit les prédictions à partir de la sortie du modèle"""
+        yield_per_ha, lower, upper = estimate.T
+        total_production = yield_per_ha * features[:, 0]
+        confidence = self._confidence(yield_per_ha, lower, upper)
+        
+        # Recommandations (règles évaluées sur tout le lot)
+        recommendations = self._generate_recommendations(yield_per_ha, features)
+        
+        return [
+            {
+                'yield_per_ha': round(float(yield_per_ha[i]), 2),
+                'total_production_kg': round(float(total_production[i]), 2),
+                'confidence_interval': {
+                    'lower': round(float(lower[i]), 2),
+                    'upper': round(float(upper[i]), 2)
+                },
+                'confidence': round(float(confidence[i]), 2),
+                'recommendations': recommendations[i]
+            }
+            for i in range(len(features))
+        ]
+    
+    # Règles d'amélioration : (catégorie, recommandation, impact)
+    IMPROVEMENT_RULES = [
+        ('Fertilisation', 'Augmenter l\'apport NPK à 200-300 kg/ha', '+15-20% de rendement'),
+        ('Irrigation', 'Installer système d\'irrigation', '+25-30% de rendement'),
+        ('pH du sol', 'Corriger le pH avec chaulage/gypse', '+10-15% de rendement'),
+        ('Pratiques générales', 'Améliorer les pratiques culturales', 'Potentiel d\'amélioration significatif'),
+    ]
+    
+    def _generate_recommendations(self, predicted_yield: np.ndarray, features: np.ndarray) -> list:
+        """
+        Génère des recommandations d'amélioration
+        
+        Args:
+            predicted_yield: rendements prédits (n_lignes,)
+            features: matrice brute (non normalisée) de predict_many
+        
+        Returns:
+            Une liste de recommandations par ligne
+        """
+        rainfall = features[:, 2]
+        ph = features[:, 3]
+        npk = features[:, 4]
+        irrigation = features[:, 5] > 0
+        
+        # Une colonne par règle, dans l'ordre de IMPROVEMENT_RULES
+        masks = np.column_stack([
+            npk < 200,                        # Fertilisation
+            ~irrigation & (rainfall < 1000),  # Irrigation
+            (ph < 5.5) | (ph > 7.5),          # pH du sol
+            predicted_yield < 2000,           # Rendement général
+        ])
+        
+        return [
+            [
+                {
+                    'category': category,
+                    'recommendation': recommendation,
+                    'impact': impact
+                }
+                for (category, recommendation, impact), active in zip(self.IMPROVEMENT_RULES, row_mask)
+                if active
+            ]
+            for row_mask in masks
+        ]
 
 
 class DiseasePredictor:
     """
     Prédiction de risques de maladies et ravageurs
+    
+    Les règles sont une table déclarative par culture (disease_rules.json),
+    compilée en masques NumPy et rechargée à chaud quand le fichier change.
     """
     
     def __init__(self):
-        self.risk_model_path = settings.ML_MODELS_DIR / 'disease_risk.pkl'
-        self.model = None
+        self.rules_path = settings.ML_MODELS_DIR / 'disease_rules.json'
+        self.rules = None
+        self._rules_stamp = None
+        self._last_check = 0.0
+        self._reload_lock = threading.Lock()
         self._load_or_create_model()
     
     def _load_or_create_model(self):
-        """Charge ou crée le modèle de risque"""
+        """Charge ou crée la table de règles"""
         try:
-            if self.risk_model_path.exists():
-                self.model = joblib.load(self.risk_model_path)
-            else:
+            if not self.rules_path.exists():
                 self._create_model()
+            self._reload_rules()
         except Exception as e:
-            logger.error(f"Erreur modèle maladie: {e}")
-            self._create_model()
+            logger.error(f"Erreur règles maladie: {e}")
+            self.rules = CompiledRuleTable(DEFAULT_RULE_TABLE)
     
     def _create_model(self):
-        """Crée un modèle simple de risque"""
-        # Modèle basé sur règles pour le risque
-        logger.info("Création modèle de risque de maladie")
-        self.model = {
-            'rules': 'Règles basées sur température et humidité'
-        }
-        joblib.dump(self.model, self.risk_model_path)
+        """Écrit la table de règles par défaut"""
+        logger.info("Création de la table de règles de risque de maladie")
+        write_rule_table(DEFAULT_RULE_TABLE, self.rules_path)
+    
+    def _reload_rules(self):
+        """Recompile la table si le fichier a changé (mtime/inode/taille)"""
+        stat = self.rules_path.stat()
+        stamp = (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+        if stamp != self._rules_stamp:
+            self.rules = CompiledRuleTable(load_rule_table(self.rules_path))
+            self._rules_stamp = stamp
+            logger.info(f"Règles de maladie v{self.rules.version} chargées")
+    
+    def _current_rules(self) -> CompiledRuleTable:
+        """
+        Retourne la table courante, en vérifiant au plus toutes les
+        ML_DISEASE_RULES_CHECK_INTERVAL secondes si le fichier a changé.
+        Une table invalide est ignorée : la version précédente reste active.
+        """
+        now = time.monotonic()
+        if now - self._last_check >= settings.ML_DISEASE_RULES_CHECK_INTERVAL:
+            if self._reload_lock.acquire(blocking=False):
+                try:
+                    self._last_check = now
+                    self._reload_rules()
+                except Exception as e:
+                    logger.error(f"Rechargement des règles impossible (v{self.rules.version} conservée): {e}")
+                finally:
+                    self._reload_lock.release()
+        return self.rules
     
     def predict_risk(self, conditions: dict) -> dict:
         """
@@ -453,61 +819,81 @@ class DiseasePredictor:
                 'rainfall': float
             }
         """
-        temp = conditions['temperature']
-        humidity = conditions['humidity']
-        
-        # Règles simples
-        risk_level = 'Faible'
-        risk_score = 0.2
+        rules = self._current_rules()
+        grid = self._evaluate_grid(
+            rules,
+            conditions['crop'],
+            conditions['temperature'],
+            conditions['humidity'],
+            conditions.get('rainfall')
+        )
         
-        if temp > 25 and humidity > 75:
-            risk_level = 'Élevé'
-            risk_score = 0.8
-        elif temp > 23 and humidity > 65:
-            risk_level = 'Modéré'
-            risk_score = 0.5
+        risk_level = str(grid['risk_level'].item())
+        threats = [name for name, mask in grid['threats'].items() if mask.item()]
         
         return {
             'risk_level': risk_level,
-            'risk_score': risk_score,
-            'main_threats': self._get_threats(conditions['crop'], temp, humidity),
-            'prevention_measures': self._get_prevention(risk_level)
+            'risk_score': float(grid['risk_score'].item()),
+            'main_threats': threats or list(rules.default_threats),
+            'prevention_measures': list(rules.prevention[risk_level]),
+            'rules_version': rules.version
         }
     
-    def _get_threats(self, crop: str, temp: float, humidity: float) -> list:
-        """Identifie les menaces principales"""
-        threats = []
+    def predict_grid(self, crop, temperature, humidity, rainfall=None) -> dict:
+        """
+        Évalue le risque sur une grille complète en un passage
+        
+        Args:
+            crop: nom de culture, ou tableau de noms diffusable sur la grille
+            temperature, humidity, rainfall: tableaux de même forme
+                (ex: fermes x jours de prévision) ou diffusables
+        
+        Returns:
+            {
+                'risk_score': tableau float,
+                'risk_level': tableau de libellés,
+                'threats': {menace: masque booléen},
+                'rules_version': int
+            }
+        """
+        return self._evaluate_grid(self._current_rules(), crop, temperature, humidity, rainfall)
+    
+    def _evaluate_grid(self, rules: CompiledRuleTable, crop, temperature, humidity, rainfall) -> dict:
+        """Applique une table compilée à une grille de conditions"""
+        if rainfall is None:
+            rainfall = np.nan
+        
+        crops, temperature, humidity, rainfall = np.broadcast_arrays(
+            np.asarray(crop, dtype=object),
+            np.asarray(temperature, dtype=float),
+            np.asarray(humidity, dtype=float),
+            np.asarray(rainfall, dtype=float)
+        )
+        shape = temperature.shape
         
-        if temp > 25 and humidity > 70:
-            threats.append('Mildiou - risque élevé')
-            threats.append('Pourriture fongique')
+        # (variables, cellules) dans l'ordre de disease_rules.VARIABLES
+        values = np.stack([temperature.ravel(), humidity.ravel(), rainfall.ravel()])
+        flat_crops = crops.ravel()
         
-        if temp > 28:
-            threats.append('Chenille légionnaire')
-            threats.append('Pucerons')
+        level_index = np.zeros(flat_crops.size, dtype=np.int8)
+        risk_score = np.zeros(flat_crops.size)
+        threats = {}
         
-        if not threats:
-            threats.append('Conditions généralement favorables')
+        for crop_name in np.unique(flat_crops):
+            selected = flat_crops == crop_name
+            result = rules.evaluate(crop_name, values[:, selected])
+            level_index[selected] = result['level_index']
+            risk_score[selected] = result['risk_score']
+            
+            for mask, names in zip(result['threat_masks'], result['threat_lists']):
+                for name in names:
+                    if name not in threats:
+                        threats[name] = np.zeros(flat_crops.size, dtype=bool)
+                    threats[name][selected] |= mask
         
-        return threats
-    
-    def _get_prevention(self, risk_level: str) -> list:
-        """Mesures de prévention"""
-        if risk_level == 'Élevé':
-            return [
-                'Traitement fongicide préventif',
-                'Surveillance quotidienne',
-                'Améliorer la circulation d\'air',
-                'Réduire l\'irrigation si possible'
-            ]
-        elif risk_level == 'Modéré':
-            return [
-                'Surveillance régulière',
-                'Traitement si symptômes',
-                'Bonnes pratiques culturales'
-            ]
-        else:
-            return [
-                'Surveillance normale',
-                'Maintenir bonnes pratiques'
-            ]
+        return {
+            'risk_score': risk_score.reshape(shape),
+            'risk_level': np.array(rules.levels, dtype=object)[level_index].reshape(shape),
+            'threats': {name: mask.reshape(shape) for name, mask in threats.items()},
+            'rules_version': rules.version
+        }
@@ -0,0 +1,224 @@
+"""
+Registre des modèles ML - chargement unique par processus
+Évite de relire les pickles (joblib.load) à chaque requête, et remplace
+à chaud les modèles quand une nouvelle version est publiée
+"""
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+import logging
+
+import numpy as np
+from django.conf import settings
+
+from .artifacts import pointer_stamp
+from .predictor import CropRecommender, YieldPredictor, DiseasePredictor
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_memory(obj) -> int:
+    """
+    Estime la mémoire occupée par un objet (en octets)
+    Parcourt récursivement attributs, conteneurs et tableaux NumPy
+    (les tableaux mmap, partagés entre processus, ne sont pas comptés).
+    Les arbres scikit-learn sont mesurés via leur état sérialisable.
+    """
+    seen = set()
+    stack = [obj]
+    states = []  # garde les états temporaires en vie (ids uniques)
+    total = 0
+
+    while stack:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+
+        if isinstance(current, np.memmap):
+            # Projeté depuis le disque : partagé via le cache du système
+            continue
+        if isinstance(current, np.ndarray):
+            total += current.nbytes
+            continue
+
+        total += sys.getsizeof(current)
+
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        elif hasattr(current, '__dict__'):
+            stack.append(vars(current))
+        elif hasattr(current, '__getstate__') and type(current).__module__.startswith('sklearn'):
+            # Objets Cython (ex: sklearn.tree._tree.Tree)
+            state = current.__getstate__()
+            if isinstance(state, dict):
+                states.append(state)
+                stack.append(state)
+
+    return total
+
+
+class ModelRegistry:
+    """
+    Registre partagé des modèles ML
+
+    Chaque modèle est construit une seule fois par worker, puis la même
+    instance est servie à toutes les requêtes. Les instances sont
+    utilisées en lecture seule : elles peuvent être partagées entre threads.
+
+    Avec gunicorn --preload, appeler preload() avant le fork permet aux
+    workers de partager les pages mémoire des modèles (copy-on-write).
+
+    Remplacement à chaud : pour les modèles enregistrés avec une fonction
+    `stamp`, get() compare au plus toutes les ML_MODEL_RELOAD_INTERVAL
+    secondes l'empreinte des artefacts publiés (un stat() du pointeur
+    CURRENT). Si elle a changé, la nouvelle instance est construite dans
+    un thread pendant que l'ancienne continue de servir, puis substituée
+    d'un bloc : une requête utilise une seule version du début à la fin.
+    En cas d'échec du chargement, l'ancienne version reste active.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._stamp_functions = {}
+        self._instances = {}
+        self._stamps = {}
+        self._stats = {}
+        self._last_check = {}
+        self._reload_threads = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory, stamp=None):
+        """
+        Enregistre une fabrique de modèle sous un nom
+
+        Args:
+            stamp: fonction sans argument retournant l'empreinte des
+                artefacts publiés ; un changement déclenche un rechargement
+        """
+        self._factories[name] = factory
+        if stamp is not None:
+            self._stamp_functions[name] = stamp
+
+    def get(self, name: str):
+        """Retourne l'instance partagée du modèle (chargée au premier appel)"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            self._check_for_update(name)
+            return instance
+
+        with self._lock:
+            instance = self._instances.get(name)
+            if instance is None:
+                instance = self._load(name)
+        return instance
+
+    def _check_for_update(self, name: str):
+        """Lance un rechargement en arrière-plan si les artefacts ont changé"""
+        stamp_function = self._stamp_functions.get(name)
+        if stamp_function is None:
+            return
+
+        now = time.monotonic()
+        if now - self._last_check.get(name, 0.0) < settings.ML_MODEL_RELOAD_INTERVAL:
+            return
+        self._last_check[name] = now
+        if stamp_function() == self._stamps.get(name):
+            return
+
+        with self._lock:
+            # Après un fork, le thread du parent n'existe plus (is_alive() = False)
+            thread = self._reload_threads.get(name)
+            if thread is not None and thread.is_alive():
+                return
+            thread = threading.Thread(target=self._reload, args=(name,), name=f'reload-{name}', daemon=True)
+            self._reload_threads[name] = thread
+            thread.start()
+
+    def _reload(self, name: str):
+        """Construit la nouvelle instance puis la substitue à l'ancienne"""
+        previous = getattr(self._instances.get(name), 'model_version', None)
+        try:
+            instance = self._load(name)
+        except Exception as e:
+            # Pas de nouvel essai avant la prochaine publication
+            self._stamps[name] = self._stamp_functions[name]()
+            logger.error(f"Rechargement de {name} impossible, version {previous} conservée: {e}")
+            return
+        self._stats[name]['reloads'] += 1
+        logger.info(f"Modèle {name} remplacé à chaud: {previous} -> {instance.model_version}")
+
+    def _load(self, name: str):
+        """Construit le modèle et enregistre ses statistiques de chargement"""
+        if name not in self._factories:
+            raise KeyError(f"Modèle inconnu: {name}")
+
+        # Empreinte relevée avant la lecture : une publication pendant le
+        # chargement sera détectée à la vérification suivante
+        stamp_function = self._stamp_functions.get(name)
+        stamp = stamp_function() if stamp_function is not None else None
+
+        start = time.perf_counter()
+        instance = self._factories[name]()
+        load_time = time.perf_counter() - start
+
+        reloads = self._stats.get(name, {}).get('reloads', 0)
+        self._instances[name] = instance
+        self._stamps[name] = stamp
+        self._stats[name] = {
+            'model_version': getattr(instance, 'model_version', None),
+            'reloads': reloads,
+            'load_time_ms': round(load_time * 1000, 2),
+            'memory_bytes': estimate_memory(instance),
+            'loaded_at': datetime.now().isoformat(),
+            'pid': os.getpid(),
+        }
+
+        logger.info(
+            f"Modèle {name} chargé en {load_time * 1000:.1f} ms "
+            f"({self._stats[name]['memory_bytes'] / 1024**2:.2f} MB)"
+        )
+        return instance
+
+    def preload(self, names=None):
+        """Charge les modèles à l'avance (ex: avant le fork gunicorn)"""
+        for name in names or list(self._factories):
+            self.get(name)
+
+    def reset(self, name: str = None):
+        """Oublie une instance (ou toutes) pour forcer un rechargement"""
+        with self._lock:
+            if name is None:
+                self._instances.clear()
+                self._stamps.clear()
+                self._stats.clear()
+            else:
+                self._instances.pop(name, None)
+                self._stamps.pop(name, None)
+                self._stats.pop(name, None)
+
+    def stats(self) -> dict:
+        """Temps de chargement, mémoire et cache par modèle chargé"""
+        stats = {}
+        for name, model_stats in self._stats.items():
+            stats[name] = dict(model_stats)
+            cache = getattr(self._instances.get(name), 'cache', None)
+            if cache is not None:
+                stats[name]['cache'] = cache.stats()
+        return stats
+
+
+registry = ModelRegistry()
+registry.register('crop_recommender', CropRecommender, stamp=lambda: pointer_stamp('crop_recommender'))
+registry.register('yield_predictor', YieldPredictor, stamp=lambda: pointer_stamp('yield_predictor'))
+registry.register('disease_predictor', DiseasePredictor)
+
+
+def get_model(name: str):
+    """Raccourci vers le registre par défaut"""
+    return registry.get(name)
@@ -0,0 +1,354 @@
+"""
+Recherche d'hyperparamètres des forêts (python train_models.py --search)
+
+- validation croisée de configurations tirées dans SEARCH_SPACE, une
+  configuration par tâche d'un pool de processus (tous les coeurs)
+- X et y écrits une fois en .npy puis ouverts en mmap par chaque
+  worker : le jeu complet n'est ni sérialisé ni copié par processus
+  (seules les lignes d'entraînement d'un pli sont matérialisées) ; les
+  cultures sont encodées en entiers (un tableau d'objets serait picklé
+  et ne pourrait pas être ouvert en mmap)
+- pour chaque configuration : score moyen, latence d'une prédiction
+  unitaire avec le moteur de ML_INFERENCE_BACKEND et taille de l'artefact
+- meilleure configuration = meilleur score dans le budget de latence et
+  de taille ; rapport avec le front de Pareto (score, latence, taille).
+  Budget de latence par défaut : latence mesurée de la configuration
+  actuelle (sur la même machine, même moteur), avec une marge
+"""
+import io
+import itertools
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+import logging
+
+import joblib
+import numpy as np
+from django.conf import settings
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.metrics import accuracy_score, f1_score, mean_absolute_error, r2_score
+from sklearn.model_selection import KFold, StratifiedKFold
+from sklearn.preprocessing import StandardScaler
+
+from .flat_forest import FlatForest
+
+logger = logging.getLogger(__name__)
+
+# Valeurs essayées par hyperparamètre (produit cartésien échantillonné)
+SEARCH_SPACE = {
+    'n_estimators': [25, 50, 100, 200],
+    'max_depth': [6, 8, 10, 12, 15, 20, None],
+    'min_samples_leaf': [1, 2, 5, 10],
+    'max_features': ['sqrt', 0.5, 1.0],
+}
+
+# Configurations servies jusqu'ici, toujours évaluées pour comparaison
+BASELINES = {
+    'crop_recommender': {'n_estimators': 100, 'max_depth': 10},
+    'yield_predictor': {'n_estimators': 100, 'max_depth': 15},
+}
+
+# Score optimisé : accuracy (classification), R² (régression)
+SCORES = {'crop_recommender': 'accuracy', 'yield_predictor': 'r2'}
+
+# Répétitions de la mesure de latence (médiane retenue)
+LATENCY_REPEATS = 50
+
+# Budget de latence sans ML_SEARCH_MAX_LATENCY_MS : latence de la
+# configuration actuelle x marge (bruit de mesure)
+BASELINE_LATENCY_MARGIN = 1.1
+
+# Tableaux du worker, ouverts en mmap par _open_arrays
+_arrays = {}
+
+
+def sample_candidates(name: str, n_candidates: int, seed: int = 42) -> list:
+    """Configuration actuelle + n_candidates - 1 tirages distincts de SEARCH_SPACE"""
+    baseline = dict(BASELINES[name])
+    grid = [dict(zip(SEARCH_SPACE, values)) for values in itertools.product(*SEARCH_SPACE.values())]
+    random.Random(seed).shuffle(grid)
+
+    candidates = [baseline]
+    for params in grid:
+        if len(candidates) >= n_candidates:
+            break
+        if params != baseline:
+            candidates.append(params)
+    return candidates
+
+
+def _open_arrays(paths: dict):
+    """Initialisation d'un worker : X et y projetés depuis le disque"""
+    for key, path in paths.items():
+        _arrays[key] = np.load(path, mmap_mode='r')
+
+
+def _splits(name: str, y, cv: int, seed: int):
+    """Plis de validation croisée (stratifiés pour la classification)"""
+    splitter = (StratifiedKFold if name == 'crop_recommender' else KFold)(n_splits=cv, shuffle=True, random_state=seed)
+    return splitter.split(np.zeros(len(y)), y)
+
+
+def _estimator(name: str, params: dict, seed: int):
+    estimator = RandomForestClassifier if name == 'crop_recommender' else RandomForestRegressor
+    return estimator(random_state=seed, n_jobs=1, **params)
+
+
+def _latency_ms(name: str, model, scaler, row: np.ndarray, backend: str):
+    """
+    Latence médiane d'une prédiction unitaire, par le même chemin que les
+    prédicteurs
+
+    Returns:
+        (latence en ms, moteur plat/compact ou None pour sklearn)
+    """
+    engine = None
+    if backend in ('flat', 'compact'):
+        engine = FlatForest.from_sklearn(model, scaler)
+        if backend == 'compact':
+            engine = engine.compact()
+
+    def predict():
+        if engine is not None:
+            return engine.predict_proba(row) if name == 'crop_recommender' else engine.predict_per_tree(row)
+        scaled = scaler.transform(row)
+        if name == 'crop_recommender':
+            return model.predict_proba(scaled)
+        return np.stack([tree.predict(scaled) for tree in model.estimators_])
+
+    for _ in range(3):
+        predict()
+    timings = []
+    for _ in range(LATENCY_REPEATS):
+        started = time.perf_counter()
+        predict()
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings) * 1000), engine
+
+
+def _size_mb(model, engine) -> float:
+    """Taille de l'artefact servi : moteur plat/compact, sinon pickle"""
+    if engine is not None:
+        return engine.nbytes / 1024 ** 2
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    return buffer.tell() / 1024 ** 2
+
+
+def evaluate_candidate(name: str, params: dict, cv: int, backend: str, seed: int) -> dict:
+    """
+    Tâche d'un worker : validation croisée d'une configuration sur les
+    tableaux en mmap, puis latence et taille du modèle du dernier pli
+    """
+    X, y = _arrays['X'], _arrays['y']
+    scores, secondary, fit_seconds = [], [], []
+
+    for train_index, test_index in _splits(name, y, cv, seed):
+        scaler = StandardScaler()
+        X_train = scaler.fit_transform(X[train_index])
+        X_test = scaler.transform(X[test_index])
+
+        model = _estimator(name, params, seed)
+        started = time.perf_counter()
+        model.fit(X_train, y[train_index])
+        fit_seconds.append(time.perf_counter() - started)
+
+        predicted = model.predict(X_test)
+        if name == 'crop_recommender':
+            scores.append(accuracy_score(y[test_index], predicted))
+            secondary.append(f1_score(y[test_index], predicted, average='macro'))
+        else:
+            scores.append(r2_score(y[test_index], predicted))
+            secondary.append(mean_absolute_error(y[test_index], predicted))
+
+    latency_ms, engine = _latency_ms(name, model, scaler, np.asarray(X[test_index[:1]], dtype=np.float64), backend)
+    return {
+        'params': params,
+        'score': round(float(np.mean(scores)), 4),
+        'score_std': round(float(np.std(scores)), 4),
+        'f1_macro' if name == 'crop_recommender' else 'mae': round(float(np.mean(secondary)), 4),
+        'fit_seconds': round(float(np.mean(fit_seconds)), 2),
+        'latency_ms': round(latency_ms, 3),
+        'size_mb': round(_size_mb(model, engine), 2),
+        'trees': len(model.estimators_),
+        'nodes': int(sum(tree.tree_.node_count for tree in model.estimators_)),
+    }
+
+
+def pareto_front(results: list) -> list:
+    """
+    Indices des configurations non dominées : aucune autre n'a un score
+    au moins égal avec une latence et une taille au plus égales (et au
+    moins un critère strictement meilleur)
+    """
+    front = []
+    for i, a in enumerate(results):
+        dominated = any(
+            b['score'] >= a['score'] and b['latency_ms'] <= a['latency_ms'] and b['size_mb'] <= a['size_mb']
+            and (b['score'] > a['score'] or b['latency_ms'] < a['latency_ms'] or b['size_mb'] < a['size_mb'])
+            for j, b in enumerate(results) if j != i
+        )
+        if not dominated:
+            front.append(i)
+    return front
+
+
+class HyperparameterSearch:
+    """
+    Recherche d'hyperparamètres d'un modèle (crop_recommender ou yield_predictor)
+
+    Args:
+        n_candidates: configurations évaluées (dont la configuration actuelle)
+        cv: nombre de plis de validation croisée
+        n_jobs: processus du pool (-1 = tous les coeurs)
+        max_latency_ms / max_size_mb: budget de la configuration retenue
+            (latence : celle de la configuration actuelle si None)
+        max_rows: sous-échantillon aléatoire des lignes (None = toutes)
+    """
+
+    def __init__(self, name: str, n_candidates: int = 24, cv: int = 3, n_jobs: int = None,
+                 max_latency_ms: float = None, max_size_mb: float = None, max_rows: int = None,
+                 seed: int = 42):
+        if name not in BASELINES:
+            raise ValueError(f"Modèle sans recherche d'hyperparamètres: {name}")
+        self.name = name
+        self.n_candidates = n_candidates
+        self.cv = cv
+        n_jobs = settings.ML_TRAINING_N_JOBS if n_jobs is None else n_jobs
+        self.n_jobs = os.cpu_count() if n_jobs == -1 else max(1, n_jobs)
+        self.max_latency_ms = settings.ML_SEARCH_MAX_LATENCY_MS if max_latency_ms is None else max_latency_ms
+        self.max_size_mb = settings.ML_SEARCH_MAX_SIZE_MB if max_size_mb is None else max_size_mb
+        self.max_rows = max_rows
+        self.seed = seed
+
+    def run(self, X: np.ndarray, y: np.ndarray) -> dict:
+        """
+        Évalue les configurations en parallèle
+
+        Returns:
+            rapport : {'model', 'score', 'budget', 'rows', 'candidates': [...],
+            'pareto': [...], 'best': configuration retenue ou None}
+
+        Raises:
+            RuntimeError: si aucune configuration n'a pu être évaluée
+        """
+        if self.max_rows and len(y) > self.max_rows:
+            rows = np.random.default_rng(self.seed).choice(len(y), self.max_rows, replace=False)
+            X, y = X[rows], y[rows]
+
+        # Cultures -> entiers (décodées dans le rapport via 'classes')
+        classes = None
+        if self.name == 'crop_recommender':
+            classes, y = np.unique(np.asarray(y), return_inverse=True)
+
+        candidates = sample_candidates(self.name, self.n_candidates, self.seed)
+        backend = settings.ML_INFERENCE_BACKEND
+        tmp_dir = Path(tempfile.mkdtemp(prefix=f'search-{self.name}-'))
+        started = time.perf_counter()
+        try:
+            paths = {'X': str(tmp_dir / 'X.npy'), 'y': str(tmp_dir / 'y.npy')}
+            np.save(paths['X'], np.ascontiguousarray(X, dtype=np.float32))
+            np.save(paths['y'], np.asarray(y), allow_pickle=False)
+
+            results, failures = [], []
+            workers = min(self.n_jobs, len(candidates))
+            with ProcessPoolExecutor(max_workers=workers, initializer=_open_arrays, initargs=(paths,)) as pool:
+                futures = {
+                    pool.submit(evaluate_candidate, self.name, params, self.cv, backend, self.seed): params
+                    for params in candidates
+                }
+                for future in as_completed(futures):
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.error(f"Configuration {futures[future]} en échec: {e}")
+                        failures.append(e)
+                        continue
+                    results.append(result)
+                    logger.info(f"{self.name} {len(results)}/{len(candidates)}: {result}")
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        if not results:
+            raise RuntimeError(
+                f"{self.name}: aucune des {len(candidates)} configurations n'a pu être évaluée "
+                f"(première erreur: {failures[0]!r})"
+            ) from failures[0]
+
+        max_latency_ms = self.max_latency_ms
+        baseline = next((result for result in results if result['params'] == BASELINES[self.name]), None)
+        if max_latency_ms is None and baseline is not None:
+            max_latency_ms = round(baseline['latency_ms'] * BASELINE_LATENCY_MARGIN, 3)
+        elif max_latency_ms is None:
+            logger.warning(f"{self.name}: configuration actuelle en échec, pas de budget de latence")
+
+        results.sort(key=lambda result: (-result['score'], result['latency_ms']))
+        front = set(pareto_front(results))
+        for index, result in enumerate(results):
+            result['pareto'] = index in front
+            result['within_budget'] = (
+                (max_latency_ms is None or result['latency_ms'] <= max_latency_ms)
+                and result['size_mb'] <= self.max_size_mb
+            )
+            result['baseline'] = result is baseline
+
+        best = next((result for result in results if result['within_budget']), None)
+        return {
+            'model': self.name,
+            'created_at': datetime.now().isoformat(),
+            'score': SCORES[self.name],
+            'backend': backend,
+            'budget': {'latency_ms': max_latency_ms, 'size_mb': self.max_size_mb},
+            'rows': int(len(y)),
+            'classes': None if classes is None else [str(label) for label in classes],
+            'cv': self.cv,
+            'workers': workers,
+            'seconds': round(time.perf_counter() - started, 1),
+            'candidates': results,
+            'pareto': [result for result in results if result['pareto']],
+            'best': best,
+        }
+
+
+def save_report(report: dict) -> Path:
+    """Écrit le rapport dans ML_MODELS_DIR/search/<modèle>-<date>.json"""
+    path = settings.ML_MODELS_DIR / 'search' / f"{report['model']}-{datetime.now():%Y%m%d-%H%M%S}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+    return path
+
+
+def format_report(report: dict) -> str:
+    """
+    Tableau texte d'un rapport (meilleur score d'abord)
+
+    P = front de Pareto, B = dans le budget, * = configuration actuelle,
+    > = configuration retenue
+    """
+    lines = [
+        f"{report['model']} : {report['score']} en validation croisée ({report['cv']} plis, "
+        f"{report['rows']} lignes, backend {report['backend']}, {report['seconds']} s)",
+        f"Budget : {report['budget']['latency_ms'] or '-'} ms, {report['budget']['size_mb']} Mo",
+        f"{'':<4} {'Score':>13} {'Latence (ms)':>13} {'Taille (Mo)':>12}  Paramètres",
+    ]
+    for result in report['candidates']:
+        flags = (
+            ('>' if result is report['best'] else ' ')
+            + ('P' if result['pareto'] else ' ')
+            + ('B' if result['within_budget'] else ' ')
+            + ('*' if result['baseline'] else ' ')
+        )
+        lines.append(
+            f"{flags:<4} {result['score']:>7.4f}±{result['score_std']:<5.3f} {result['latency_ms']:>13.3f} "
+            f"{result['size_mb']:>12.2f}  {result['params']}"
+        )
+    if report['best'] is None:
+        lines.append("Aucune configuration dans le budget")
+    return '\n'.join(lines)
@@ -0,0 +1,825 @@
+"""
+Tests des modèles ML
+"""
+import copy
+import json
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+from unittest import mock
+
+import joblib
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+
+from .artifacts import (
+    artifact_paths, pointer_stamp, current_dir, current_version, new_version, prune_versions, publish_version, save_version,
+    write_atomic,
+)
+from .cache import PredictionCache
+from .datasets import MANIFEST_NAME, dataset_path, read_dataset
+from .disease_rules import DEFAULT_RULE_TABLE, write_rule_table
+from .flat_forest import FlatForest
+from .lookup_grid import RecommendationGrid
+from .predictor import CropRecommender, DiseasePredictor, YieldPredictor
+from .registry import ModelRegistry
+from .search import BASELINE_LATENCY_MARGIN, BASELINES, HyperparameterSearch
+from .training import IncrementalYieldTrainer, TrainingPipeline
+
+
+class TemporaryModelsDirMixin:
+    """ML_MODELS_DIR redirigé vers un répertoire temporaire par test"""
+
+    def setUp(self):
+        super().setUp()
+        self.models_dir = Path(tempfile.mkdtemp(prefix='agri-smart-models-'))
+        self.addCleanup(shutil.rmtree, self.models_dir, ignore_errors=True)
+        settings_override = override_settings(ML_MODELS_DIR=self.models_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+def legacy_predict_risk(temp, humidity):
+    """Chaînes if/else remplacées par la table de règles (référence)"""
+    risk_level, risk_score = 'Faible', 0.2
+    if temp > 25 and humidity > 75:
+        risk_level, risk_score = 'Élevé', 0.8
+    elif temp > 23 and humidity > 65:
+        risk_level, risk_score = 'Modéré', 0.5
+
+    threats = []
+    if temp > 25 and humidity > 70:
+        threats += ['Mildiou - risque élevé', 'Pourriture fongique']
+    if temp > 28:
+        threats += ['Chenille légionnaire', 'Pucerons']
+    return risk_level, risk_score, threats or ['Conditions généralement favorables']
+
+
+@override_settings(ML_DISEASE_RULES_CHECK_INTERVAL=0)
+class DiseaseRulesTests(TemporaryModelsDirMixin, SimpleTestCase):
+    # Seuils des anciennes règles inclus (comparaisons strictes)
+    TEMPERATURES = np.arange(15.0, 35.5, 0.5)
+    HUMIDITIES = np.arange(40.0, 101.0, 1.0)
+
+    # Cultures de la table, et d'autres (règles par défaut) ; la pluie ne
+    # jouait aucun rôle dans les anciennes règles
+    CROPS = ['Maïs', 'Tomate', 'Riz', 'Cacao', *DEFAULT_RULE_TABLE['crops']]
+    RAINFALLS = [None, 0.0, 150.0]
+
+    def test_rule_table_matches_legacy_rules(self):
+        predictor = DiseasePredictor()
+        for crop in self.CROPS:
+            for rainfall in self.RAINFALLS:
+                for temp in self.TEMPERATURES:
+                    for humidity in self.HUMIDITIES:
+                        conditions = {'crop': crop, 'temperature': temp, 'humidity': humidity}
+                        if rainfall is not None:
+                            conditions['rainfall'] = rainfall
+                        risk = predictor.predict_risk(conditions)
+                        level, score, threats = legacy_predict_risk(temp, humidity)
+                        self.assertEqual(
+                            (risk['risk_level'], risk['risk_score'], sorted(risk['main_threats']),
+                             risk['prevention_measures']),
+                            (level, score, sorted(threats), DEFAULT_RULE_TABLE['prevention'][level]),
+                            f'{conditions}'
+                        )
+
+    def test_crop_override_adds_threats(self):
+        predictor = DiseasePredictor()
+        table = copy.deepcopy(DEFAULT_RULE_TABLE)
+        table['crops'] = {'Riz': {'threats': [
+            {'when': [['temperature', '>=', 24], ['humidity', '>', 85]], 'threats': ['Pyriculariose']},
+        ]}}
+        write_rule_table(table, predictor.rules_path)
+
+        conditions = {'temperature': 26.0, 'humidity': 90.0}
+        self.assertIn('Pyriculariose', predictor.predict_risk({**conditions, 'crop': 'Riz'})['main_threats'])
+        self.assertNotIn('Pyriculariose', predictor.predict_risk({**conditions, 'crop': 'Maïs'})['main_threats'])
+
+    def test_grid_matches_single_predictions(self):
+        predictor = DiseasePredictor()
+        temperature, humidity = np.meshgrid(self.TEMPERATURES, self.HUMIDITIES, indexing='ij')
+        grid = predictor.predict_grid('Maïs', temperature, humidity)
+
+        for index in np.ndindex(temperature.shape):
+            level, score, threats = legacy_predict_risk(temperature[index], humidity[index])
+            self.assertEqual(grid['risk_level'][index], level)
+            self.assertEqual(grid['risk_score'][index], score)
+            flagged = [name for name, mask in grid['threats'].items() if mask[index]]
+            self.assertEqual(sorted(flagged), sorted(t for t in threats if t in grid['threats']))
+
+    def test_edited_rules_are_hot_reloaded(self):
+        predictor = DiseasePredictor()
+        conditions = {'crop': 'Maïs', 'temperature': 24.0, 'humidity': 70.0}
+        self.assertEqual(predictor.predict_risk(conditions)['risk_level'], 'Modéré')
+
+        table = copy.deepcopy(DEFAULT_RULE_TABLE)
+        table['version'] = 2
+        table['risk_levels'][0]['when'] = [['temperature', '>', 22], ['humidity', '>', 60]]
+        write_rule_table(table, predictor.rules_path)
+
+        risk = predictor.predict_risk(conditions)
+        self.assertEqual(risk['rules_version'], 2)
+        self.assertEqual(risk['risk_level'], 'Élevé')
+
+    def test_invalid_rules_keep_previous_table(self):
+        predictor = DiseasePredictor()
+        predictor.rules_path.write_text('{"version": 3, "risk_levels": [', encoding='utf-8')
+
+        risk = predictor.predict_risk({'crop': 'Maïs', 'temperature': 30.0, 'humidity': 90.0})
+        self.assertEqual(risk['rules_version'], DEFAULT_RULE_TABLE['version'])
+        self.assertEqual(risk['risk_level'], 'Élevé')
+
+
+class FlatForestParityTests(TemporaryModelsDirMixin, SimpleTestCase):
+    """Moteurs plat, compact et compact relu en mmap contre scikit-learn"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rng = np.random.default_rng(0)
+        X = rng.normal([27, 70, 1200, 6.3], [4, 12, 400, 0.8], size=(600, 4))
+        cls.X_test = rng.normal([27, 70, 1200, 6.3], [6, 18, 600, 1.2], size=(300, 4))
+
+        cls.scaler = StandardScaler().fit(X)
+        X_scaled = cls.scaler.transform(X)
+        labels = np.array(['Maïs', 'Riz', 'Manioc', 'Sorgho'])
+        y_class = labels[(X[:, 0] > 27).astype(int) * 2 + (X[:, 2] > 1200).astype(int)]
+        y_value = 20 * X[:, 0] + 0.5 * X[:, 2] + rng.normal(0, 50, len(X))
+
+        cls.classifier = RandomForestClassifier(n_estimators=15, max_depth=8, random_state=0).fit(X_scaled, y_class)
+        cls.regressor = RandomForestRegressor(n_estimators=15, max_depth=10, random_state=0).fit(X_scaled, y_value)
+
+    def engines(self, forest):
+        """(nom, moteur) : plat, compact en mémoire, compact relu en mmap"""
+        flat = FlatForest.from_sklearn(forest, self.scaler)
+        compact = flat.compact()
+        compact.save(self.models_dir / 'forest.compact')
+        reloaded = FlatForest.load(self.models_dir / 'forest.compact', mmap_mode='r')
+        self.assertIsInstance(reloaded.threshold, np.memmap)
+        return [('flat', flat), ('compact', compact), ('mmap', reloaded)]
+
+    def test_classifier_parity(self):
+        X_scaled = self.scaler.transform(self.X_test)
+        expected_proba = self.classifier.predict_proba(X_scaled)
+        expected_per_tree = np.stack([tree.predict_proba(X_scaled) for tree in self.classifier.estimators_])
+
+        for name, engine in self.engines(self.classifier):
+            with self.subTest(engine=name):
+                atol = 1e-9 + engine.tolerance
+                self.assertEqual(list(engine.classes_), list(self.classifier.classes_))
+                np.testing.assert_allclose(engine.predict_proba(self.X_test), expected_proba, rtol=0, atol=atol)
+                np.testing.assert_allclose(engine.predict_per_tree(self.X_test), expected_per_tree, rtol=0, atol=atol)
+
+                # Classe prédite identique hors quasi-égalités (quantification)
+                top2 = np.sort(expected_proba, axis=1)[:, -2:]
+                clear = top2[:, 1] - top2[:, 0] > 2 * atol
+                np.testing.assert_array_equal(
+                    engine.predict(self.X_test)[clear], self.classifier.predict(X_scaled)[clear]
+                )
+
+    def test_regressor_parity(self):
+        X_scaled = self.scaler.transform(self.X_test)
+        expected = self.regressor.predict(X_scaled)
+        expected_per_tree = np.stack([tree.predict(X_scaled) for tree in self.regressor.estimators_])
+
+        for name, engine in self.engines(self.regressor):
+            with self.subTest(engine=name):
+                atol = 1e-6 + engine.tolerance
+                np.testing.assert_allclose(engine.predict(self.X_test), expected, rtol=0, atol=atol)
+                np.testing.assert_allclose(
+                    engine.predict_per_tree(self.X_test)[:, :, 0], expected_per_tree, rtol=0, atol=atol
+                )
+
+    def test_flat_engine_is_exact(self):
+        flat = FlatForest.from_sklearn(self.classifier, self.scaler)
+        self.assertEqual(flat.tolerance, 0.0)
+        np.testing.assert_array_equal(
+            flat.predict(self.X_test), self.classifier.predict(self.scaler.transform(self.X_test))
+        )
+
+
+class PredictionCacheTests(SimpleTestCase):
+    FIELDS = ['temperature', 'humidity', 'rainfall', 'soil_ph']
+
+    def setUp(self):
+        caches[settings.ML_PREDICTION_CACHE_ALIAS].clear()
+        self.cache = PredictionCache('crop_recommender', self.FIELDS)
+
+    def test_inputs_in_same_bucket_share_a_key(self):
+        # Pas de 0.5°C, 1%, 10 mm, 0.1 pH
+        key = self.cache.key([28.1, 75.2, 1201, 6.52], 'v1')
+        self.assertEqual(key, self.cache.key([27.9, 74.8, 1204, 6.48], 'v1'))
+        self.assertNotEqual(key, self.cache.key([28.4, 75.2, 1201, 6.52], 'v1'))
+        self.assertNotEqual(key, self.cache.key([28.1, 75.2, 1216, 6.52], 'v1'))
+        self.assertNotEqual(key, self.cache.key([28.1, 75.2, 1201, 6.56], 'v1'))
+
+    def test_hit_within_bucket(self):
+        compute = mock.Mock(return_value=[('Maïs', 0.7)])
+        self.assertEqual(self.cache.get_or_compute([28.1, 75.2, 1201, 6.52], 'v1', compute), [('Maïs', 0.7)])
+        self.assertEqual(self.cache.get_or_compute([27.9, 74.8, 1204, 6.48], 'v1', compute), [('Maïs', 0.7)])
+        self.assertEqual(compute.call_count, 1)
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'misses': 1, 'errors': 0, 'hit_rate': 0.5})
+
+    def test_new_model_version_invalidates(self):
+        features = [28.1, 75.2, 1201, 6.52]
+        self.cache.get_or_compute(features, 'v1', lambda: 'ancien')
+        self.assertEqual(self.cache.get_or_compute(features, 'v2', lambda: 'nouveau'), 'nouveau')
+        self.assertEqual(self.cache.get_or_compute(features, 'v2', lambda: 'autre'), 'nouveau')
+        self.assertNotEqual(self.cache.key(features, 'v1'), self.cache.key(features, 'v2'))
+
+    def test_backend_failure_still_predicts(self):
+        backend = mock.Mock()
+        backend.get.side_effect = ConnectionError('redis indisponible')
+        with mock.patch.object(PredictionCache, 'backend', new=backend):
+            self.assertEqual(self.cache.get_or_compute([28, 75, 1200, 6.5], 'v1', lambda: 'calculé'), 'calculé')
+        self.assertEqual(self.cache.errors, 1)
+
+
+@override_settings(ML_INFERENCE_BACKEND='flat', ML_SYNTHETIC_SAMPLES=400, ML_PREDICTION_CACHE_ENABLED=False)
+class RetrainEngineTests(TemporaryModelsDirMixin, SimpleTestCase):
+    """Réentraînement (train_models.py --samples) : le moteur suit le nouveau modèle"""
+
+    GRID_AXES = {
+        'temperature': (20.0, 35.0, 5.0),
+        'humidity': (40.0, 90.0, 25.0),
+        'rainfall': (500.0, 2000.0, 500.0),
+        'soil_ph': (5.0, 8.0, 1.0),
+    }
+
+    def test_recommender_engine_and_grid_follow_retrained_model(self):
+        recommender = CropRecommender()
+        previous_engine, previous_version = recommender.engine, recommender.model_version
+        recommender.build_grid(self.GRID_AXES)
+
+        recommender._create_and_train_model(n_samples=900)
+        self.assertIsNotNone(recommender.engine)
+        self.assertIsNot(recommender.engine, previous_engine)
+        self.assertNotEqual(recommender.model_version, previous_version)
+        self.assertIsNone(recommender.grid)
+
+        X = CropRecommender.generate_training_data(200, seed=1)[0]
+        expected = recommender.model.predict_proba(recommender.scaler.transform(X))
+        np.testing.assert_allclose(recommender.predict_proba(X)[0], expected, atol=1e-9)
+
+        grid = recommender.build_grid(self.GRID_AXES)
+        self.assertEqual(grid.model_version, recommender.model_version)
+        self.assertEqual(CropRecommender().grid.model_version, recommender.model_version)
+
+    def test_yield_engine_follows_retrained_model(self):
+        predictor = YieldPredictor()
+        previous_engine = predictor.engine
+
+        predictor._create_and_train_model(n_samples=900)
+        self.assertIsNot(predictor.engine, previous_engine)
+
+        X = YieldPredictor.generate_training_data(200, seed=1)[0]
+        expected = predictor.model.predict(predictor.scaler.transform(X))
+        np.testing.assert_allclose(predictor._estimate(X)[:, 0], expected, rtol=1e-9)
+
+
+@override_settings(ML_SYNTHETIC_SAMPLES=900, ML_PREDICTION_CACHE_ENABLED=False)
+class YieldPredictionTests(TemporaryModelsDirMixin, SimpleTestCase):
+    """predict_many contre predict, intervalle et score de confiance"""
+
+    def setUp(self):
+        super().setUp()
+        self.predictor = YieldPredictor()
+        X = YieldPredictor.generate_training_data(3000, seed=3)[0]
+        self.rows = [
+            {'crop': 'Maïs', 'area_hectares': area, 'temperature': temp, 'rainfall': rainfall,
+             'soil_ph': ph, 'fertilizer_npk': npk, 'irrigation': bool(irrigation)}
+            for area, temp, rainfall, ph, npk, irrigation in X
+        ]
+
+    def test_predict_many_matches_predict(self):
+        batch = self.predictor.predict_many(self.rows[:200])
+        self.assertEqual(batch, [self.predictor.predict(row) for row in self.rows[:200]])
+
+    def test_interval_contains_prediction(self):
+        for prediction in self.predictor.predict_many(self.rows):
+            interval = prediction['confidence_interval']
+            self.assertLessEqual(interval['lower'], prediction['yield_per_ha'])
+            self.assertLessEqual(prediction['yield_per_ha'], interval['upper'])
+            self.assertGreaterEqual(interval['lower'], 0)
+
+    def test_confidence_follows_interval_width(self):
+        confidence = YieldPredictor._confidence(
+            np.array([2000.0, 2000.0, 2000.0, 0.0]),
+            np.array([1900.0, 1000.0, 0.0, 0.0]),
+            np.array([2100.0, 3000.0, 6000.0, 0.0]),
+        )
+        np.testing.assert_allclose(confidence, [0.95, 0.5, 0.0, 0.0])
+
+        scores = [prediction['confidence'] for prediction in self.predictor.predict_many(self.rows)]
+        self.assertTrue(all(0 <= score <= 1 for score in scores))
+        self.assertGreater(len(set(scores)), 1)
+
+
+@override_settings(ML_SYNTHETIC_SAMPLES=900, ML_PREDICTION_CACHE_ENABLED=False)
+class RecommendationGridTests(TemporaryModelsDirMixin, SimpleTestCase):
+    """Lecture de la grille précalculée contre le modèle"""
+
+    AXES = {
+        'temperature': (20.0, 35.0, 2.5),
+        'humidity': (40.0, 90.0, 10.0),
+        'rainfall': (500.0, 2000.0, 250.0),
+        'soil_ph': (5.0, 8.0, 0.5),
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.recommender = CropRecommender()
+        self.grid = self.recommender.build_grid(self.AXES)
+        points = [np.round(np.arange(low, high + step / 2, step), 6) for low, high, step in self.AXES.values()]
+        self.nodes = np.stack(np.meshgrid(*points, indexing='ij'), axis=-1).reshape(-1, len(points))
+
+    def test_nearest_lookup_at_nodes_matches_model(self):
+        probas, _ = self.recommender.predict_proba(self.nodes)
+        for node, node_probas in zip(self.nodes, probas):
+            ranked = self.grid.lookup(node)
+            expected = np.sort(node_probas)[::-1][:len(ranked)]
+            np.testing.assert_allclose([p for _, p in ranked], expected, rtol=0, atol=1 / 255)
+
+    def test_interpolation_at_node_equals_node(self):
+        classes = list(self.grid.classes)
+        for node in self.nodes[::7]:
+            index = tuple(np.round((node - self.grid.lows) / self.grid.steps).astype(int))
+            for crop, proba in self.grid.lookup(node, interpolate=True):
+                self.assertAlmostEqual(proba, self.grid.probas[index][classes.index(crop)] / 255, places=9)
+
+    def test_last_node_is_inside(self):
+        self.assertEqual(list(self.grid.highs), [axis[1] for axis in self.AXES.values()])
+        self.assertIsNotNone(self.grid.lookup(self.grid.highs, interpolate=True))
+
+    def test_out_of_range_falls_back_to_model(self):
+        row = {'temperature': 27.5, 'humidity': 70.0, 'rainfall': 1250.0, 'soil_ph': 6.5}
+        self.assertEqual(self.recommender.recommend_fast(row)['source'], 'grid')
+        for field, value in [('temperature', 36.0), ('rainfall', 400.0)]:
+            with self.subTest(field=field):
+                result = self.recommender.recommend_fast({**row, field: value}, interpolate=True)
+                self.assertEqual(result['source'], 'model')
+
+    def test_invalid_axes_are_rejected(self):
+        for axis in [(500.0, 2000.0, 400.0), (500.0, 500.0, 50.0), (500.0, 2000.0, 0.0)]:
+            with self.subTest(axis=axis), self.assertRaises(ValueError):
+                RecommendationGrid.build(self.recommender, {**self.AXES, 'rainfall': axis})
+
+
+class DatasetPathTests(TemporaryModelsDirMixin, SimpleTestCase):
+    """Plusieurs sorties d'un même dataset : la plus récente est lue"""
+
+    def write(self, layout: str, value: int, mtime: int):
+        df = pd.DataFrame({'value': [value]})
+        if layout == 'shards':
+            directory = self.models_dir / 'farms'
+            directory.mkdir(exist_ok=True)
+            df.to_csv(directory / 'part-00000.csv', index=False)
+            path = directory / MANIFEST_NAME
+            path.write_text(json.dumps({'shards': [{'file': 'part-00000.csv'}]}), encoding='utf-8')
+        elif layout == 'parquet':
+            path = self.models_dir / 'farms.parquet'
+            df.to_parquet(path)
+        else:
+            path = self.models_dir / 'farms.csv'
+            df.to_csv(path, index=False)
+        os.utime(path, ns=(mtime, mtime))
+
+    def read_value(self) -> int:
+        return int(read_dataset('farms', data_dir=self.models_dir)['value'].iloc[0])
+
+    def test_most_recent_layout_wins(self):
+        self.assertIsNone(dataset_path('farms', self.models_dir))
+
+        self.write('shards', 1, 1_000_000_000)
+        self.write('parquet', 2, 2_000_000_000)
+        self.assertEqual(dataset_path('farms', self.models_dir).name, 'farms.parquet')
+        self.assertEqual(self.read_value(), 2)
+
+        self.write('csv', 3, 3_000_000_000)
+        self.assertEqual(self.read_value(), 3)
+
+        self.write('shards', 4, 4_000_000_000)
+        self.assertEqual(dataset_path('farms', self.models_dir), self.models_dir / 'farms')
+        self.assertEqual(self.read_value(), 4)
+
+    def test_incomplete_shard_directory_is_ignored(self):
+        self.write('csv', 1, 1_000_000_000)
+        (self.models_dir / 'farms').mkdir()
+        self.assertEqual(dataset_path('farms', self.models_dir).name, 'farms.csv')
+
+
+class DatasetFilterTests(TemporaryModelsDirMixin, SimpleTestCase):
+    """Projection et filtres : mêmes résultats en Parquet, en CSV et en shards"""
+
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(0)
+        n_rows = 2000
+        self.df = pd.DataFrame({
+            'crop': rng.choice(['Maïs', 'Riz', 'Manioc', 'Cacao'], n_rows),
+            'market': rng.choice(['Yaoundé', 'Douala', 'Garoua'], n_rows),
+            'price_per_kg': rng.uniform(50, 1500, n_rows),
+            'quantity_kg': rng.integers(10, 5000, n_rows),
+        })
+        self.layouts = {}
+        for layout in ('parquet', 'csv', 'shards'):
+            directory = self.models_dir / layout
+            directory.mkdir()
+            if layout == 'parquet':
+                self.df.to_parquet(directory / 'market_prices.parquet', index=False)
+            elif layout == 'csv':
+                self.df.to_csv(directory / 'market_prices.csv', index=False)
+            else:
+                shards = directory / 'market_prices'
+                shards.mkdir()
+                parts = []
+                for shard, start in enumerate(range(0, n_rows, 700)):
+                    parts.append({'file': f'part-{shard:05d}.parquet'})
+                    self.df.iloc[start:start + 700].to_parquet(shards / parts[-1]['file'], index=False)
+                (shards / MANIFEST_NAME).write_text(json.dumps({'shards': parts}), encoding='utf-8')
+            self.layouts[layout] = directory
+
+    def read(self, layout: str, **options) -> pd.DataFrame:
+        return read_dataset('market_prices', data_dir=self.layouts[layout], **options)
+
+    def assert_same_in_all_layouts(self, expected: pd.DataFrame, **options):
+        for layout in self.layouts:
+            with self.subTest(layout=layout):
+                pd.testing.assert_frame_equal(
+                    self.read(layout, **options), expected.reset_index(drop=True), check_exact=True
+                )
+
+    def test_projection_with_filters_on_other_columns(self):
+        # Colonnes filtrées absentes de la projection : lues puis retirées (CSV)
+        filters = [('crop', 'in', ['Maïs', 'Riz']), ('price_per_kg', '>', 700.0)]
+        mask = self.df['crop'].isin(['Maïs', 'Riz']) & (self.df['price_per_kg'] > 700.0)
+        expected = self.df.loc[mask, ['market', 'quantity_kg']]
+        self.assertGreater(len(expected), 0)
+        self.assert_same_in_all_layouts(expected, columns=['market', 'quantity_kg'], filters=filters)
+
+    def test_projection_including_filter_column(self):
+        filters = [('market', '!=', 'Douala'), ('quantity_kg', '<=', 1000)]
+        mask = (self.df['market'] != 'Douala') & (self.df['quantity_kg'] <= 1000)
+        expected = self.df.loc[mask, ['quantity_kg', 'crop']]
+        self.assert_same_in_all_layouts(expected, columns=['quantity_kg', 'crop'], filters=filters)
+
+    def test_filters_without_projection(self):
+        filters = [('crop', 'not in', ['Cacao'])]
+        self.assert_same_in_all_layouts(self.df[self.df['crop'] != 'Cacao'], filters=filters)
+
+    def test_unknown_operator(self):
+        with self.assertRaises(ValueError):
+            self.read('csv', filters=[('crop', 'like', 'M%')])
+
+
+def farms_dataset(n_rows: int, seed: int = 0, learnable: bool = True, crops=('Maïs', 'Manioc', 'Riz')) -> pd.DataFrame:
+    """
+    Dataset farms minimal ; learnable=False : culture et rendement tirés
+    indépendamment des features (comme _farm_chunk du scraper)
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'temperature_avg': rng.uniform(20, 35, n_rows),
+        'humidity_percent': rng.uniform(40, 90, n_rows),
+        'rainfall_mm': rng.uniform(500, 2000, n_rows),
+        'soil_ph': rng.uniform(5, 8, n_rows),
+        'area_hectares': rng.uniform(0.5, 10, n_rows),
+        'npk_kg_ha': rng.uniform(0, 200, n_rows),
+        'irrigation_available': rng.integers(0, 2, n_rows),
+    })
+    if learnable:
+        df['crop'] = np.where(df['temperature_avg'] > 27, crops[2], np.where(df['rainfall_mm'] < 1000, crops[0], crops[1]))
+        df['yield_kg_ha'] = 100 * df['temperature_avg'] + 5 * df['npk_kg_ha'] + rng.normal(0, 50, n_rows)
+    else:
+        df['crop'] = rng.choice(list(crops), n_rows)
+        df['yield_kg_ha'] = rng.uniform(500, 5000, n_rows)
+    return df
+
+
+@override_settings(ML_PUBLISH_TOLERANCE=0.01)
+class TrainingPipelineTests(TemporaryModelsDirMixin, SimpleTestCase):
+    PARAMS = {'crop_recommender': {'n_estimators': 20}, 'yield_predictor': {'n_estimators': 20}}
+
+    def setUp(self):
+        super().setUp()
+        self.data_dir = self.models_dir / 'datasets'
+        self.data_dir.mkdir()
+
+    def train(self, df: pd.DataFrame, params: dict = None, **options) -> dict:
+        df.to_csv(self.data_dir / 'farms.csv', index=False)
+        return TrainingPipeline(data_dir=self.data_dir, n_jobs=1, params=params or self.PARAMS, **options).run()
+
+    def test_new_versions_are_not_served_by_default(self):
+        results = self.train(farms_dataset(1000))
+
+        for name in ('crop_recommender', 'yield_predictor'):
+            self.assertFalse(results[name]['published'])
+            self.assertIsNone(results[name]['quality_gate'])
+            self.assertIsNone(current_version(name))
+
+    def test_model_no_better_than_trivial_is_not_published(self):
+        results = self.train(farms_dataset(1000, learnable=False), publish=True)
+
+        for name in ('crop_recommender', 'yield_predictor'):
+            self.assertFalse(results[name]['published'])
+            self.assertIn('triviale', results[name]['quality_gate']['reason'])
+            self.assertIsNone(current_version(name))
+
+    def test_worse_model_keeps_served_version(self):
+        first = self.train(farms_dataset(2000), publish=True)
+        for name in ('crop_recommender', 'yield_predictor'):
+            self.assertTrue(first[name]['published'])
+            self.assertEqual(current_version(name), first[name]['version'])
+
+        shallow = {name: {'n_estimators': 5, 'max_depth': 1} for name in self.PARAMS}
+        second = self.train(farms_dataset(2000), params=shallow, publish=True)
+
+        for name in ('crop_recommender', 'yield_predictor'):
+            gate = second[name]['quality_gate']
+            self.assertFalse(second[name]['published'])
+            self.assertEqual(gate['current']['version'], first[name]['version'])
+            self.assertIn('moins bon', gate['reason'])
+            self.assertEqual(current_version(name), first[name]['version'])
+
+    def test_crop_classes_change_is_not_published(self):
+        first = self.train(farms_dataset(2000), publish=True)
+        second = self.train(farms_dataset(2000, seed=1, crops=('Maïs', 'Sorgho', 'Riz')), publish=True)
+
+        self.assertFalse(second['crop_recommender']['published'])
+        self.assertIn('cultures différentes', second['crop_recommender']['quality_gate']['reason'])
+        self.assertEqual(current_version('crop_recommender'), first['crop_recommender']['version'])
+
+
+def season_batch(n_rows: int, seed: int):
+    """(X, y, filigrane, ignorées) comme IncrementalYieldTrainer.season_features"""
+    X, y = YieldPredictor.generate_training_data(n_rows, seed=seed)
+    return X.astype(np.float32), y, {'updated_at': f'2026-01-{seed + 1:02d}T00:00:00', 'id': seed}, 0
+
+
+@override_settings(ML_TRAINING_N_JOBS=1, ML_INCREMENTAL_HOLDOUT=0.25)
+class IncrementalYieldTrainerTests(TemporaryModelsDirMixin, SimpleTestCase):
+    BASE_TREES = 20
+
+    def setUp(self):
+        super().setUp()
+        X, y = YieldPredictor.generate_training_data(500, seed=100)
+        scaler = StandardScaler().fit(X)
+        model = RandomForestRegressor(n_estimators=self.BASE_TREES, max_depth=6, random_state=0)
+        model.fit(scaler.transform(X), y)
+        save_version('yield_predictor', 'base', model, scaler, {'version': 'base'})
+        publish_version('yield_predictor', 'base')
+        self.base_thresholds = [tree.tree_.threshold for tree in model.estimators_]
+
+    def served_model(self):
+        return joblib.load(artifact_paths('yield_predictor', current_dir('yield_predictor'))[0])
+
+    def run_trainer(self, seed: int, **options) -> dict:
+        options = {'trees': 5, 'max_trees': 30, 'min_rows': 20, **options}
+        with mock.patch.object(IncrementalYieldTrainer, 'season_features', return_value=season_batch(80, seed)):
+            return IncrementalYieldTrainer(**options).run()
+
+    @override_settings(ML_PUBLISH_TOLERANCE=1e6)
+    def test_base_trees_survive_many_runs(self):
+        for seed in range(6):
+            result = self.run_trainer(seed)
+            self.assertEqual(current_version('yield_predictor'), result['version'])
+
+        model = self.served_model()
+        self.assertEqual(result['base_trees'], self.BASE_TREES)
+        self.assertEqual(len(model.estimators_), 30)
+        for tree, thresholds in zip(model.estimators_, self.base_thresholds):
+            np.testing.assert_array_equal(tree.tree_.threshold, thresholds)
+        self.assertEqual(result['metrics']['train_rows'] + result['metrics']['test_rows'], 80)
+        self.assertEqual(result['metrics']['test_rows'], 20)
+
+    @override_settings(ML_PUBLISH_TOLERANCE=-0.99)
+    def test_worse_holdout_mae_is_not_published(self):
+        result = self.run_trainer(0)
+
+        self.assertEqual(result['skipped'], 'quality')
+        self.assertIsNone(result['watermark'])
+        self.assertIn('mae_holdout_after', result['metrics'])
+        self.assertEqual(current_version('yield_predictor'), 'base')
+        self.assertEqual(len(self.served_model().estimators_), self.BASE_TREES)
+
+    def test_max_trees_must_leave_room_beside_base_trees(self):
+        with self.assertRaises(ValueError):
+            self.run_trainer(0, max_trees=self.BASE_TREES + 4)
+
+
+class ArtifactVersionTests(TemporaryModelsDirMixin, SimpleTestCase):
+    def save(self, version: str):
+        save_version('yield_predictor', version, {'version': version}, None, {'version': version})
+
+    def test_same_second_versions_sort_in_creation_order(self):
+        with mock.patch('ml_models.artifacts.datetime') as clock:
+            clock.now.return_value.strftime.return_value = '20260101-120000'
+            created = []
+            for _ in range(12):
+                created.append(new_version('yield_predictor'))
+                self.save(created[-1])
+
+        self.assertEqual(created[:3], ['20260101-120000', '20260101-120000-001', '20260101-120000-002'])
+        self.assertEqual(sorted(created), created)
+
+        publish_version('yield_predictor', created[-1])
+        prune_versions('yield_predictor', keep=3)
+        remaining = sorted(path.name for path in (self.models_dir / 'versions' / 'yield_predictor').iterdir()
+                           if path.is_dir())
+        self.assertEqual(remaining, created[-3:])
+
+    @override_settings(ML_SYNTHETIC_SAMPLES=400, ML_PREDICTION_CACHE_ENABLED=False)
+    def test_concurrent_first_start_publishes_once(self):
+        # Workers démarrés ensemble sur un répertoire vide
+        start = threading.Barrier(4)
+        predictors = []
+
+        def worker():
+            start.wait()
+            predictors.append(YieldPredictor())
+
+        with mock.patch('ml_models.predictor.publish_version', wraps=publish_version) as publish:
+            threads = [threading.Thread(target=worker) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(publish.call_count, 1)
+        self.assertEqual(len(predictors), 4)
+        self.assertEqual({predictor.model_version for predictor in predictors}, {current_version('yield_predictor')})
+
+    def test_failed_write_keeps_previous_file(self):
+        path = self.models_dir / 'CURRENT'
+        path.write_text('ancienne\n')
+
+        def write(tmp_path):
+            Path(tmp_path).write_text('nouv')
+            raise OSError('disque plein')
+
+        with self.assertRaises(OSError):
+            write_atomic(path, write)
+        self.assertEqual(path.read_text(), 'ancienne\n')
+        self.assertEqual(list(self.models_dir.iterdir()), [path])
+
+
+@override_settings(ML_INFERENCE_BACKEND='sklearn', ML_SEARCH_MAX_LATENCY_MS=None)
+class HyperparameterSearchTests(SimpleTestCase):
+    def test_crop_labels_are_searched_and_decoded(self):
+        X, y = CropRecommender.generate_training_data(300, seed=3)
+        report = HyperparameterSearch('crop_recommender', n_candidates=3, cv=2, n_jobs=2).run(X, y)
+
+        self.assertEqual(len(report['candidates']), 3)
+        self.assertEqual(report['classes'], sorted(set(y)))
+        self.assertIsNotNone(report['best'])
+
+        baseline, = [result for result in report['candidates'] if result['baseline']]
+        self.assertEqual(baseline['params'], BASELINES['crop_recommender'])
+        self.assertTrue(baseline['within_budget'])
+        self.assertAlmostEqual(
+            report['budget']['latency_ms'], baseline['latency_ms'] * BASELINE_LATENCY_MARGIN, places=3
+        )
+
+    @override_settings(ML_SEARCH_MAX_LATENCY_MS=1e6)
+    def test_fixed_latency_budget_is_kept(self):
+        X, y = YieldPredictor.generate_training_data(200, seed=3)
+        report = HyperparameterSearch('yield_predictor', n_candidates=2, cv=2, n_jobs=1).run(X, y)
+
+        self.assertEqual(report['budget']['latency_ms'], 1e6)
+        self.assertIsNone(report['classes'])
+        self.assertTrue(all(result['within_budget'] for result in report['candidates']))
+
+    def test_search_without_any_evaluated_candidate_raises(self):
+        # Une ligne par culture : aucun pli stratifié possible
+        X = np.random.default_rng(0).uniform(size=(4, 4))
+        y = np.array(['Maïs', 'Riz', 'Manioc', 'Tomate'], dtype=object)
+
+        with self.assertRaises(RuntimeError):
+            HyperparameterSearch('crop_recommender', n_candidates=2, cv=2, n_jobs=1).run(X, y)
+
+
+@override_settings(
+    ML_MODEL_RELOAD_INTERVAL=0, ML_SYNTHETIC_SAMPLES=400, ML_INFERENCE_BACKEND='sklearn',
+    ML_PREDICTION_CACHE_ENABLED=False,
+)
+class ModelRegistryReloadTests(TemporaryModelsDirMixin, SimpleTestCase):
+    """Remplacement à chaud : publication d'une version pendant que le registre sert"""
+
+    NAME = 'yield_predictor'
+
+    def setUp(self):
+        super().setUp()
+        self.loading = threading.Event()
+        self.release = threading.Event()
+        self.block_loads = False
+        self.loads = 0
+        self.during_load = None
+        self.registry = ModelRegistry()
+        self.registry.register(self.NAME, self.factory, stamp=lambda: pointer_stamp(self.NAME))
+        self.first = self.registry.get(self.NAME)
+        self.block_loads = True
+
+    def factory(self):
+        self.loads += 1
+        if self.block_loads:
+            self.loading.set()
+            self.release.wait(10)
+            if self.during_load is not None:
+                self.during_load()
+        return YieldPredictor()
+
+    def publish(self, broken: bool = False) -> str:
+        version = new_version(self.NAME)
+        X, y = YieldPredictor.generate_training_data(200, seed=len(version))
+        scaler = StandardScaler().fit(X)
+        model = RandomForestRegressor(n_estimators=5, max_depth=4, random_state=0).fit(scaler.transform(X), y)
+        version_dir = save_version(self.NAME, version, model, scaler, {'version': version})
+        if broken:
+            (version_dir / 'model.pkl').write_bytes(b'pas un pickle')
+        publish_version(self.NAME, version)
+        return version
+
+    def finish_reload(self):
+        self.release.set()
+        self.registry._reload_threads[self.NAME].join(10)
+
+    def test_old_instance_served_until_new_version_loaded(self):
+        version = self.publish()
+
+        self.assertIs(self.registry.get(self.NAME), self.first)
+        self.assertTrue(self.loading.wait(10))
+        # Chargement en cours : l'ancienne instance sert, un seul thread de rechargement
+        for _ in range(5):
+            self.assertIs(self.registry.get(self.NAME), self.first)
+        self.assertEqual(self.loads, 2)
+
+        self.finish_reload()
+        reloaded = self.registry.get(self.NAME)
+        self.assertIsNot(reloaded, self.first)
+        self.assertEqual(reloaded.model_version, version)
+        self.assertEqual(self.registry.stats()[self.NAME]['reloads'], 1)
+        self.assertEqual(self.registry.stats()[self.NAME]['model_version'], version)
+
+    def test_broken_version_keeps_previous_instance(self):
+        self.publish(broken=True)
+        self.registry.get(self.NAME)
+        self.assertTrue(self.loading.wait(10))
+        with self.assertLogs('ml_models.registry', 'ERROR'):
+            self.finish_reload()
+
+        self.assertIs(self.registry.get(self.NAME), self.first)
+        self.assertEqual(self.registry.stats()[self.NAME]['reloads'], 0)
+        # Empreinte de la version cassée enregistrée : pas de nouvel essai
+        self.assertEqual(self.registry._stamps[self.NAME], pointer_stamp(self.NAME))
+        self.registry.get(self.NAME)
+        self.assertEqual(self.loads, 2)
+
+    def test_publication_during_load_triggers_another_reload(self):
+        self.publish()
+        later = []
+        self.during_load = lambda: later.append(self.publish())
+
+        self.registry.get(self.NAME)
+        self.assertTrue(self.loading.wait(10))
+        self.finish_reload()
+
+        # Empreinte relevée avant la fabrique : la version publiée pendant le
+        # chargement est détectée à la vérification suivante
+        self.assertNotEqual(self.registry._stamps[self.NAME], pointer_stamp(self.NAME))
+        self.during_load = None
+        self.registry.get(self.NAME)
+        self.registry._reload_threads[self.NAME].join(10)
+        self.assertEqual(self.registry.get(self.NAME).model_version, later[0])
+        self.assertEqual(self.registry.stats()[self.NAME]['reloads'], 2)
+
+    @override_settings(ML_MODEL_RELOAD_INTERVAL=3600)
+    def test_stamp_polled_at_reload_interval(self):
+        stamp = mock.Mock(side_effect=lambda: pointer_stamp(self.NAME))
+        self.registry.register(self.NAME, self.factory, stamp=stamp)
+        self.registry._last_check[self.NAME] = 0.0
+        self.publish()
+
+        with mock.patch('ml_models.registry.time.monotonic', return_value=10_000.0):
+            for _ in range(3):
+                self.assertIs(self.registry.get(self.NAME), self.first)
+        # Une vérification, puis l'empreinte relevée par le thread avant la fabrique
+        self.assertTrue(self.loading.wait(10))
+        self.assertEqual(stamp.call_count, 2)
+
+        with mock.patch('ml_models.registry.time.monotonic', return_value=10_000.0 + 1800):
+            self.registry.get(self.NAME)
+        self.assertEqual(stamp.call_count, 2)
+        self.finish_reload()
+
+        with mock.patch('ml_models.registry.time.monotonic', return_value=10_000.0 + 3600):
+            self.assertEqual(self.registry.get(self.NAME).model_version, current_version(self.NAME))
+        self.assertEqual(stamp.call_count, 3)
@@ -0,0 +1,553 @@
+"""
+Pipeline d'entraînement sur les datasets scrapés (data_scraper)
+
+- lecture des datasets par lots (iter_dataset_batches), features float32
+- entraînement des forêts sur tous les coeurs (n_jobs=-1)
+- artefacts versionnés : versions/<modèle>/<version>/ avec modèle,
+  scaler et metadata.json (métriques, paramètres, étapes)
+- publication sur demande, après contrôle qualité sur la holdout, par
+  bascule atomique du pointeur CURRENT (ml_models.artifacts)
+- réentraînement incrémental du rendement sur les CropSeason récoltées
+- temps et pic mémoire mesurés pour chaque étape
+"""
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+import logging
+
+import joblib
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from sklearn.base import is_classifier
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.metrics import accuracy_score, f1_score, mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+
+from .artifacts import (
+    artifact_paths, current_dir, new_version, publish_version, read_metadata, save_version,
+    versions_dir, write_metadata,
+)
+from .datasets import dataset_path, iter_dataset_batches
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Feature du prédicteur -> colonne du dataset farms, dans l'ordre de
+# CropRecommender.FEATURES / YieldPredictor.FEATURES
+CROP_FEATURE_COLUMNS = {
+    'temperature': 'temperature_avg',
+    'humidity': 'humidity_percent',
+    'rainfall': 'rainfall_mm',
+    'soil_ph': 'soil_ph',
+}
+YIELD_FEATURE_COLUMNS = {
+    'area_hectares': 'area_hectares',
+    'temperature': 'temperature_avg',
+    'rainfall': 'rainfall_mm',
+    'soil_ph': 'soil_ph',
+    'fertilizer_npk': 'npk_kg_ha',
+    'irrigation': 'irrigation_available',
+}
+
+
+def _rss_peak_mb():
+    """Pic de mémoire résidente du processus depuis son démarrage (Mo)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux : Ko, macOS : octets
+    return round(peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+class StageReport:
+    """
+    Temps et mémoire par étape
+
+    - seconds : durée (horloge murale)
+    - python_peak_mb : pic des allocations suivies par tracemalloc pendant
+      l'étape (objets Python et tableaux NumPy)
+    - rss_peak_mb : pic de mémoire résidente du processus à la fin de
+      l'étape (inclut les allocations natives, ex: arbres sklearn)
+    """
+
+    def __init__(self):
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name: str):
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            _, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+            self.stages.append({
+                'stage': name,
+                'seconds': round(time.perf_counter() - started, 3),
+                'python_peak_mb': round(peak / 1024 ** 2, 1),
+                'rss_peak_mb': _rss_peak_mb(),
+            })
+            logger.info(f"Étape {name}: {self.stages[-1]}")
+
+
+def holdout_metrics(model, scaler, X: np.ndarray, y: np.ndarray) -> dict:
+    """Métriques d'un modèle sur des lignes qu'il n'a pas vues"""
+    predicted = model.predict(scaler.transform(X))
+    if is_classifier(model):
+        return {
+            'accuracy': round(float(accuracy_score(y, predicted)), 4),
+            'f1_macro': round(float(f1_score(y, predicted, average='macro')), 4),
+        }
+    return {
+        'mae': round(float(mean_absolute_error(y, predicted)), 2),
+        'rmse': round(float(np.sqrt(mean_squared_error(y, predicted))), 2),
+        'r2': round(float(r2_score(y, predicted)), 4),
+    }
+
+
+def format_stages(stages: list) -> str:
+    """Tableau texte des étapes d'un StageReport"""
+    lines = [f"{'Étape':<32} {'Durée (s)':>10} {'Pic Python (Mo)':>16} {'Pic RSS (Mo)':>13}"]
+    for stage in stages:
+        rss = '-' if stage['rss_peak_mb'] is None else f"{stage['rss_peak_mb']:.1f}"
+        lines.append(
+            f"{stage['stage']:<32} {stage['seconds']:>10.2f} {stage['python_peak_mb']:>16.1f} {rss:>13}"
+        )
+    return '\n'.join(lines)
+
+
+class TrainingPipeline:
+    """
+    Entraîne CropRecommender et YieldPredictor sur farms
+
+    Les nouvelles versions sont sauvegardées sans être servies. Avec
+    publish=True, chacune n'est publiée que si elle passe quality_gate ;
+    sinon elle reste disponible pour train_models.py --publish.
+
+    Args:
+        data_dir: répertoire des datasets (SCRAPED_DATA_DIR par défaut)
+        batch_size: lignes lues par lot
+        n_jobs: coeurs utilisés par les forêts (-1 = tous)
+        test_size: part des données gardée pour l'évaluation
+        publish: servir les nouvelles versions qui passent le contrôle qualité
+        params: hyperparamètres par modèle remplaçant ceux par défaut
+            (ex: meilleure configuration de ml_models.search)
+    """
+
+    def __init__(self, data_dir=None, batch_size: int = 100000, n_jobs: int = None,
+                 test_size: float = 0.2, publish: bool = False, seed: int = 42, params: dict = None):
+        self.data_dir = Path(data_dir or settings.SCRAPED_DATA_DIR)
+        self.batch_size = batch_size
+        self.n_jobs = settings.ML_TRAINING_N_JOBS if n_jobs is None else n_jobs
+        self.test_size = test_size
+        self.publish = publish
+        self.seed = seed
+        self.params = params or {}
+        self.report = StageReport()
+
+    def run(self) -> dict:
+        """
+        Exécute toutes les étapes
+
+        Returns:
+            {'crop_recommender': metadata, 'yield_predictor': metadata,
+             'stages': [...]}
+
+        Raises:
+            FileNotFoundError: si le dataset farms est absent
+        """
+        if dataset_path('farms', self.data_dir) is None:
+            raise FileNotFoundError(
+                f"Dataset farms introuvable dans {self.data_dir} "
+                "(cd data_scraper && python scraper.py)"
+            )
+
+        version = new_version('yield_predictor')
+
+        with self.report.stage('lecture farms + features'):
+            features = self.build_farm_features()
+
+        results = {}
+        for name, target, columns, estimator in (
+            ('crop_recommender', 'crop', CROP_FEATURE_COLUMNS, self._classifier()),
+            ('yield_predictor', 'yield_kg_ha', YIELD_FEATURE_COLUMNS, self._regressor()),
+        ):
+            X, y = features[name]
+            with self.report.stage(f'entraînement {name}'):
+                model, scaler, metrics, (X_test, y_test) = self.fit(estimator, X, y)
+
+            gate = None
+            if self.publish:
+                with self.report.stage(f'contrôle qualité {name}'):
+                    gate = self.quality_gate(name, model, scaler, metrics, X_test, y_test)
+
+            with self.report.stage(f'sauvegarde {name}'):
+                metadata = {
+                    'model': name,
+                    'version': version,
+                    'created_at': datetime.now().isoformat(),
+                    'features': list(columns),
+                    'target': target,
+                    'dataset': {
+                        'name': 'farms',
+                        'path': str(dataset_path('farms', self.data_dir)),
+                        'rows': int(len(y)),
+                    },
+                    'params': model.get_params(),
+                    'metrics': metrics,
+                    'quality_gate': gate,
+                    'published': bool(gate and gate['passed']),
+                }
+                version_dir = save_version(name, version, model, scaler, metadata)
+                if metadata['published']:
+                    publish_version(name, version)
+                elif gate is not None:
+                    logger.warning(f"{name} v{version} non publié: {gate['reason']}")
+            results[name] = metadata
+            logger.info(f"{name} v{version}: {metrics} -> {version_dir}")
+
+        # Étapes complètes dans chaque metadata.json (écrit une seconde fois)
+        for name, metadata in results.items():
+            metadata['stages'] = self.report.stages
+            write_metadata(versions_dir() / name / version, metadata)
+
+        results['stages'] = self.report.stages
+        return results
+
+    # Lecture et features
+
+    def build_farm_features(self) -> dict:
+        """
+        Lit farms par lots et construit les matrices float32 des deux modèles
+
+        Returns:
+            {'crop_recommender': (X, y), 'yield_predictor': (X, y)}
+        """
+        columns = sorted(set(CROP_FEATURE_COLUMNS.values()) | set(YIELD_FEATURE_COLUMNS.values())
+                         | {'crop', 'yield_kg_ha'})
+        parts = {'crop_X': [], 'crop_y': [], 'yield_X': [], 'yield_y': []}
+
+        for df in iter_dataset_batches('farms', columns=columns, batch_size=self.batch_size, data_dir=self.data_dir):
+            df = df.dropna()
+            parts['crop_X'].append(self._matrix(df, CROP_FEATURE_COLUMNS))
+            parts['crop_y'].append(df['crop'].astype(str).to_numpy())
+            parts['yield_X'].append(self._matrix(df, YIELD_FEATURE_COLUMNS))
+            parts['yield_y'].append(df['yield_kg_ha'].to_numpy(dtype=np.float32))
+
+        arrays = {key: np.concatenate(values) for key, values in parts.items()}
+        logger.info(f"Features farms: {len(arrays['crop_y'])} lignes")
+        return {
+            'crop_recommender': (arrays['crop_X'], arrays['crop_y']),
+            'yield_predictor': (arrays['yield_X'], arrays['yield_y']),
+        }
+
+    @staticmethod
+    def _matrix(df: pd.DataFrame, columns: dict) -> np.ndarray:
+        """Colonnes du dataset dans l'ordre des features du prédicteur"""
+        return np.column_stack([df[column].to_numpy(dtype=np.float32) for column in columns.values()])
+
+    # Entraînement
+
+    def _classifier(self):
+        """Hyperparamètres de CropRecommender._create_and_train_model, sauf params"""
+        estimator = RandomForestClassifier(n_estimators=100, max_depth=10, random_state=self.seed, n_jobs=self.n_jobs)
+        return estimator.set_params(**self.params.get('crop_recommender', {}))
+
+    def _regressor(self):
+        """Hyperparamètres de YieldPredictor._create_and_train_model, sauf params"""
+        estimator = RandomForestRegressor(n_estimators=100, max_depth=15, random_state=self.seed, n_jobs=self.n_jobs)
+        return estimator.set_params(**self.params.get('yield_predictor', {}))
+
+    def fit(self, estimator, X: np.ndarray, y: np.ndarray):
+        """
+        Entraîne sur (1 - test_size) des lignes et évalue sur le reste
+
+        Returns:
+            (modèle, scaler, métriques, (X_test, y_test))
+        """
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=self.test_size, random_state=self.seed
+        )
+        scaler = StandardScaler()
+        estimator.fit(scaler.fit_transform(X_train), y_train)
+
+        metrics = holdout_metrics(estimator, scaler, X_test, y_test)
+        metrics.update({'train_rows': int(len(y_train)), 'test_rows': int(len(y_test))})
+
+        # Prédiction dans les requêtes web : pas de pool de threads par appel
+        estimator.set_params(n_jobs=None)
+        return estimator, scaler, metrics, (X_test, y_test)
+
+    @staticmethod
+    def quality_gate(name: str, model, scaler, metrics: dict, X_test: np.ndarray, y_test: np.ndarray) -> dict:
+        """
+        Contrôle avant publication, sur la holdout de l'entraînement
+
+        - le modèle doit battre la prédiction triviale : classe majoritaire
+          (accuracy) ou moyenne (R² > 0)
+        - le classifieur doit prédire les mêmes cultures que la version
+          servie (un changement de classes se publie à la main)
+        - il ne doit pas être moins bon que la version servie, évaluée sur
+          les mêmes lignes, à ML_PUBLISH_TOLERANCE près
+
+        Returns:
+            {'passed': bool, 'reason': str, 'baseline': ..., 'current': ...}
+        """
+        tolerance = settings.ML_PUBLISH_TOLERANCE
+        classifier = is_classifier(model)
+        if classifier:
+            _, counts = np.unique(y_test, return_counts=True)
+            baseline = {'accuracy': round(float(counts.max() / counts.sum()), 4)}
+            trivial = metrics['accuracy'] <= baseline['accuracy']
+        else:
+            baseline = {'r2': 0.0}
+            trivial = metrics['r2'] <= baseline['r2']
+        gate = {'passed': False, 'baseline': baseline, 'current': None}
+        if trivial:
+            gate['reason'] = f"pas meilleur que la prédiction triviale {baseline}"
+            return gate
+
+        version_dir = current_dir(name)
+        model_path, scaler_path, _ = artifact_paths(name, version_dir)
+        if not model_path.exists():
+            gate.update(passed=True, reason="aucune version servie")
+            return gate
+        current_model = joblib.load(model_path)
+        current_scaler = joblib.load(scaler_path)
+
+        current = {'version': version_dir.name if version_dir is not None else None}
+        gate['current'] = current
+        if classifier and set(current_model.classes_) != set(model.classes_):
+            gate['reason'] = (
+                f"cultures différentes de la version servie "
+                f"({sorted(map(str, current_model.classes_))} -> {sorted(map(str, model.classes_))})"
+            )
+            return gate
+
+        current['metrics'] = holdout_metrics(current_model, current_scaler, X_test, y_test)
+        if classifier:
+            worse = metrics['accuracy'] < current['metrics']['accuracy'] * (1 - tolerance)
+        else:
+            worse = metrics['mae'] > current['metrics']['mae'] * (1 + tolerance)
+        if worse:
+            gate['reason'] = f"moins bon que la version servie {current['metrics']}"
+            return gate
+
+        gate.update(passed=True, reason=f"au moins aussi bon que la version servie {current['metrics']}")
+        return gate
+
+
+class IncrementalYieldTrainer:
+    """
+    Réentraînement incrémental de YieldPredictor à partir des saisons récoltées
+
+    Seules les CropSeason modifiées depuis la version servie (filigrane
+    (updated_at, id) enregistré dans metadata.json) sont lues. Une part
+    `holdout` de ces saisons est mise de côté ; le modèle publié est
+    complété par `trees` nouveaux arbres entraînés sur les autres
+    (warm_start), avec le scaler existant. Les anciens arbres ne sont pas
+    réentraînés : un rafraîchissement coûte le temps de `trees` arbres sur
+    les nouvelles lignes.
+
+    Les arbres du modèle de base (entraîné hors incrémental, nombre
+    enregistré dans metadata.json sous base_trees) ne sont jamais retirés ;
+    au-delà de `max_trees`, ce sont les arbres incrémentaux les plus
+    anciens qui sortent, pour borner la latence.
+
+    La nouvelle version n'est publiée que si son MAE sur les saisons mises
+    de côté ne dépasse pas celui de la version servie (à
+    ML_PUBLISH_TOLERANCE près). Sinon rien n'est sauvegardé et le
+    filigrane n'avance pas : ces saisons seront relues au passage suivant,
+    avec les nouvelles.
+
+    Features d'une saison (ordre de YieldPredictor.FEATURES) :
+    - area_hectares : area_planted
+    - temperature : moyenne de temperature_avg entre plantation et récolte
+    - rainfall : pluie journalière moyenne de la même période x 365
+      (même échelle annuelle que les données d'entraînement)
+    - soil_ph : pH de la ferme
+    - fertilizer_npk : npk_amount (0 si absent)
+    - irrigation : 1 si irrigation_type est renseigné et différent de « Aucune »
+
+    À lancer chaque nuit (cron) : python train_models.py --incremental
+    """
+
+    name = 'yield_predictor'
+
+    def __init__(self, trees: int = None, max_trees: int = None, min_rows: int = None,
+                 holdout: float = None, n_jobs: int = None, seed: int = 42):
+        self.trees = trees or settings.ML_INCREMENTAL_TREES
+        self.max_trees = max_trees or settings.ML_INCREMENTAL_MAX_TREES
+        self.min_rows = min_rows or settings.ML_INCREMENTAL_MIN_ROWS
+        self.holdout = settings.ML_INCREMENTAL_HOLDOUT if holdout is None else holdout
+        self.n_jobs = settings.ML_TRAINING_N_JOBS if n_jobs is None else n_jobs
+        self.seed = seed
+        self.report = StageReport()
+
+    def run(self) -> dict:
+        """
+        Returns:
+            metadata de la nouvelle version, ou {'skipped': raison, ...}
+            si trop peu de nouvelles saisons ('rows') ou si la nouvelle
+            version est moins bonne sur la holdout ('quality') ; le
+            filigrane n'avance pas
+
+        Raises:
+            FileNotFoundError: si aucun modèle n'est publié
+            ValueError: si max_trees ne laisse pas de place aux nouveaux
+                arbres à côté des arbres de base
+        """
+        parent_dir = current_dir(self.name)
+        model_path, scaler_path, _ = artifact_paths(self.name, parent_dir)
+        if not model_path.exists():
+            raise FileNotFoundError(f"Aucun modèle publié à compléter: {model_path}")
+
+        previous = read_metadata(parent_dir) if parent_dir is not None else {}
+        watermark = previous.get('watermark')
+
+        with self.report.stage('lecture saisons'):
+            X, y, new_watermark, skipped = self.season_features(watermark)
+
+        if len(y) < self.min_rows:
+            logger.info(f"Réentraînement incrémental ignoré: {len(y)} nouvelles saisons (< {self.min_rows})")
+            return {'skipped': 'rows', 'rows': int(len(y)), 'min_rows': self.min_rows, 'watermark': watermark}
+
+        with self.report.stage('chargement modèle'):
+            model = joblib.load(model_path)
+            scaler = joblib.load(scaler_path)
+
+        trees_before = len(model.estimators_)
+        base_trees = previous.get('base_trees', trees_before)
+        if base_trees + self.trees > self.max_trees:
+            raise ValueError(
+                f"max_trees={self.max_trees} trop petit pour {base_trees} arbres de base "
+                f"+ {self.trees} nouveaux arbres (ML_INCREMENTAL_MAX_TREES)"
+            )
+
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=self.holdout, random_state=self.seed
+        )
+        X_train, X_test = scaler.transform(X_train), scaler.transform(X_test)
+
+        with self.report.stage('ajout arbres'):
+            mae_before = mean_absolute_error(y_test, model.predict(X_test))
+
+            model.set_params(warm_start=True, n_estimators=trees_before + self.trees, n_jobs=self.n_jobs)
+            model.fit(X_train, y_train)
+
+            # Forêt bornée : arbres de base conservés, les arbres incrémentaux
+            # les plus anciens sortent en premier
+            if len(model.estimators_) > self.max_trees:
+                model.estimators_ = (
+                    model.estimators_[:base_trees] + model.estimators_[base_trees - self.max_trees:]
+                )
+            model.set_params(warm_start=False, n_estimators=len(model.estimators_), n_jobs=None)
+            mae_after = mean_absolute_error(y_test, model.predict(X_test))
+
+        metrics = {
+            # Saisons mises de côté : jamais vues par l'ancien ni le nouveau modèle
+            'mae_holdout_before': round(float(mae_before), 2),
+            'mae_holdout_after': round(float(mae_after), 2),
+            'train_rows': int(len(y_train)),
+            'test_rows': int(len(y_test)),
+            'base_trees': base_trees,
+            'trees_before': trees_before,
+            'trees_after': len(model.estimators_),
+        }
+        if mae_after > mae_before * (1 + settings.ML_PUBLISH_TOLERANCE):
+            logger.warning(f"Réentraînement incrémental non publié: MAE holdout {mae_before:.2f} -> {mae_after:.2f}")
+            return {'skipped': 'quality', 'rows': int(len(y)), 'metrics': metrics, 'watermark': watermark}
+
+        version = new_version(self.name)
+        metadata = {
+            'model': self.name,
+            'version': version,
+            'parent': previous.get('version'),
+            'created_at': datetime.now().isoformat(),
+            'features': list(YIELD_FEATURE_COLUMNS),
+            'target': 'yield_kg_per_ha',
+            'dataset': {'name': 'crop_seasons', 'rows': int(len(y)), 'skipped': skipped},
+            'params': model.get_params(),
+            'metrics': metrics,
+            'base_trees': base_trees,
+            'watermark': new_watermark,
+        }
+
+        with self.report.stage('sauvegarde'):
+            save_version(self.name, version, model, scaler, metadata)
+            publish_version(self.name, version)
+
+        metadata['stages'] = self.report.stages
+        write_metadata(versions_dir() / self.name / version, metadata)
+        logger.info(f"{self.name} v{version} (incrémental, {len(y)} saisons): {metadata['metrics']}")
+        return metadata
+
+    @staticmethod
+    def season_features(watermark: dict = None):
+        """
+        Features des saisons récoltées modifiées après le filigrane
+
+        Returns:
+            (X float32, y, nouveau filigrane, saisons ignorées faute de
+            météo ou de pH)
+        """
+        from django.db.models import Q
+        from core.models import CropSeason, WeatherData
+
+        seasons = CropSeason.objects.filter(yield_kg_per_ha__isnull=False)
+        if watermark:
+            seasons = seasons.filter(
+                Q(updated_at__gt=watermark['updated_at'])
+                | Q(updated_at=watermark['updated_at'], id__gt=watermark['id'])
+            )
+        seasons = pd.DataFrame(list(seasons.order_by('updated_at', 'id').values(
+            'id', 'updated_at', 'farm_id', 'planting_date', 'actual_harvest_date', 'expected_harvest_date',
+            'area_planted', 'npk_amount', 'irrigation_type', 'yield_kg_per_ha', 'farm__soil_ph'
+        )))
+        if seasons.empty:
+            return np.empty((0, len(YIELD_FEATURE_COLUMNS)), dtype=np.float32), np.empty(0), watermark, 0
+
+        last = seasons.iloc[-1]
+        new_watermark = {'updated_at': last['updated_at'].isoformat(), 'id': int(last['id'])}
+
+        seasons['harvest_date'] = seasons['actual_harvest_date'].fillna(seasons['expected_harvest_date'])
+        weather = pd.DataFrame(list(WeatherData.objects.filter(
+            farm_id__in=seasons['farm_id'].unique(),
+            date__gte=seasons['planting_date'].min(),
+            date__lte=seasons['harvest_date'].max(),
+        ).values('farm_id', 'date', 'temperature_avg', 'rainfall_mm')))
+
+        if weather.empty:
+            climate = pd.DataFrame(columns=['temperature', 'rainfall'])
+        else:
+            # Relevés de chaque saison : même ferme, entre plantation et récolte
+            joined = seasons[['id', 'farm_id', 'planting_date', 'harvest_date']].merge(weather, on='farm_id')
+            joined = joined[joined['date'].between(joined['planting_date'], joined['harvest_date'])]
+            climate = joined.groupby('id').agg(temperature=('temperature_avg', 'mean'), rainfall=('rainfall_mm', 'mean'))
+            climate['rainfall'] *= 365
+
+        df = seasons.join(climate, on='id').dropna(subset=['temperature', 'rainfall', 'farm__soil_ph'])
+        irrigation = df['irrigation_type'].fillna('').str.strip()
+        X = np.column_stack([
+            df['area_planted'],
+            df['temperature'],
+            df['rainfall'],
+            df['farm__soil_ph'],
+            df['npk_amount'].fillna(0),
+            (irrigation != '') & (irrigation.str.lower() != 'aucune'),
+        ]).astype(np.float32)
+        return X, df['yield_kg_per_ha'].to_numpy(), new_watermark, int(len(seasons) - len(df))
@@ -4,6 +4,7 @@ Script d'entraînement de tous les modèles ML
 """
 import os
 import sys
+import argparse
 import django
 
 # Configuration Django
@@ -11,7 +12,13 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'agri_smart_project.settings')
 django.setup()
 
+from django.conf import settings
+from ml_models.datasets import dataset_path
 from ml_models.predictor import CropRecommender, YieldPredictor, DiseasePredictor
+from ml_models.artifacts import publish_version
+from ml_models.flat_forest import FlatForest, verify_parity, parity_sample
+from ml_models.search import HyperparameterSearch, format_report, save_report
+from ml_models.training import IncrementalYieldTrainer, TrainingPipeline, format_stages
 import logging
 
 logging.basicConfig(
@@ -21,19 +28,142 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def train_all_models():
-    """Entraîner tous les modèles ML"""
+def check_flat_engines(models):
+    """Vérifie la parité des moteurs d'inférence plat et compact avec sklearn"""
+    print("🔎 Vérification des moteurs d'inférence plat/compact (parité sklearn)...")
+    for name, model in models:
+        if model.model is None:
+            print(f"→ {name}: artefact compact à jour, forêt sklearn non chargée")
+            continue
+        try:
+            engine = FlatForest.from_sklearn(model.model, model.scaler)
+            sample = parity_sample(model.scaler)
+            max_diff = verify_parity(model.model, engine, sample, scaler=model.scaler)
+            print(f"✅ {name}: parité OK (écart max {max_diff:.2e}, "
+                  f"{len(engine.feature)} noeuds, profondeur {engine.max_depth})")
+            
+            compact = engine.compact()
+            max_diff = verify_parity(model.model, compact, sample, scaler=model.scaler)
+            print(f"✅ {name} compact: parité OK (écart max {max_diff:.2e}, "
+                  f"{engine.nbytes / 1024**2:.1f} MB → {compact.nbytes / 1024**2:.1f} MB)")
+        except Exception as e:
+            print(f"❌ {name}: {e}")
+
+
+def search_hyperparameters(data_dir=None, n_candidates=24, cv=3, max_rows=None):
+    """
+    Recherche d'hyperparamètres sur le dataset farms (jeu synthétique s'il
+    est absent) ; affiche et enregistre un rapport par modèle
+    
+    Returns:
+        Meilleurs paramètres dans le budget, par modèle
+    """
+    print("🔬 Recherche d'hyperparamètres (validation croisée, pool de processus)...")
+    if dataset_path('farms', data_dir) is not None:
+        features = TrainingPipeline(data_dir=data_dir).build_farm_features()
+        print(f"   Données: dataset farms ({len(features['crop_recommender'][1])} lignes)")
+    else:
+        features = {
+            'crop_recommender': CropRecommender.generate_training_data(settings.ML_SYNTHETIC_SAMPLES),
+            'yield_predictor': YieldPredictor.generate_training_data(settings.ML_SYNTHETIC_SAMPLES),
+        }
+        print(f"   Données: jeu synthétique ({settings.ML_SYNTHETIC_SAMPLES} lignes, dataset farms absent)")
+    
+    best = {}
+    for name, (X, y) in features.items():
+        try:
+            report = HyperparameterSearch(name, n_candidates=n_candidates, cv=cv, max_rows=max_rows).run(X, y)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            continue
+        print()
+        print(format_report(report))
+        print(f"   Rapport: {save_report(report)}")
+        if report['best'] is not None:
+            best[name] = report['best']['params']
+    print()
+    return best
+
+
+def train_from_datasets(data_dir=None, params=None, publish=False):
+    """
+    Entraîne les modèles à partir des datasets scrapés ; avec publish, sert
+    les nouvelles versions qui passent le contrôle qualité
+    """
+    print("📂 Entraînement sur les datasets scrapés...")
+    try:
+        results = TrainingPipeline(data_dir=data_dir, params=params, publish=publish).run()
+    except FileNotFoundError as e:
+        print(f"❌ {e}")
+        return False
+    
+    for name in ('crop_recommender', 'yield_predictor'):
+        metadata = results[name]
+        print(f"✅ {name} v{metadata['version']} ({metadata['dataset']['rows']} lignes): {metadata['metrics']}")
+        gate = metadata['quality_gate']
+        if metadata['published']:
+            print(f"   Publiée: {gate['reason']}")
+        elif gate is not None:
+            print(f"   ⚠️  Non publiée: {gate['reason']}")
+        else:
+            print(f"   Non publiée (servir avec: python train_models.py --publish {name} {metadata['version']})")
+    print()
+    print(format_stages(results['stages']))
+    print()
+    return True
+
+
+def train_incremental():
+    """Complète le modèle de rendement avec les saisons récoltées depuis la dernière version"""
+    print("🌱 Réentraînement incrémental du modèle de rendement...")
+    try:
+        result = IncrementalYieldTrainer().run()
+    except (FileNotFoundError, ValueError) as e:
+        print(f"❌ {e}")
+        return
+    
+    if result.get('skipped') == 'rows':
+        print(f"→ Ignoré: {result['rows']} nouvelles saisons récoltées (minimum {result['min_rows']})")
+        return
+    if result.get('skipped') == 'quality':
+        print(f"⚠️  Non publié (MAE holdout moins bon, {result['rows']} saisons): {result['metrics']}")
+        return
+    print(f"✅ yield_predictor v{result['version']} ({result['dataset']['rows']} saisons): {result['metrics']}")
+    print()
+    print(format_stages(result['stages']))
+
+
+def train_all_models(samples=None, from_datasets=False, data_dir=None, params=None, publish=False):
+    """
+    Entraîner tous les modèles ML
+    
+    Args:
+        samples: si fourni, réentraîne sur un jeu synthétique de cette taille
+            (sinon les modèles existants sont simplement chargés)
+        from_datasets: entraîne d'abord sur le dataset scrapé farms
+        params: hyperparamètres par modèle pour from_datasets (--search)
+        publish: avec from_datasets, servir les nouvelles versions qui
+            passent le contrôle qualité
+    """
     
     print("\n" + "="*60)
     print("🤖 ENTRAÎNEMENT DES MODÈLES ML - AGRI SMART")
     print("="*60 + "\n")
     
+    if from_datasets and not train_from_datasets(data_dir, params, publish):
+        return
+    
+    trained = []
+    
     # 1. CropRecommender
     print("📊 Entraînement du modèle de recommandation de cultures...")
     try:
         recommender = CropRecommender()
+        if samples:
+            recommender._create_and_train_model(n_samples=samples)
+        trained.append(('CropRecommender', recommender))
         print("✅ Modèle de recommandation créé et entraîné")
-        print(f"   Sauvegardé dans: ml_models/trained_models/crop_recommender.pkl")
+        print(f"   Version {recommender.model_version}: {recommender.model_path}")
     except Exception as e:
         print(f"❌ Erreur: {e}")
     
@@ -43,8 +173,11 @@ def train_all_models():
     print("📈 Entraînement du modèle de prédiction de rendement...")
     try:
         predictor = YieldPredictor()
+        if samples:
+            predictor._create_and_train_model(n_samples=samples)
+        trained.append(('YieldPredictor', predictor))
         print("✅ Modèle de prédiction créé et entraîné")
-        print(f"   Sauvegardé dans: ml_models/trained_models/yield_predictor.pkl")
+        print(f"   Version {predictor.model_version}: {predictor.model_path}")
     except Exception as e:
         print(f"❌ Erreur: {e}")
     
@@ -54,8 +187,25 @@ def train_all_models():
     print("🐛 Entraînement du modèle de risque de maladies...")
     try:
         disease_predictor = DiseasePredictor()
-        print("✅ Modèle de risque de maladies créé")
-        print(f"   Sauvegardé dans: ml_models/trained_models/disease_risk.pkl")
+        print("✅ Règles de risque de maladies créées")
+        print(f"   Version: {disease_predictor.rules.version}")
+        print(f"   Sauvegardées dans: ml_models/trained_models/disease_rules.json")
+    except Exception as e:
+        print(f"❌ Erreur: {e}")
+    
+    print()
+    
+    # 4. Moteur d'inférence plat
+    check_flat_engines(trained)
+    
+    print()
+    
+    # 5. Grille de recommandation précalculée (canal USSD/SMS)
+    print("🗺️  Précalcul de la grille de recommandation...")
+    try:
+        grid = recommender.build_grid()
+        print(f"✅ Grille {tuple(grid.probas.shape[:-1])} x {len(grid.classes)} cultures")
+        print(f"   Sauvegardée dans: {recommender.grid_path}")
     except Exception as e:
         print(f"❌ Erreur: {e}")
     
@@ -67,4 +217,62 @@ def train_all_models():
 
 
 if __name__ == '__main__':
-    train_all_models()
+    parser = argparse.ArgumentParser(description="Entraînement des modèles ML")
+    parser.add_argument(
+        '--samples', type=int, default=None,
+        help="Réentraîner sur N échantillons synthétiques (ex: 2000000)"
+    )
+    parser.add_argument(
+        '--from-datasets', action='store_true',
+        help="Entraîner sur le dataset farms de data_scraper (versions sauvegardées, non servies)"
+    )
+    parser.add_argument(
+        '--publish-trained', action='store_true',
+        help="Avec --from-datasets : servir les nouvelles versions si elles passent le contrôle qualité"
+    )
+    parser.add_argument(
+        '--data-dir', default=None,
+        help="Répertoire des datasets (défaut: SCRAPED_DATA_DIR)"
+    )
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help="Seulement compléter le modèle de rendement avec les nouvelles saisons récoltées"
+    )
+    parser.add_argument(
+        '--search', action='store_true',
+        help="Rechercher les hyperparamètres (avec --from-datasets : entraîner ensuite avec les meilleurs)"
+    )
+    parser.add_argument(
+        '--search-candidates', type=int, default=24,
+        help="Configurations évaluées par modèle (défaut: 24)"
+    )
+    parser.add_argument(
+        '--search-rows', type=int, default=None,
+        help="Sous-échantillon de lignes pour la recherche (défaut: toutes)"
+    )
+    parser.add_argument(
+        '--cv', type=int, default=3,
+        help="Plis de validation croisée de la recherche (défaut: 3)"
+    )
+    parser.add_argument(
+        '--publish', nargs=2, metavar=('MODELE', 'VERSION'), default=None,
+        help="Servir une version existante (ex: retour arrière), sans réentraîner"
+    )
+    args = parser.parse_args()
+    
+    if args.publish:
+        publish_version(*args.publish)
+        print(f"✅ {args.publish[0]} v{args.publish[1]} publié (pris en compte à chaud par les workers)")
+    elif args.incremental:
+        train_incremental()
+    elif args.search:
+        params = search_hyperparameters(
+            args.data_dir, n_candidates=args.search_candidates, cv=args.cv, max_rows=args.search_rows
+        )
+        if args.from_datasets:
+            train_all_models(from_datasets=True, data_dir=args.data_dir, params=params, publish=args.publish_trained)
+    else:
+        train_all_models(
+            samples=args.samples, from_datasets=args.from_datasets, data_dir=args.data_dir,
+            publish=args.publish_trained
+        )